@@ -4,6 +4,7 @@
 from collections import defaultdict
 
 from delairstack.core.resources.resource import Resource
+from delairstack.core.resources.result_set import ResultSet
 from delairstack.apis.provider import AnalyticsServiceAPI
 from delairstack.core.resources.analytics.analytics import Analytics
 from delairstack.core.resources.analytics.products import Products
@@ -18,7 +19,8 @@ class AnalyticsImpl(Analytics):
     def search(self, *, name: str = None, filter: Dict = None,
                limit: int = None, page: int = None, sort: dict = None,
                return_total: bool = False,
-               **kwargs) -> Union[ResourcesWithTotal, List[Resource]]:
+               as_result_set: bool = False,
+               **kwargs) -> Union[ResourcesWithTotal, List[Resource], ResultSet]:
         """Search for a list of analytics.
 
         Args:
@@ -38,6 +40,10 @@ class AnalyticsImpl(Analytics):
 
             return_total: Return the number of results found.
 
+            as_result_set: Return the results as a ``ResultSet``
+                building resources on access, instead of a list of
+                resources.
+
             **kwargs: Optional keyword arguments. Those arguments are
                 passed as is to the API provider.
 
@@ -63,8 +69,11 @@ class AnalyticsImpl(Analytics):
 
         analytics = search_desc.get('results')
 
-        results = [Resource(id=analytic['_id'], desc=analytic, manager=self)
-                   for analytic in analytics]
+        if as_result_set:
+            results = ResultSet(analytics, manager=self)
+        else:
+            results = [Resource(id=analytic['_id'], desc=analytic, manager=self)
+                       for analytic in analytics]
 
         if return_total is True:
             total = search_desc.get('total')
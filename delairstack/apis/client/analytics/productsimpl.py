@@ -7,6 +7,7 @@ import time
 from delairstack.apis.provider import AnalyticsServiceAPI
 from delairstack.core.resources.analytics.products import Products, ProductLog
 from delairstack.core.resources.resource import Resource
+from delairstack.core.resources.result_set import ResultSet
 from delairstack.core.utils.typing import (Dict, List,
                                            Generator,
                                            ProductLogsWithTotal,
@@ -21,7 +22,8 @@ class ProductsImpl(Products):
     def search(self, *, project: ResourceId = None, filter: Dict = None,
                limit: int = None, page: int = None, sort: dict = None,
                return_total: bool = False,
-               **kwargs) -> Union[ResourcesWithTotal, List[Resource]]:
+               as_result_set: bool = False,
+               **kwargs) -> Union[ResourcesWithTotal, List[Resource], ResultSet]:
         """Search for Analytics products.
 
         Args:
@@ -41,6 +43,10 @@ class ProductsImpl(Products):
 
             return_total: Return the number of results found.
 
+            as_result_set: Return the results as a ``ResultSet``
+                building resources on access, instead of a list of
+                resources.
+
             **kwargs: Optional keyword arguments. Those arguments are
                 passed as is to the API provider.
 
@@ -66,8 +72,11 @@ class ProductsImpl(Products):
 
         products = search_desc.get('results')
 
-        results = [Resource(id=product['_id'], desc=product, manager=self)
-                   for product in products]
+        if as_result_set:
+            results = ResultSet(products, manager=self)
+        else:
+            results = [Resource(id=product['_id'], desc=product, manager=self)
+                       for product in products]
 
         if return_total is True:
             total = search_desc.get('total')
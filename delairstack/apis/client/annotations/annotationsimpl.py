@@ -12,6 +12,7 @@ from delairstack.core.errors import ParameterError, QueryError
 
 from delairstack.core.resources.annotations import Annotations
 from delairstack.core.resources.resource import Resource
+from delairstack.core.resources.result_set import ResultSet
 
 from delairstack.core.utils.typing import (AnyPath, AnyStr, List, ResourceId,
                                            ResourcesWithTotal,
@@ -23,6 +24,9 @@ from delairstack.core.utils.warnings import deprecated, warn_for_deprecation
 
 
 class AnnotationsImpl(Annotations):
+    # changes are checked on update, including those made in place
+    _full_diff = True
+
     class Icons(Enum):
         CONVEYOR = 'delair::icon::conveyor'
         CRUSHER = 'delair::icon::crusher'
@@ -133,6 +137,7 @@ class AnnotationsImpl(Annotations):
     def __upload_files(self, *, project: ResourceId,
                        file_paths: List[AnyPath]):
         datasets = []
+        files = []
         for p in file_paths:
             name = os.path.basename(p)
             file_type, _ = mimetypes.guess_type(p)
@@ -145,10 +150,14 @@ class AnnotationsImpl(Annotations):
                 component = 'file'
 
             dataset = creation_func(name=name, project=project)
-            self._sdk.datasets.upload_file(dataset.id,
-                                           component=component,
-                                           file_path=p)
+            files.append({'dataset': dataset.id,
+                          'component': component,
+                          'file_path': p})
             datasets.append(dataset)
+
+        report = self._sdk.datasets.upload_files(files)
+        if report.failed:
+            raise report.failed[0].error
         return datasets
 
     @deprecated(['feature', 'flight', 'image', 'dataset'])
@@ -780,7 +789,8 @@ class AnnotationsImpl(Annotations):
     def search(self, *, project: ResourceId = None, filter: dict = None,
                limit: int = None, page: int = None, sort: dict = None,
                return_total: bool = False,
-               **kwargs) -> Union[ResourcesWithTotal, List[Resource]]:
+               as_result_set: bool = False,
+               **kwargs) -> Union[ResourcesWithTotal, List[Resource], ResultSet]:
         """Search annotations.
 
         Args:
@@ -801,6 +811,10 @@ class AnnotationsImpl(Annotations):
 
             return_total: Return the number of results found.
 
+            as_result_set: Return the results as a ``ResultSet``
+                building resources on access, instead of a list of
+                resources.
+
             **kwargs: Optional keyword arguments. Those arguments are
                 passed as is to the API provider.
 
@@ -823,8 +837,11 @@ class AnnotationsImpl(Annotations):
         r = self._provider.post('search-annotations', data=data)
 
         annotations = r.get('results')
-        results = [Resource(id=a['_id'], desc=a, manager=self)
-                   for a in annotations]
+        if as_result_set:
+            results = ResultSet(annotations, manager=self)
+        else:
+            results = [Resource(id=a['_id'], desc=a, manager=self)
+                       for a in annotations]
 
         if return_total is True:
             total = r.get('total')
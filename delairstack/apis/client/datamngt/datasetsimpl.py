@@ -1,7 +1,9 @@
-from functools import wraps
+from functools import partial, wraps
 import hashlib
+import io
 import os.path
 import sys
+import time
 import urllib.parse
 
 import urllib3.exceptions
@@ -11,18 +13,48 @@ from delairstack.core.errors import (DownloadError,
                                      ParameterError,
                                      UnsupportedResourceError)
 from delairstack.core.resources.datamngt import Datasets
-from delairstack.core.resources.datamngt.upload import MultipartUpload
+from delairstack.core.resources.datamngt.bulk_load import (BulkLoad,
+                                                           BulkLoadReport,
+                                                           LoadJournal)
+from delairstack.core.resources.datamngt.bulk_upload import (
+    BulkUpload, BulkUploadReport, FileUploadResult)
+from delairstack.core.resources.datamngt.download import (
+    _DOWNLOAD_RANGE_SIZE, _PARTIAL_SAVE_INTERVAL, BulkDownload,
+    FileDownloadResult, PartialDownload, RangedDownload, StreamReader)
+from delairstack.core.resources.datamngt.sync import ProjectSync, SyncReport
+from delairstack.core.resources.datamngt.tiles import (TileFetcher,
+                                                       TileFetchReport)
+from delairstack.core.resources.datamngt.upload import (_S3_CHUNK_MIN_SIZE,
+                                                        FileHashCache,
+                                                        FileSource,
+                                                        IterSource,
+                                                        MultipartUpload,
+                                                        UploadJournal,
+                                                        choose_chunk_size,
+                                                        component_checksum,
+                                                        file_hashes,
+                                                        make_upload_source)
 from delairstack.core.resources.resource import Resource
+from delairstack.core.resources.result_set import ResultSet
+from delairstack.core.utils.progress import (ProgressCallback,
+                                             ProgressTracker,
+                                             TransferSummary)
+from delairstack.core.utils.filehelper import iter_readinto
 from delairstack.core.utils.requests import extract_filename_from_headers
 from delairstack.core.utils.srs import expand_vertcrs_to_wkt
-from delairstack.core.utils.typing import (List, NewType, Sequence, Tuple,
+from delairstack.core.utils.utils import iter_pages
+from delairstack.core.utils.throttle import (ThrottledBody, TokenBucket,
+                                             make_throttle)
+from delairstack.core.utils.tiles import MBTilesCache, tiles_in_bbox
+from delairstack.core.utils.typing import (Callable, Iterable, List,
+                                           NewType,
+                                           Sequence, Tuple,
                                            Union, AnyPath, ResourceId,
                                            ResourcesWithTotal,
                                            SomeResources, SomeResourceIds,
                                            Generator)
 from delairstack.core.utils.requests import (generate_raster_tiles_url,
                                              generate_vector_tiles_url)
-from delairstack.core.utils.utils import md5
 
 # TODO complete description of bands for rasters
 # TODO complete description of bands for images
@@ -36,6 +68,23 @@ __creation_common_params = ('name', 'source_name', 'categories', 'project',
                             'dataset_format', 'geometry', 'properties')
 
 
+def _clamp_chunk_size(chunk_size: Union[int, str] = None, *,
+                      file_size: int = None) -> int:
+    """Clamp the size of the parts of a multipart upload to valid values.
+
+    ``'auto'`` is replaced by a size chosen from ``file_size`` and the
+    measured upload throughput.
+
+    """
+    if chunk_size == 'auto':
+        return choose_chunk_size(file_size)
+
+    chunk_size = max(chunk_size or 0, 5 * 1024**2)  # cannot be less than 5MB (S3)
+    chunk_size = min(chunk_size, 5 * 1024**3)       # cannot be more than 5GB (S3)
+    chunk_size = min(chunk_size, 50 * 1024**2)      # data-manager limit: 50MB max
+    return chunk_size
+
+
 def _implement_dataset_creation(f):
     """Decorator implementing dataset creation.
 
@@ -775,7 +824,12 @@ class DatasetsImpl(Datasets):
 
     def upload_file(self, dataset: ResourceId, *, component: str,
                     file_path: AnyPath, md5hash: str = None,
-                    multipart: bool = True, chunk_size: int = None):
+                    multipart: bool = True,
+                    chunk_size: Union[int, str] = None,
+                    resume: bool = False, max_attempts: int = 5,
+                    progress: ProgressCallback = None,
+                    bandwidth_limit: int = None, if_changed: bool = False,
+                    hash_cache: FileHashCache = None) -> TransferSummary:
         """Upload a file to a dataset component.
 
         Args:
@@ -796,49 +850,323 @@ class DatasetsImpl(Datasets):
             chunk_size: The size in byte of each part for a multipart upload.
                 If file size is less than this number, multipart will not used.
                 The value should be between 5MB and 50MB. 5MB is default.
+                With ``'auto'``, the size is chosen from the file size
+                and the throughput measured on previous uploads (see
+                ``choose_chunk_size()``), unless an interrupted upload
+                of the file is resumed with the size chosen then.
+
+            resume: Whether to record the parts of a multipart upload
+                and resume a previously interrupted upload of the same
+                file, sending only the missing parts. Default to
+                ``False``.
+
+            max_attempts: Maximal number of attempts to upload each
+                part of a multipart upload, failed parts being sent
+                again after a random delay. Default to 5.
+
+            progress: Optional callable called with a
+                ``TransferProgress`` (bytes uploaded, parts in flight,
+                throughputs, retries...) at most twice per second and
+                at the end of the upload, possibly from worker threads.
+
+            bandwidth_limit: Optional maximal rate of the upload in
+                bytes per second. The limit set through
+                ``set_bandwidth_limit()`` applies to all transfers in
+                any case.
+
+            if_changed: Whether to skip the upload when the component
+                already has the content of the file, i.e. when the MD5
+                hash of the file matches the checksum of the component
+                in the dataset description. Default to ``False``.
+
+            hash_cache: Cache of the MD5 hashes of local files used
+                with ``if_changed`` when ``md5hash`` is None, so that
+                unmodified files aren't hashed again. Default to a
+                cache in the user cache directory.
 
-        """
+        Returns:
+            A ``TransferSummary`` with the number of bytes uploaded,
+            the duration and the average throughput of the upload,
+            its ``skipped`` attribute being True when the upload was
+            skipped.
 
-        chunk_size = max(chunk_size or 0, 5 * 1024**2)  # cannot be less than 5MB (S3)
-        chunk_size = min(chunk_size, 5 * 1024**3)       # cannot be more than 5GB (S3)
-        chunk_size = min(chunk_size, 50 * 1024**2)      # data-manager limit: 50MB max
+        """
+        if if_changed:
+            start = time.monotonic()
+            if md5hash is None:
+                md5hash = (hash_cache or file_hashes).get(file_path)
+            desc = self.describe(dataset)
+            if component_checksum(desc, component) == md5hash:
+                return TransferSummary(bytes=0,
+                                       elapsed=time.monotonic() - start,
+                                       average_throughput=0.0, retries=0,
+                                       skipped=True)
 
         file_size = os.path.getsize(file_path)
-        if file_size < chunk_size:
+        threshold = (_S3_CHUNK_MIN_SIZE if chunk_size == 'auto'
+                     else None)
+        if chunk_size == 'auto' and resume:
+            # the throughput, thus the size chosen, may have changed
+            # since the upload was interrupted
+            journal = UploadJournal(None, file_path=file_path,
+                                    dataset=dataset,
+                                    component_name=component,
+                                    chunk_size=None)
+            chunk_size = journal.recorded_chunk_size() or chunk_size
+        chunk_size = _clamp_chunk_size(chunk_size, file_size=file_size)
+
+        if file_size < (threshold or chunk_size):
             multipart = False
             # hack for data-manager multipart upload limitation
 
+        throttle = make_throttle(bandwidth_limit)
         if multipart:
             conn = self._provider._connection
             url = self._provider._root_path
-            MultipartUpload(conn, url, chunk_size=chunk_size).send(
+            return MultipartUpload(conn, url, chunk_size=chunk_size,
+                                   max_attempts=max_attempts,
+                                   throttle=throttle).send(
                 file_path,
                 dataset=dataset,
                 component_name=component,
-                md5hash=md5hash
+                md5hash=md5hash,
+                resume=resume,
+                progress=progress
             )
         else:
-            md5hash = md5hash or md5(file_path)
+            with open(file_path, mode='rb') as fh:
+                return self._upload_in_one_request(
+                    dataset, component=component,
+                    filename=os.path.basename(file_path),
+                    source=FileSource(fh, size=file_size), md5hash=md5hash,
+                    progress=progress, throttle=throttle)
+
+    def upload_files(self, files: List[dict], *,
+                     chunk_size: Union[int, str] = None,
+                     max_attempts: int = 5,
+                     bandwidth_limit: int = None, if_changed: bool = False,
+                     hash_cache: FileHashCache = None) -> BulkUploadReport:
+        """Upload many files to dataset components.
+
+        All requests share the same window of in-flight requests:
+        files smaller than ``chunk_size`` are uploaded concurrently in
+        one request each, while larger files are uploaded in parts.
+        This is much faster than successive calls to ``upload_file()``
+        for many small files (e.g. the images of a survey).
+
+        The failure of a file doesn't stop the upload of the others.
+
+        Args:
+            files: List of dictionaries with keys ``dataset``,
+                ``component``, ``file_path`` and optionally
+                ``md5hash``, as the arguments of ``upload_file()``.
+
+            chunk_size: The size in byte of each part for a multipart
+                upload. The value should be between 5MB and 50MB. 5MB
+                is default. With ``'auto'``, the size is chosen for
+                each file larger than 5MB.
+
+            max_attempts: Maximal number of attempts of each request.
+                Default to 5.
+
+            bandwidth_limit: Optional maximal rate of the uploads in
+                bytes per second. The limit set through
+                ``set_bandwidth_limit()`` applies to all transfers in
+                any case.
+
+            if_changed: Whether to skip the files already uploaded to
+                their component, as in ``upload_file()``. The
+                datasets are described in one request.
+
+            hash_cache: Cache of the MD5 hashes of local files used
+                with ``if_changed``, as in ``upload_file()``.
+
+        Returns:
+            A ``BulkUploadReport`` with one result per file, in the
+            order of ``files``, and the average throughput.
+
+        Examples:
+            >>> report = sdk.datasets.upload_files([
+            ...     {'dataset': d.id, 'component': 'image', 'file_path': p}
+            ...     for d, p in zip(datasets, image_paths)])
+            >>> report.failed
+            []
+
+        """
+        conn = self._provider._connection
+        url = self._provider._root_path
+        if chunk_size != 'auto':
+            chunk_size = _clamp_chunk_size(chunk_size)
+        upload = BulkUpload(conn, url, chunk_size=chunk_size,
+                            max_attempts=max_attempts,
+                            throttle=make_throttle(bandwidth_limit))
+        if not if_changed or not files:
+            return upload.send(files)
+
+        start = time.monotonic()
+        hash_cache = hash_cache or file_hashes
+        files = [dict(f, md5hash=f.get('md5hash') or
+                      hash_cache.get(f['file_path']))
+                 for f in files]
+        dataset_ids = list({f['dataset']: None for f in files})
+        descs = {desc.id: desc for desc in self.describe(dataset_ids)}
+        unchanged = [component_checksum(descs.get(f['dataset']),
+                                        f['component']) == f['md5hash']
+                     for f in files]
+        uploaded = iter(upload.send([f for f, skip in zip(files, unchanged)
+                                     if not skip]).results)
+
+        results = []
+        for f, skip in zip(files, unchanged):
+            if not skip:
+                results.append(next(uploaded))
+                continue
+            result = FileUploadResult(dataset=f['dataset'],
+                                      component=f['component'],
+                                      file_path=f['file_path'],
+                                      size=os.path.getsize(f['file_path']),
+                                      md5hash=f['md5hash'])
+            result.skipped = True
+            results.append(result)
+        return BulkUploadReport(results, elapsed=time.monotonic() - start)
+
+    def upload_stream(self, dataset: ResourceId, *, component: str,
+                      source, filename: str, size: int = None,
+                      md5hash: str = None, multipart: bool = True,
+                      chunk_size: Union[int, str] = None,
+                      max_attempts: int = 5,
+                      progress: ProgressCallback = None,
+                      bandwidth_limit: int = None) -> TransferSummary:
+        """Upload data from memory or from a stream to a dataset component.
+
+        The data are never written to disk. Seekable file objects and
+        buffers are split into parts without copy, other file objects
+        and iterables are split into parts as they are read.
+
+        Args:
+            dataset: Identifier of the dataset to upload to.
+
+            component: Name of component to upload to.
+
+            source: A file object opened in binary mode and read from
+                its current position, an object supporting the buffer
+                protocol (e.g. ``bytes``) or an iterable of bytes.
+
+            filename: Name of the uploaded file.
+
+            size: Optional size of the data. Useless for buffers and
+                seekable file objects.
+
+            md5hash: Optional MD5 hash of the data containing only
+                hexadecimal digits. Computed when the data are
+                uploaded in one request, otherwise not sent when equal
+                to None (the default).
+
+            multipart: Whether to upload the data using multipart
+                upload. Default to ``True`` unless the data size is
+                less than ``chunk_size``. When ``False``, the data of
+                file objects and iterables are read in memory.
+
+            chunk_size: The size in byte of each part for a multipart
+                upload. The value should be between 5MB and 50MB. 5MB
+                is default. With ``'auto'``, the size is chosen from
+                the data size, if known, and the measured throughput.
+
+            max_attempts: Maximal number of attempts to upload each
+                part of a multipart upload. Default to 5.
+
+            progress: Optional callable called with a
+                ``TransferProgress``, as in ``upload_file()``.
+
+            bandwidth_limit: Optional maximal rate of the upload in
+                bytes per second. The limit set through
+                ``set_bandwidth_limit()`` applies to all transfers in
+                any case.
+
+        Returns:
+            A ``TransferSummary``.
+
+        Examples:
+            >>> sdk.datasets.upload_stream(dataset, component='vector',
+            ...                            source=json.dumps(geojson).encode(),
+            ...                            filename='vector.geojson')
+
+        """
+        source = make_upload_source(source, size=size)
+        chunk_size = _clamp_chunk_size(chunk_size, file_size=source.size)
+        if source.size is None and isinstance(source, IterSource):
+            source.probe(chunk_size)
+        if source.size is not None and source.size < chunk_size:
+            multipart = False
+
+        throttle = make_throttle(bandwidth_limit)
+        if multipart:
+            conn = self._provider._connection
+            url = self._provider._root_path
+            return MultipartUpload(conn, url, chunk_size=chunk_size,
+                                   max_attempts=max_attempts,
+                                   throttle=throttle).send_stream(
+                source,
+                dataset=dataset,
+                component_name=component,
+                filename=filename,
+                md5hash=md5hash,
+                progress=progress
+            )
+        else:
+            return self._upload_in_one_request(
+                dataset, component=component, filename=filename,
+                source=source, md5hash=md5hash, progress=progress,
+                throttle=throttle)
+
+    def _upload_in_one_request(self, dataset: ResourceId, *, component: str,
+                               filename: str, source, md5hash: str = None,
+                               progress: ProgressCallback = None,
+                               throttle: TokenBucket = None
+                               ) -> TransferSummary:
+        tracker = ProgressTracker(total=source.size, callback=progress)
+        # the data are read once, then hashed and sent from the same view
+        part = source.open_all()
+        tracker.set_total(len(part))
+        tracker.start_part()
+        try:
+            md5hash = md5hash or hashlib.md5(part.view).hexdigest()
             query = {'dataset': dataset,
                      'component': component,
-                     'filename': os.path.basename(file_path),
+                     'filename': filename,
                      'checksum': md5hash}
             query_str = urllib.parse.urlencode(query)
             path = 'upload-component?{}'.format(query_str)
-            with open(file_path, mode='rb') as fh:
-                self._provider.post(path, data=fh, as_json=False,
-                                    sanitize=False, serialize=False)
+            # an empty view would be taken for missing data
+            data = part.view if len(part) > 0 else io.BytesIO()
+            headers = None
+            if throttle is not None and throttle.limited and len(part) > 0:
+                # paced while sent, the length is given to avoid a
+                # chunked request
+                data = ThrottledBody(part.view, throttle)
+                headers = {'Content-Length': str(len(part))}
+            self._provider.post(path, data=data, as_json=False,
+                                sanitize=False, serialize=False,
+                                headers=headers)
+            tracker.end_part(len(part))
+        finally:
+            part.close()
+        return tracker.finish()
 
     def _download(self, path: str, params: dict,
                   target_path: Union[None, str],
                   target_name: Union[None, str],
                   overwrite: bool,
-                  md5hash: str) -> str:
+                  md5hash: str,
+                  progress: ProgressCallback = None,
+                  bandwidth_limit: int = None,
+                  parallel_ranges: int = None,
+                  buffer_size: int = None) -> str:
         if target_path is None:
             target_path = '.'
 
-        if not os.path.exists(target_path):
-            os.makedirs(target_path)
+        # may be created concurrently by bulk downloads
+        os.makedirs(target_path, exist_ok=True)
 
         url_path = '{}?{}'.format(path, urllib.parse.urlencode(params))
         resp = self._provider.get(url_path, as_json=False,
@@ -849,40 +1177,160 @@ class DatasetsImpl(Datasets):
         if not overwrite and os.path.exists(file_path):
             raise FileExistsError('File found at {}'.format(file_path))
 
+        partial_download = PartialDownload(file_path)
+        try:
+            self._write_download(resp, partial_download, md5hash=md5hash,
+                                 progress=progress,
+                                 bandwidth_limit=bandwidth_limit,
+                                 parallel_ranges=parallel_ranges,
+                                 buffer_size=buffer_size)
+        except DownloadError:
+            # the partial file can't be resumed
+            partial_download.remove()
+            raise
+        partial_download.commit()
+        return file_path
+
+    def _write_download(self, resp, partial: PartialDownload, *,
+                        md5hash: str,
+                        progress: ProgressCallback = None,
+                        bandwidth_limit: int = None,
+                        parallel_ranges: int = None,
+                        buffer_size: int = None):
+        length = resp.headers.get('Content-Length')
+        size = int(length) if length else None
+        throttle = make_throttle(bandwidth_limit)
+        if (parallel_ranges or 1) > 1 and size is not None and \
+                size > _DOWNLOAD_RANGE_SIZE and \
+                resp.headers.get('Accept-Ranges') != 'none':
+            # the ranges written to a preallocated file can't be resumed
+            partial.discard_state()
+            tracker = ProgressTracker(total=size, callback=progress)
+            download = RangedDownload(self._connection,
+                                      max_workers=parallel_ranges,
+                                      throttle=throttle,
+                                      buffer_size=buffer_size)
+            download.fetch(resp, partial.part_path, size=size,
+                           tracker=tracker)
+            if md5hash is not None:
+                # ranges are received out of order, the file is read
+                # again once
+                file_hash = hashlib.md5()
+                with open(partial.part_path, 'rb') as fh:
+                    for view in iter_readinto(fh, buffer_size=buffer_size):
+                        file_hash.update(view)
+                if md5hash != file_hash.hexdigest():
+                    raise DownloadError('Unexpected MD5 hash')
+            tracker.finish()
+            return
+
+        etag = resp.headers.get('ETag')
+        offset = partial.load(etag=etag, size=size)
+        if offset > 0:
+            url = resp.geturl() or resp._request_url  # account for redirects
+            resp.close()    # the rest of the body is not read
+            resp.release_conn()
+            headers = {'Cache-Control': 'no-cache',
+                       'Range': 'bytes={}-'.format(offset)}
+            resp = self._connection.get(path=url, headers=headers,
+                                        as_json=False,
+                                        preload_content=False)
+            if resp.status != 206:
+                offset = 0
+
         file_hash = hashlib.md5() if md5hash is not None else None
-        with open(file_path, 'wb') as fh:
-            resp = self._stream_resp(resp, fh, file_hash=file_hash)
+        tracker = ProgressTracker(total=size - offset if size else None,
+                                  callback=progress)
+        saved = offset
+
+        def checkpoint(offset):
+            nonlocal saved
+            if etag and size is not None and \
+                    offset - saved >= _PARTIAL_SAVE_INTERVAL:
+                fh.flush()
+                partial.save(offset, etag=etag, size=size)
+                saved = offset
+
+        with open(partial.part_path, 'r+b' if offset > 0 else 'wb') as fh:
+            if offset > 0:
+                if file_hash is not None:
+                    # the state of a hash can't be saved
+                    for view in iter_readinto(fh, buffer_size=buffer_size,
+                                              limit=offset):
+                        file_hash.update(view)
+                fh.seek(offset)
+                fh.truncate()
+            self._stream_resp(resp, fh, file_hash=file_hash, offset=offset,
+                              tracker=tracker, throttle=throttle,
+                              buffer_size=buffer_size, checkpoint=checkpoint)
 
         if md5hash is not None and md5hash != file_hash.hexdigest():
             raise DownloadError('Unexpected MD5 hash')
-
-        return file_path
+        tracker.finish()
 
     def _stream_resp(self, resp, dest, *,
-                     file_hash, offset=0):
-        retries = resp.retries
-        url = resp.geturl() or resp._request_url  # account for redirects
-        method = 'GET'
-        err = None
-        try:
-            for chunk in resp.stream(4096):
-                if chunk:       # false for keep-alive msg
-                    dest.write(chunk)
-                    offset += len(chunk)
-
-                    if file_hash is not None:
-                        file_hash.update(chunk)
-        except (urllib3.exceptions.ReadTimeoutError,
-                urllib3.exceptions.ProtocolError) as e:
-            retries = retries.increment(method, url, error=e,
-                                        _pool=resp._pool,
-                                        _stacktrace=sys.exc_info()[2])
-            retries.sleep()
-            err = e
-        finally:
-            resp.release_conn()     # since not preload_content
+                     file_hash, offset=0,
+                     tracker: ProgressTracker = None,
+                     throttle: TokenBucket = None,
+                     buffer_size: int = None,
+                     checkpoint: Callable[[int], None] = None):
+        # written and hashed from the same reused buffer
+        for view in self._iter_resp(resp, offset=offset, tracker=tracker,
+                                    throttle=throttle,
+                                    buffer_size=buffer_size):
+            dest.write(view)
+            offset += len(view)
+            if file_hash is not None:
+                file_hash.update(view)
+            if checkpoint is not None:
+                checkpoint(offset)
+
+    def _iter_resp(self, resp, *, offset=0,
+                   tracker: ProgressTracker = None,
+                   throttle: TokenBucket = None,
+                   buffer_size: int = None) -> Generator[memoryview, None,
+                                                         None]:
+        """Iterate over the body of a streamed response.
+
+        When the stream is interrupted, the rest of the body is
+        requested from the last byte received. When the iteration is
+        stopped before the end of the body (e.g. closed), the
+        connection is closed instead of being returned to the pool
+        with unread data.
+
+        Yields:
+            Views of a reused buffer, each one being valid until the
+            next one is requested.
+
+        """
+        if throttle is not None and not throttle.limited:
+            throttle = None
+        while True:
+            retries = resp.retries
+            url = resp.geturl() or resp._request_url  # account for redirects
+            complete = False
+            try:
+                for view in iter_readinto(resp, buffer_size=buffer_size):
+                    yield view
+                    offset += len(view)
+                    if tracker is not None:
+                        tracker.add(len(view))
+                    if throttle is not None:
+                        throttle.consume(len(view))
+                complete = True
+                return
+            except (urllib3.exceptions.ReadTimeoutError,
+                    urllib3.exceptions.ProtocolError) as e:
+                retries = retries.increment('GET', url, error=e,
+                                            _pool=resp._pool,
+                                            _stacktrace=sys.exc_info()[2])
+                retries.sleep()
+            finally:
+                if not complete:
+                    # the rest of the body is not read
+                    resp.close()
+                resp.release_conn()     # since not preload_content
 
-        if err:
             headers = {'Cache-Control': 'no-cache',
                        'Range': 'bytes={}-'.format(offset)}
             # https://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.35
@@ -891,18 +1339,151 @@ class DatasetsImpl(Datasets):
                                         as_json=False,
                                         preload_content=False,
                                         retries=retries)
-            resp = self._stream_resp(resp, dest,
-                                     file_hash=file_hash,
-                                     offset=offset)
-        return resp
+
+    def _iter_component(self, dataset: ResourceId, *, component: str,
+                        md5hash: str = None,
+                        progress: ProgressCallback = None,
+                        bandwidth_limit: int = None,
+                        buffer_size: int = None) -> Generator[memoryview,
+                                                              None, None]:
+        params = {'dataset': dataset,
+                  'component': component}
+        url_path = 'download-component?{}'.format(
+            urllib.parse.urlencode(params))
+        resp = self._provider.get(url_path, as_json=False,
+                                  preload_content=False)
+        length = resp.headers.get('Content-Length')
+        tracker = ProgressTracker(total=int(length) if length else None,
+                                  callback=progress)
+        file_hash = hashlib.md5() if md5hash is not None else None
+        views = self._iter_resp(resp, tracker=tracker,
+                                throttle=make_throttle(bandwidth_limit),
+                                buffer_size=buffer_size)
+        try:
+            for view in views:
+                if file_hash is not None:
+                    file_hash.update(view)
+                yield view
+        finally:
+            # closes the response when stopped before its end
+            views.close()
+
+        if md5hash is not None and md5hash != file_hash.hexdigest():
+            raise DownloadError('Unexpected MD5 hash')
+        tracker.finish()
+
+    def iter_component(self, dataset: ResourceId, *, component: str,
+                       md5hash: str = None,
+                       progress: ProgressCallback = None,
+                       bandwidth_limit: int = None,
+                       buffer_size: int = None) -> Generator[bytes, None,
+                                                             None]:
+        """Iterate over the content of a component, in memory.
+
+        The download starts with the iteration. An interrupted
+        download is resumed from the last byte received, as in
+        ``download_component()``.
+
+        Args:
+            dataset: Identifier of the dataset to download from.
+
+            component: Name of component to download from.
+
+            md5hash: Optional MD5 hash of the component, compared to
+                the hash of the downloaded content at the end of the
+                iteration.
+
+            progress: Optional callable called with a
+                ``TransferProgress``, as in ``download_component()``.
+
+            bandwidth_limit: Optional maximal rate of the download in
+                bytes per second.
+
+            buffer_size: Optional maximal size in bytes of the blocks.
+                Default to 4MB.
+
+        Raises:
+            DownloadError: When the iteration ends and the MD5 hash of
+                the downloaded content doesn't match ``md5hash``.
+
+        Yields:
+            Blocks of the content of the component.
+
+        Examples:
+            >>> for block in sdk.datasets.iter_component(
+            ...         dataset.id, component='pcl'):
+            ...     dest.write(block)
+
+        """
+        for view in self._iter_component(dataset, component=component,
+                                         md5hash=md5hash, progress=progress,
+                                         bandwidth_limit=bandwidth_limit,
+                                         buffer_size=buffer_size):
+            yield bytes(view)
+
+    def open_component(self, dataset: ResourceId, *, component: str,
+                       md5hash: str = None,
+                       progress: ProgressCallback = None,
+                       bandwidth_limit: int = None,
+                       buffer_size: int = None) -> io.BufferedReader:
+        """Open a component as a readable file object, in memory.
+
+        The content is streamed as it is read and is never written to
+        disk. The file object isn't seekable.
+
+        Args:
+            dataset: Identifier of the dataset to download from.
+
+            component: Name of component to download from.
+
+            md5hash: Optional MD5 hash of the component, compared to
+                the hash of the downloaded content when its end is
+                read.
+
+            progress: Optional callable called with a
+                ``TransferProgress``, as in ``download_component()``.
+
+            bandwidth_limit: Optional maximal rate of the download in
+                bytes per second.
+
+            buffer_size: Optional size in bytes of the buffer the
+                download stream is read into. Default to 4MB.
+
+        Raises:
+            DownloadError: When the end of the content is read and its
+                MD5 hash doesn't match ``md5hash``.
+
+        Returns:
+            A file object to be closed after use.
+
+        Examples:
+            >>> with sdk.datasets.open_component(
+            ...         dataset.id, component='raster') as fh:
+            ...     header = fh.read(1024)
+
+        """
+        blocks = self._iter_component(dataset, component=component,
+                                      md5hash=md5hash, progress=progress,
+                                      bandwidth_limit=bandwidth_limit,
+                                      buffer_size=buffer_size)
+        return io.BufferedReader(StreamReader(blocks))
 
     def download_component(self, dataset: ResourceId, *, component: str,
                            target_path: str = None, target_name: str = None,
-                           overwrite=False, md5hash: str = None) -> str:
+                           overwrite=False, md5hash: str = None,
+                           progress: ProgressCallback = None,
+                           bandwidth_limit: int = None,
+                           parallel_ranges: int = None,
+                           buffer_size: int = None) -> str:
         """Download the file from a component.
 
         If the path ``target_path`` doesn't exists, it is created.
 
+        The file is written to a ``.part`` file renamed once the
+        download is complete. A download interrupted, even by the end
+        of the process, is resumed by the next download of the same
+        file when the server provides its ETag.
+
         Args:
             dataset: Identifier of the dataset to download from.
 
@@ -923,6 +1504,24 @@ class DatasetsImpl(Datasets):
                 compared to the equivalent hash for the downloaded
                 file.
 
+            progress: Optional callable called with a
+                ``TransferProgress`` at most twice per second and at
+                the end of the download, its ``finished`` attribute
+                being True for the last call.
+
+            bandwidth_limit: Optional maximal rate of the download in
+                bytes per second. The limit set through
+                ``set_bandwidth_limit()`` applies to all transfers in
+                any case.
+
+            parallel_ranges: Optional number of byte ranges of 16MB
+                downloaded concurrently, for large files on
+                high-latency links, up to 7 to fit in the pool of
+                connections. Default to a single stream.
+
+            buffer_size: Optional size in bytes of the buffer each
+                stream is read into. Default to 4MB.
+
         Raises:
             DownloadError: When the MD5 hash of the downloaded file
                 doesn't match ``md5hash``.
@@ -936,7 +1535,10 @@ class DatasetsImpl(Datasets):
         path = 'download-component'
         return self._download(path, params=params, target_path=target_path,
                               target_name=target_name, overwrite=overwrite,
-                              md5hash=md5hash)
+                              md5hash=md5hash, progress=progress,
+                              bandwidth_limit=bandwidth_limit,
+                              parallel_ranges=parallel_ranges,
+                              buffer_size=buffer_size)
 
     def download_image_as_jpeg(self, dataset: ResourceId,
                                target_path: str = None,
@@ -1007,10 +1609,134 @@ class DatasetsImpl(Datasets):
                               target_name=target_name, overwrite=overwrite,
                               md5hash=None)
 
+    def download_components(self, items: List[dict], *,
+                            target_path: str = None, overwrite=False,
+                            concurrency: int = 8, max_attempts: int = 3
+                            ) -> Generator[FileDownloadResult, None, None]:
+        """Download many components concurrently.
+
+        Files are downloaded by a pool of ``concurrency`` threads
+        sharing the connection pool. The failure of a file doesn't
+        stop the download of the others.
+
+        If the path ``target_path`` doesn't exists, it is created.
+
+        Args:
+            items: List of dictionaries with keys ``dataset``,
+                ``component`` and optionally ``target_path``,
+                ``target_name`` and ``md5hash``, as the arguments of
+                ``download_component()``. Images are downloaded as
+                JPEG when ``as_jpeg`` is True instead of giving a
+                component, as in ``download_image_as_jpeg()``.
+
+            target_path: Path of directory where to save the
+                downloaded files. Default to current directory.
+
+            overwrite: Whether to overwrite existing files. Default to
+                False.
+
+            concurrency: Maximal number of simultaneous downloads, up
+                to 8 to fit in the pool of connections. Default to 8.
+
+            max_attempts: Maximal number of attempts to download each
+                file, failed downloads (e.g. interrupted or with an
+                unexpected MD5 hash) being started again after a
+                random delay. Default to 3.
+
+        Yields:
+            A ``FileDownloadResult`` per item as soon as its download
+            is over, with the path of the downloaded file or the
+            error. Downloads start with the iteration.
+
+        Examples:
+            >>> items = [{'dataset': d.id, 'component': 'image'}
+            ...          for d in datasets]
+            >>> for result in sdk.datasets.download_components(
+            ...         items, target_path='export'):
+            ...     if not result.succeeded:
+            ...         print(result.dataset, result.error)
+
+        """
+        def download(item):
+            if item.get('as_jpeg'):
+                return self.download_image_as_jpeg(
+                    item['dataset'],
+                    target_path=item.get('target_path', target_path),
+                    target_name=item.get('target_name'),
+                    overwrite=overwrite, md5hash=item.get('md5hash'))
+            return self.download_component(
+                item['dataset'], component=item['component'],
+                target_path=item.get('target_path', target_path),
+                target_name=item.get('target_name'),
+                overwrite=overwrite, md5hash=item.get('md5hash'))
+
+        bulk = BulkDownload(download, concurrency=concurrency,
+                            max_attempts=max_attempts)
+        return bulk.send(items)
+
+    def sync_project(self, project: ResourceId, target_dir: str, *,
+                     prune: bool = False, concurrency: int = 8,
+                     max_attempts: int = 3) -> SyncReport:
+        """Mirror the datasets of a project to a local directory.
+
+        A manifest of the mirrored datasets, with the checksums of
+        their components and their modification dates, is kept in
+        ``target_dir``. Only the components new or changed since the
+        previous synchronization are downloaded, concurrently as in
+        ``download_components()``. The component ``c`` of the dataset
+        ``d`` is mirrored in the directory ``d/c`` of ``target_dir``.
+
+        Only the datasets modified since the previous synchronization
+        are searched, unless ``prune`` is True since the deleted
+        datasets are found by searching all the datasets of the
+        project.
+
+        Args:
+            project: Identifier of the project to mirror.
+
+            target_dir: Path of the directory of the mirror.
+
+            prune: Whether to remove the files of the datasets and
+                components deleted since the previous synchronization.
+                Default to False.
+
+            concurrency: Maximal number of simultaneous downloads, up
+                to 8 to fit in the pool of connections. Default to 8.
+
+            max_attempts: Maximal number of attempts to download each
+                file. Default to 3.
+
+        Returns:
+            A ``SyncReport`` with the results of the downloads, the
+            number of unchanged components and the removed files.
+            Failed downloads are attempted again by the next
+            synchronization.
+
+        Examples:
+            >>> report = sdk.datasets.sync_project(project.id, 'mirror',
+            ...                                    prune=True)
+            >>> report.failed
+            []
+
+        """
+        def list_datasets(since):
+            filter = {'project': {'$eq': project}}
+            if since is not None:
+                filter['modification_date'] = {'$gte': since}
+            return self.search_generator(filter=filter)
+
+        download = partial(self.download_components, overwrite=True,
+                           concurrency=concurrency,
+                           max_attempts=max_attempts)
+        sync = ProjectSync(list_datasets=list_datasets, download=download,
+                           target_dir=target_dir, prune=prune)
+        return sync.send()
+
     def search(self, *, filter: dict = None, limit: int = None,
                page: int = None, sort: dict = None, return_total: bool = False,
+               as_result_set: bool = False,
                **kwargs
-               ) -> Union[ResourcesWithTotal, List[Resource]]:
+               ) -> Union[ResourcesWithTotal, List[Resource], ResultSet]:
         """Search datasets.
 
         Args:
@@ -1028,6 +1754,10 @@ class DatasetsImpl(Datasets):
 
             return_total: Return the number of results found.
 
+            as_result_set: Return the results as a ``ResultSet``
+                building resources on access, instead of a list of
+                resources.
+
             **kwargs: Optional keyword arguments. Those arguments are
                 passed as is to the API provider.
 
@@ -1060,8 +1790,11 @@ class DatasetsImpl(Datasets):
 
         datasets = r.get('results')
 
-        results = [Resource(id=dataset['_id'], desc=dataset, manager=self)
-                   for dataset in datasets]
+        if as_result_set:
+            results = ResultSet(datasets, manager=self)
+        else:
+            results = [Resource(id=dataset['_id'], desc=dataset, manager=self)
+                       for dataset in datasets]
 
         if return_total is True:
             total = r.get('total')
@@ -1070,6 +1803,7 @@ class DatasetsImpl(Datasets):
             return results
 
     def search_generator(self, *, filter: dict = None, limit: int = 50,
+                         prefetch: int = 0,
                          **kwargs) -> Generator[Resource, None, None]:
         """Search datasets and return results through a generator.
 
@@ -1085,6 +1819,12 @@ class DatasetsImpl(Datasets):
 
             limit: Optional maximum number of results by search request.
 
+            prefetch: Optional number of pages requested in the
+                background while the results of the current page are
+                consumed, at most ``prefetch`` pages being held in
+                memory. Default to 0, each page being requested once
+                the previous one is consumed.
+
             **kwargs: Optional keyword arguments. Those arguments are
                 passed as is to the API provider.
 
@@ -1101,17 +1841,13 @@ class DatasetsImpl(Datasets):
             <delairstack.core.resources.resource.Resource with id... (dataset)>
 
         """
-        current_page = 0
-        datasets = None
-
-        while datasets is None or len(datasets) > 0:
-            datasets = self.search(
-                filter=filter, page=current_page, limit=limit,
+        def fetch_page(page):
+            return self.search(
+                filter=filter, page=page, limit=limit,
                 sort={'creation_date': 1}, **kwargs
             )
-            for dataset in datasets:
-                yield dataset
-            current_page += 1
+
+        yield from iter_pages(fetch_page, prefetch=prefetch)
 
     def create_datasets(self, datasets: List[dict]) -> Union[List[Resource]]:
         """Create several datasets *(bulk dataset creation)*.
@@ -1147,6 +1883,71 @@ class DatasetsImpl(Datasets):
         return [Resource(id=dataset['_id'], desc=dataset, manager=self)
                 for dataset in created_datasets]
 
+    def create_and_upload(self, manifest: List[dict], *,
+                          batch_size: int = 100,
+                          chunk_size: Union[int, str] = None,
+                          max_attempts: int = 5,
+                          bandwidth_limit: int = None,
+                          journal_path: str = None) -> BulkLoadReport:
+        """Create datasets and upload their components *(bulk loading)*.
+
+        Datasets are created in batches through ``create_datasets()``
+        and the files of each batch are uploaded through
+        ``upload_files()`` while the next batch is created.
+
+        The datasets created are recorded in a journal until the
+        whole manifest is loaded. Loading the same manifest again
+        after a failure reuses them, uploading only the files whose
+        content differs from their component (see ``if_changed`` in
+        ``upload_file()``), so that an interrupted load can safely be
+        run again.
+
+        Args:
+            manifest: List of dictionaries with keys ``dataset``, the
+                description of the dataset as in ``create_datasets()``,
+                and ``files``, a dictionary mapping component names to
+                file paths. The components of the dataset default to
+                the keys of ``files``.
+
+            batch_size: Number of datasets created per request.
+                Default to 100.
+
+            chunk_size: The size in byte of each part for a multipart
+                upload, as in ``upload_files()``.
+
+            max_attempts: Maximal number of attempts of each request.
+                Default to 5.
+
+            bandwidth_limit: Optional maximal rate of the uploads in
+                bytes per second.
+
+            journal_path: Optional path to the journal of the created
+                datasets. Default to a journal in the user cache
+                directory.
+
+        Returns:
+            A ``BulkLoadReport`` with one result per dataset, in the
+            order of ``manifest``, giving the dataset identifier, its
+            status and the results of the uploads of its files.
+
+        Example:
+            >>> report = sdk.datasets.create_and_upload([
+            ...     {'dataset': {'name': os.path.basename(p),
+            ...                  'type': 'image', 'project': project.id},
+            ...      'files': {'image': p}}
+            ...     for p in image_paths])
+            >>> report.failed
+            []
+
+        """
+        upload = partial(self.upload_files, chunk_size=chunk_size,
+                         max_attempts=max_attempts,
+                         bandwidth_limit=bandwidth_limit)
+        load = BulkLoad(create=self.create_datasets, upload=upload,
+                        batch_size=batch_size,
+                        journal=LoadJournal(journal_path))
+        return load.send(manifest)
+
     def share_tiles(self, dataset: ResourceId, *,
                     company: ResourceId = None,
                     duration: int = None) -> str:
@@ -1207,3 +2008,76 @@ class DatasetsImpl(Datasets):
             url = generate_vector_tiles_url(base_url, token, coll, 'pbf')
 
         return url
+
+    def fetch_tiles(self, dataset: ResourceId, *, bbox: List[float],
+                    zooms: Iterable[int], mbtiles_path: AnyPath,
+                    url: str = None, concurrency: int = 8,
+                    max_attempts: int = 3) -> TileFetchReport:
+        """Fetch the tiles of a dataset into an MBTiles file.
+
+        The tiles covering the bounding box at the given zoom levels are
+        requested concurrently and written to the MBTiles file. Tiles
+        already in the file are skipped, so that an interrupted fetch
+        can be resumed.
+
+        The bounds and zoom levels recorded in the metadata of the file
+        are widened to cover the fetched tiles. Its name and type are
+        set to the dataset identifier and ``overlay`` unless already
+        set.
+
+        Args:
+            dataset: Identifier of the dataset to fetch the tiles of.
+
+            bbox: Bounding box in degrees as ``[xmin, xmax, ymin, ymax]``
+                (see ``compute_bbox()``).
+
+            zooms: Zoom levels to fetch.
+
+            mbtiles_path: Path to the MBTiles file, created if missing.
+
+            url: Optional URL template of the tiles. Default to a URL
+                created by ``share_tiles()``.
+
+            concurrency: Number of tiles requested concurrently. Default
+                to 8.
+
+            max_attempts: Maximum number of attempts per tile. Default
+                to 3.
+
+        Returns:
+            A ``TileFetchReport`` with the numbers of fetched and
+            skipped tiles, and the missing and failed tiles.
+
+        Raises:
+            UnsupportedResourceError: When the tiles of the dataset
+                can't be shared (see ``share_tiles()``).
+
+        Examples:
+            >>> sdk.datasets.fetch_tiles(
+            ...     'ds-id', bbox=[1.43, 1.46, 43.59, 43.61],
+            ...     zooms=range(12, 18), mbtiles_path='ds.mbtiles')
+            <TileFetchReport 1022 fetched, 0 skipped, 2 missing, 0 failed>
+
+        """
+        zooms = list(zooms)
+        if not zooms:
+            raise ParameterError('Expecting at least one zoom level')
+        if url is None:
+            url = self.share_tiles(dataset)
+
+        path = urllib.parse.urlparse(url).path
+        tile_format = os.path.splitext(path)[1].lstrip('.') or 'png'
+        with MBTilesCache(str(mbtiles_path)) as cache:
+            # the name and type may have been set by the caller
+            metadata = cache.metadata()
+            values = {'format': tile_format}
+            if 'name' not in metadata:
+                values['name'] = dataset
+            if 'type' not in metadata:
+                values['type'] = 'overlay'
+            cache.set_metadata(values)
+            cache.extend(bbox, zooms)
+            fetcher = TileFetcher(self._connection, url, cache,
+                                  concurrency=concurrency,
+                                  max_attempts=max_attempts)
+            return fetcher.send(tiles_in_bbox(bbox, zooms))
@@ -4,6 +4,7 @@
 
 from delairstack.apis.provider import ExternalProviderServiceAPI
 from delairstack.core.resources.credentials import Credentials
+from delairstack.core.resources.result_set import ResultSet
 from delairstack.core.utils.typing import (Dict, List, Resource, ResourceId,
                                            ResourcesWithTotal, Union)
 
@@ -17,7 +18,8 @@ class CredentialsImpl(Credentials):
     def search(self, *, name: str = None, filter: Dict = None,
                limit: int = None, page: int = None, sort: dict = None,
                return_total: bool = False,
-               **kwargs) -> Union[ResourcesWithTotal, List[Resource]]:
+               as_result_set: bool = False,
+               **kwargs) -> Union[ResourcesWithTotal, List[Resource], ResultSet]:
         """Search for a list of credentials.
 
         Args:
@@ -37,6 +39,10 @@ class CredentialsImpl(Credentials):
 
             return_total: Return the number of results found.
 
+            as_result_set: Return the results as a ``ResultSet``
+                building resources on access, instead of a list of
+                resources.
+
             **kwargs: Optional keyword arguments. Those arguments are
                 passed as is to the API provider.
 
@@ -62,8 +68,11 @@ class CredentialsImpl(Credentials):
 
         credentials = search_desc.get('results')
 
-        results = [Resource(id=credentials['_id'], desc=credentials,
-                   manager=self) for credentials in credentials]
+        if as_result_set:
+            results = ResultSet(credentials, manager=self)
+        else:
+            results = [Resource(id=credentials['_id'], desc=credentials,
+                       manager=self) for credentials in credentials]
 
         if return_total is True:
             total = search_desc.get('total')
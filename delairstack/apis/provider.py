@@ -21,7 +21,7 @@ class Provider(object):
         return content
 
     def post(self, path, data, *, sanitize=False, serialize=True,
-             preload_content=True, as_json=True):
+             preload_content=True, as_json=True, headers=None):
         """Post the given data.
 
         Args:
@@ -38,6 +38,8 @@ class Provider(object):
 
             as_json: Whether to deserialize the response body from JSON.
 
+            headers: Optional additional headers.
+
         Returns:
             Response body eventually deserialized.
 
@@ -51,7 +53,8 @@ class Provider(object):
         else:
             content_type = 'application/octet-stream'
 
-        headers = {'Cache-Control': 'no-cache'}
+        headers = dict(headers or {})
+        headers['Cache-Control'] = 'no-cache'
         headers['Content-Type'] = content_type
         full_path = '{root}/{path}'.format(root=self._root_path, path=path)
         content = self._connection.post(path=full_path,
@@ -12,6 +12,10 @@ from .token import TokenManager
 
 LOGGER = logging.getLogger(__name__)
 
+# Maximal number of connections kept alive per host, for concurrent
+# requests (e.g. ranged downloads)
+_POOL_MAXSIZE = 8
+
 
 class Connection(AbstractConnection):
     def __init__(self, *, base_url, disable_ssl_certificate=False,
@@ -27,9 +31,11 @@ class Connection(AbstractConnection):
 
         if proxy_url is not None:
             self._http = urllib3.ProxyManager(proxy_url=proxy_url,
-                                              cert_reqs=cert_reqs)
+                                              cert_reqs=cert_reqs,
+                                              maxsize=_POOL_MAXSIZE)
         else:
-            self._http = urllib3.PoolManager(cert_reqs=cert_reqs)
+            self._http = urllib3.PoolManager(cert_reqs=cert_reqs,
+                                             maxsize=_POOL_MAXSIZE)
 
         self._retries = Retry(total=max_retries, backoff_factor=1,
                               status_forcelist=[409, 413, 429,
@@ -157,6 +163,6 @@ class Connection(AbstractConnection):
         if response.status not in range(200, 300):
             raise ResponseError('{status}: {message}'.format(
                 status=response.status,
-                message=response.data[:256]))
+                message=response.data[:256]), status=response.status)
 
         return response
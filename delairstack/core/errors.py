@@ -49,7 +49,9 @@ class QueryError(_Error):
 
 
 class ResponseError(_Error):
-    pass
+    def __init__(self, msg='', status=None):
+        super().__init__(msg)
+        self.status = status
 
 
 class MissingCredentialsError(_Error):
@@ -1,2 +1,3 @@
 from .resource import Resource
 from .resources_manager_base import ResourcesManagerBase
+from .result_set import ResultSet
@@ -15,6 +15,8 @@ class Comments():
 
 
 class Comment(Resource):
+    __slots__ = ()
+
     def __init__(self, id: ResourceId, *, text: str, project: ResourceId,
                  type: str, creation_date: str, target: ResourceId = None,
                  flight: ResourceId = None, creation_user: ResourceId,
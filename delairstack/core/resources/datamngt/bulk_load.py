@@ -0,0 +1,308 @@
+"""Bulk creation of datasets with the upload of their components.
+
+"""
+
+import concurrent.futures
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .bulk_upload import BulkUploadReport
+from .upload import DEFAULT_JOURNAL_DIR
+from ...errors import ResponseError
+from delairstack.core.utils.typing import (Callable, Dict, List, Optional,
+                                           Set)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOAD_JOURNAL_PATH = os.path.join(DEFAULT_JOURNAL_DIR, 'datasets.jsonl')
+
+# Default number of datasets created per request
+_DEFAULT_BATCH_SIZE = 100
+
+
+class DatasetLoadResult(object):
+    """Result of the creation of a dataset and the upload of its files.
+
+    """
+    def __init__(self, *, index: int, desc: dict, files: Dict[str, str]):
+        self.index = index
+        self.desc = desc
+        self.files = files
+        self.dataset = None
+        self.created = False
+        self.uploads = []
+        self.error = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and all(r.succeeded for r in self.uploads)
+
+    @property
+    def status(self) -> str:
+        """One of ``'failed'``, ``'created'`` or ``'existing'``."""
+        if not self.succeeded:
+            return 'failed'
+        return 'created' if self.created else 'existing'
+
+    def __repr__(self):
+        return '<{} {} ({}): {}>'.format(type(self).__name__, self.index,
+                                         self.dataset, self.status)
+
+
+class BulkLoadReport(object):
+    """Report of the creation of datasets and the upload of their files.
+
+    """
+    def __init__(self, results: List[DatasetLoadResult], *, elapsed: float):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def failed(self) -> List[DatasetLoadResult]:
+        """Results of the datasets whose creation or upload failed."""
+        return [r for r in self.results if not r.succeeded]
+
+    @property
+    def datasets(self) -> List[Optional[str]]:
+        """Identifiers of the datasets, in the order of the manifest."""
+        return [r.dataset for r in self.results]
+
+    def __repr__(self):
+        return '<{} of {} datasets: {} failed>'.format(
+            type(self).__name__, len(self.results), len(self.failed))
+
+
+class LoadJournal(object):
+    """Journal of the datasets created from manifest entries.
+
+    The journal is a JSON lines file, each line mapping the key of a
+    manifest entry (a hash of its description and files) to the
+    identifier of the dataset created for it. The entries of a
+    manifest are discarded once it is completely loaded.
+
+    """
+    def __init__(self, path: str = None):
+        self._path = path or DEFAULT_LOAD_JOURNAL_PATH
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @staticmethod
+    def key(desc: dict, files: Dict[str, str]) -> str:
+        files = {k: os.path.abspath(v) for k, v in files.items()}
+        return hashlib.sha1(json.dumps([desc, files], sort_keys=True)
+                            .encode('utf-8')).hexdigest()
+
+    def load(self) -> Dict[str, str]:
+        """Read the datasets created from previous manifests.
+
+        Returns:
+            Dictionary mapping keys of entries to dataset identifiers.
+
+        """
+        datasets = {}
+        try:
+            with open(self._path, 'r') as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                        datasets[entry['key']] = entry['dataset']
+                    except (ValueError, KeyError, TypeError):
+                        # truncated by an interruption
+                        continue
+        except OSError:
+            pass
+        return datasets
+
+    def record(self, key: str, dataset: str):
+        """Record a created dataset."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(self._path, 'a') as fh:
+                fh.write(json.dumps({'key': key, 'dataset': dataset}) + '\n')
+
+    def discard(self, keys: Set[str]):
+        """Remove the datasets recorded for some keys.
+
+        The journal is rewritten with the other datasets, or removed
+        when none is left.
+
+        """
+        with self._lock:
+            datasets = {k: d for k, d in self.load().items()
+                        if k not in keys}
+            if not datasets:
+                try:
+                    os.remove(self._path)
+                except FileNotFoundError:
+                    pass
+                return
+            tmp_path = self._path + '.tmp'
+            with open(tmp_path, 'w') as fh:
+                for key, dataset in datasets.items():
+                    fh.write(json.dumps({'key': key,
+                                         'dataset': dataset}) + '\n')
+            os.replace(tmp_path, self._path)
+
+
+class BulkLoad(object):
+    """Create datasets in batches and upload their files meanwhile.
+
+    Datasets are created by batches of ``batch_size`` in one request
+    each. The files of a batch are uploaded while the next batch is
+    created.
+
+    The datasets created are recorded in a journal until the whole
+    manifest is loaded, so that loading the same manifest again after
+    a failure or an interruption reuses them instead of creating them
+    again; only the files whose content differs from the component
+    are then uploaded.
+
+    """
+    def __init__(self, *, create: Callable[[List[dict]], list],
+                 upload: Callable[..., BulkUploadReport],
+                 batch_size: int = _DEFAULT_BATCH_SIZE,
+                 journal: Optional[LoadJournal] = None):
+        """Initializes a bulk load.
+
+        Args:
+            create: Callable creating datasets from a list of
+                descriptions and returning the created resources (e.g.
+                ``create_datasets()``).
+
+            upload: Callable uploading a list of files and accepting
+                an ``if_changed`` keyword argument (e.g.
+                ``upload_files()``).
+
+            batch_size: Number of datasets created per request.
+
+            journal: Journal of the created datasets.
+
+        """
+        if batch_size < 1:
+            raise ValueError('Expecting a positive batch size')
+
+        self._create = create
+        self._upload = upload
+        self._batch_size = batch_size
+        self._journal = journal if journal is not None else LoadJournal()
+
+    def send(self, manifest: List[dict]) -> BulkLoadReport:
+        """Create datasets and upload their files.
+
+        Args:
+            manifest: List of dictionaries with keys ``dataset``, the
+                description of the dataset to create as in
+                ``create_datasets()``, and ``files``, a dictionary
+                mapping component names to file paths. The components
+                of the dataset default to the keys of ``files``.
+
+        Returns:
+            A ``BulkLoadReport`` with one result per dataset, in the
+            order of ``manifest``.
+
+        """
+        start = time.monotonic()
+        results = []
+        for index, entry in enumerate(manifest):
+            files = dict(entry.get('files') or {})
+            desc = copy.deepcopy(entry['dataset'])
+            if 'components' not in desc:
+                desc['components'] = [{'name': c} for c in files]
+            results.append(DatasetLoadResult(index=index, desc=desc,
+                                             files=files))
+
+        known = self._journal.load()
+        keys = {LoadJournal.key(r.desc, r.files) for r in results}
+        existing = []
+        pending = []
+        for result in results:
+            dataset = known.get(LoadJournal.key(result.desc, result.files))
+            if dataset is not None:
+                result.dataset = dataset
+                existing.append(result)
+            else:
+                pending.append(result)
+
+        with concurrent.futures.ThreadPoolExecutor(1) as uploader:
+            if existing:
+                uploader.submit(self._upload_files, existing, True)
+            for i in range(0, len(pending), self._batch_size):
+                batch = pending[i:i + self._batch_size]
+                if self._create_batch(batch):
+                    uploader.submit(self._upload_files, batch, False)
+
+        if all(r.succeeded for r in results):
+            try:
+                self._journal.discard(keys)
+            except OSError as e:
+                logger.warning('Failed to prune {}: {!r}'.format(
+                    self._journal.path, e))
+
+        return BulkLoadReport(results, elapsed=time.monotonic() - start)
+
+    def _create_batch(self, batch: List[DatasetLoadResult]) -> bool:
+        try:
+            created = self._create([copy.deepcopy(r.desc) for r in batch])
+        except Exception as e:
+            logger.warning('Failed to create {} datasets: {!r}'.format(
+                len(batch), e))
+            for result in batch:
+                result.error = e
+            return False
+
+        created = list(created)
+        if len(created) != len(batch):
+            logger.warning('Created {} datasets out of {}'.format(
+                len(created), len(batch)))
+            error = ResponseError('Expecting {} created datasets, got '
+                                  '{}'.format(len(batch), len(created)))
+            for result in batch[len(created):]:
+                result.error = error
+
+        for result, dataset in zip(batch, created):
+            result.dataset = dataset.id
+            result.created = True
+            try:
+                self._journal.record(LoadJournal.key(result.desc,
+                                                     result.files),
+                                     dataset.id)
+            except OSError as e:
+                logger.warning('Failed to record dataset {}: {!r}'.format(
+                    dataset.id, e))
+        return True
+
+    def _upload_files(self, batch: List[DatasetLoadResult],
+                      if_changed: bool):
+        files = []
+        owners = []
+        for result in batch:
+            if result.dataset is None:
+                # not created
+                continue
+            for component, file_path in result.files.items():
+                files.append({'dataset': result.dataset,
+                              'component': component,
+                              'file_path': file_path})
+                owners.append(result)
+        if not files:
+            return
+
+        try:
+            report = self._upload(files, if_changed=if_changed)
+        except Exception as e:
+            logger.warning('Failed to upload {} files: {!r}'.format(
+                len(files), e))
+            for result in set(owners):
+                result.error = e
+            return
+
+        for result, upload in zip(owners, report.results):
+            result.uploads.append(upload)
@@ -0,0 +1,301 @@
+"""Bulk files uploader.
+
+"""
+
+import concurrent.futures
+import functools
+import hashlib
+import io
+import logging
+import os
+import queue
+import threading
+import time
+import urllib
+
+from ...errors import UploadError
+from .upload import (_RETRY_STATUS_CODES, _S3_CHUNK_MIN_SIZE, BufferBudget,
+                     FilePart, MultipartUpload, backoff_delay,
+                     choose_chunk_size, upload_buffers)
+from delairstack.core.utils.throttle import (ThrottledBody, TokenBucket,
+                                             make_throttle)
+from delairstack.core.utils.typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class FileUploadResult(object):
+    """Result of the upload of a file to a dataset component.
+
+    """
+    def __init__(self, *, dataset: str, component: str, file_path: str,
+                 size: int, md5hash: Optional[str] = None):
+        self.dataset = dataset
+        self.component = component
+        self.file_path = file_path
+        self.size = size
+        self.md5hash = md5hash
+        self.error = None
+        self.attempt = 0
+        self.skipped = False
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        if self.skipped:
+            status = 'skipped'
+        else:
+            status = 'uploaded' if self.succeeded else 'failed'
+        return '<{} {} to {}/{}: {}>'.format(type(self).__name__,
+                                             self.file_path, self.dataset,
+                                             self.component, status)
+
+
+class BulkUploadReport(object):
+    """Report of the upload of many files.
+
+    """
+    def __init__(self, results: List[FileUploadResult], *, elapsed: float):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def failed(self) -> List[FileUploadResult]:
+        """Results of the files whose upload failed."""
+        return [r for r in self.results if not r.succeeded]
+
+    @property
+    def size(self) -> int:
+        """Number of bytes of the uploaded files."""
+        return sum(r.size for r in self.results
+                   if r.succeeded and not r.skipped)
+
+    @property
+    def skipped(self) -> List[FileUploadResult]:
+        """Results of the files skipped as already uploaded."""
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def throughput(self) -> float:
+        """Average throughput in bytes per second."""
+        return self.size / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return '<{} of {} files: {} failed, {} skipped, {:.1f} MB/s>'.format(
+            type(self).__name__, len(self.results), len(self.failed),
+            len(self.skipped), self.throughput / 1024**2)
+
+
+class BulkUpload(object):
+    """Upload many files sharing one window of in-flight requests.
+
+    Files smaller than ``chunk_size`` are sent in one request each,
+    larger files are sent in parts. The requests of small files and
+    the parts of large files share the same window of
+    ``max_request_workers`` in-flight requests, so that many small
+    files are uploaded concurrently.
+
+    Failed requests are sent again like the parts of a
+    ``MultipartUpload``.
+
+    With a ``chunk_size`` equal to ``'auto'``, files larger than 5MB
+    are sent in parts of a size given by ``choose_chunk_size()``.
+
+    All files are sent at the rate allowed by ``throttle``.
+
+    """
+    def __init__(self, connection, base_url, *,
+                 chunk_size: Union[int, str] = _S3_CHUNK_MIN_SIZE,
+                 buffers: BufferBudget = None, max_attempts: int = 5,
+                 backoff_factor: float = 0.5, backoff_max: float = 30.0,
+                 throttle: Optional[TokenBucket] = None):
+        if max_attempts < 1:
+            raise ValueError('Expecting a positive number of attempts')
+
+        self._connection = connection
+        self._base_url = base_url
+        self._chunk_size = chunk_size
+        self._buffers = buffers if buffers is not None else upload_buffers
+        self._max_attempts = max_attempts
+        self._backoff_factor = backoff_factor
+        self._backoff_max = backoff_max
+        self._throttle = throttle if throttle is not None else make_throttle()
+
+    def get_upload_url(self, *, dataset: str, component_name: str,
+                       filename: str, checksum: str) -> str:
+        qs = urllib.parse.urlencode({'dataset': dataset,
+                                     'component': component_name,
+                                     'filename': filename,
+                                     'checksum': checksum})
+        return '{}/upload-component?{}'.format(self._base_url, qs)
+
+    def send(self, files: List[dict]) -> BulkUploadReport:
+        """Upload files to dataset components.
+
+        The failure of a file doesn't stop the upload of the others,
+        it's reported in the returned report.
+
+        Args:
+            files: List of dictionaries with keys ``dataset``,
+                ``component``, ``file_path`` and optionally
+                ``md5hash``.
+
+        Returns:
+            A ``BulkUploadReport`` with one result per file, in the
+            order of ``files``.
+
+        """
+        start = time.monotonic()
+        results = []
+        for f in files:
+            file_path = f['file_path']
+            size = os.path.getsize(file_path)
+            results.append(FileUploadResult(dataset=f['dataset'],
+                                            component=f['component'],
+                                            file_path=file_path,
+                                            size=size,
+                                            md5hash=f.get('md5hash')))
+
+        async_conn = self._connection.asynchronous
+        max_simultaneous = async_conn.max_request_workers
+        window = threading.BoundedSemaphore(max_simultaneous)
+
+        threshold = (_S3_CHUNK_MIN_SIZE if self._chunk_size == 'auto'
+                     else self._chunk_size)
+        small = [r for r in results if r.size < threshold]
+        large = [r for r in results if r.size >= threshold]
+        # large files are dispatched by their own threads, which must
+        # not starve the workers preparing small files
+        workers = min(max_simultaneous, os.cpu_count() or 1)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_simultaneous) as large_executor, \
+                concurrent.futures.ThreadPoolExecutor(
+                    workers) as small_executor:
+            for result in large:
+                large_executor.submit(self._send_large, result, window)
+            self._send_small(small, window, small_executor)
+
+        return BulkUploadReport(results, elapsed=time.monotonic() - start)
+
+    def _send_large(self, result: FileUploadResult,
+                    window: threading.Semaphore):
+        try:
+            chunk_size = self._chunk_size
+            if chunk_size == 'auto':
+                chunk_size = choose_chunk_size(result.size)
+            upload = MultipartUpload(self._connection, self._base_url,
+                                     chunk_size=chunk_size,
+                                     buffers=self._buffers,
+                                     max_attempts=self._max_attempts,
+                                     backoff_factor=self._backoff_factor,
+                                     backoff_max=self._backoff_max,
+                                     window=window,
+                                     throttle=self._throttle)
+            upload.send(result.file_path, dataset=result.dataset,
+                        component_name=result.component,
+                        md5hash=result.md5hash)
+        except Exception as e:
+            logger.warning('Failed to upload {}: {!r}'.format(
+                result.file_path, e))
+            result.error = e
+
+    def _send_small(self, results: List[FileUploadResult],
+                    window: threading.Semaphore,
+                    executor: concurrent.futures.Executor):
+        """Send files in one request each.
+
+        Files are read, hashed and posted by the workers of
+        ``executor`` while the current thread waits for slots in
+        ``window``.
+
+        """
+        if not results:
+            return
+
+        async_conn = self._connection.asynchronous
+        headers = {'Cache-Control': 'no-cache',
+                   'Content-Type': 'application/octet-stream'}
+
+        # files to send, None marks the end of the uploads
+        pending = queue.Queue()
+        for result in results:
+            pending.put(result)
+
+        lock = threading.Lock()
+        unfinished = len(results)
+
+        def on_done(result, part, req):
+            nonlocal unfinished
+            try:
+                status_code = req.result().status_code if req else None
+            except Exception as e:
+                logger.warning('Failed to upload {}: {!r}'.format(
+                    result.file_path, e))
+                status_code = None
+
+            try:
+                if part is not None:
+                    part.close()
+            finally:
+                self._buffers.release(result.size)
+                window.release()
+            if status_code == 200:
+                result.error = None
+            elif (status_code is None or status_code in _RETRY_STATUS_CODES) \
+                    and result.attempt < self._max_attempts:
+                delay = backoff_delay(result.attempt,
+                                      factor=self._backoff_factor,
+                                      maximum=self._backoff_max)
+                timer = threading.Timer(delay, pending.put, args=(result,))
+                timer.daemon = True
+                timer.start()
+                return
+            else:
+                result.error = UploadError(
+                    'Failed to upload {} (status {})'.format(
+                        result.file_path, status_code))
+
+            with lock:
+                unfinished -= 1
+                if unfinished == 0:
+                    pending.put(None)
+
+        def send_file(result):
+            part = None
+            try:
+                with open(result.file_path, 'rb') as fh:
+                    part = FilePart(fh, offset=0, size=result.size)
+                md5hash = (result.md5hash or
+                           hashlib.md5(part.view).hexdigest())
+                path = self.get_upload_url(
+                    dataset=result.dataset, component_name=result.component,
+                    filename=os.path.basename(result.file_path),
+                    checksum=md5hash)
+                # an empty view would be taken for missing data
+                data = part.view if len(part) > 0 else io.BytesIO()
+                if self._throttle.limited and len(part) > 0:
+                    data = ThrottledBody(part.view, self._throttle)
+                req = async_conn.post(path=path, headers=headers, data=data)
+            except Exception as e:
+                logger.warning('Failed to send {}: {!r}'.format(
+                    result.file_path, e))
+                on_done(result, part, None)
+                return
+            req.add_done_callback(functools.partial(on_done, result, part))
+
+        join_delay = (async_conn.max_request_workers * 60.0 +
+                      self._backoff_max)
+        while True:
+            try:
+                result = pending.get(timeout=join_delay)
+            except queue.Empty:
+                raise UploadError('Timeout while waiting for uploads to end')
+            if result is None:
+                break
+
+            window.acquire()
+            self._buffers.acquire(result.size)
+            result.attempt += 1
+            executor.submit(send_file, result)
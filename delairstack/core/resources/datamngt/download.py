@@ -0,0 +1,464 @@
+"""Files downloader.
+
+"""
+
+import concurrent.futures
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import urllib3.exceptions
+
+from ...errors import DownloadError
+from .upload import backoff_delay
+from delairstack.core.connection.connection import _POOL_MAXSIZE
+from delairstack.core.utils.filehelper import iter_readinto
+from delairstack.core.utils.progress import ProgressTracker
+from delairstack.core.utils.throttle import TokenBucket, make_throttle
+from delairstack.core.utils.typing import (Callable, Generator, Iterable,
+                                           List, Optional, Tuple)
+
+logger = logging.getLogger(__name__)
+
+# Default size of the byte ranges downloaded concurrently (in bytes)
+_DOWNLOAD_RANGE_SIZE = 16 * 1024 * 1024
+
+# Errors of a download stream after which the download is resumed
+_STREAM_ERRORS = (urllib3.exceptions.ReadTimeoutError,
+                  urllib3.exceptions.ProtocolError)
+
+# Suffix of the files being downloaded
+PART_SUFFIX = '.part'
+
+# Number of bytes downloaded between saves of the state of a partial
+# download
+_PARTIAL_SAVE_INTERVAL = 16 * 1024 * 1024
+
+# Errors after which a file of a bulk download is downloaded again
+_RETRY_ERRORS = (DownloadError, ConnectionError,
+                 urllib3.exceptions.HTTPError)
+
+
+def split_ranges(size: int, range_size: int) -> List[Tuple[int, int]]:
+    """Split a file in byte ranges.
+
+    Args:
+        size: Size of the file.
+
+        range_size: Common size of the ranges, the last one being
+            possibly smaller.
+
+    Returns:
+        List of the first and last offsets of the ranges, both
+        included as in ``Range`` headers.
+
+    """
+    return [(start, min(start + range_size, size) - 1)
+            for start in range(0, size, range_size)]
+
+
+class PartialDownload(object):
+    """File being downloaded, kept until its download is complete.
+
+    The content is written to a ``.part`` file next to the target
+    file. A sidecar JSON file records the number of bytes of the
+    ``.part`` file known to be written, along with the ETag and size
+    of the downloaded file, so that a later download of the same file
+    resumes from there. The ``.part`` file is renamed to the target
+    file once complete.
+
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.part_path = file_path + PART_SUFFIX
+        self.state_path = self.part_path + '.json'
+
+    def load(self, *, etag: Optional[str], size: Optional[int]) -> int:
+        """Return the offset to resume the download from.
+
+        Args:
+            etag: ETag of the file to download.
+
+            size: Size of the file to download.
+
+        Returns:
+            The number of bytes already downloaded, 0 when the partial
+            download doesn't match the file (e.g. modified since).
+
+        """
+        if not etag or size is None:
+            return 0
+        try:
+            with open(self.state_path, 'r') as fh:
+                state = json.load(fh)
+            part_size = os.path.getsize(self.part_path)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(state, dict) or state.get('etag') != etag or \
+                state.get('size') != size:
+            return 0
+        offset = state.get('offset')
+        if not isinstance(offset, int) or not 0 <= offset <= part_size:
+            return 0
+        return offset
+
+    def save(self, offset: int, *, etag: str, size: int):
+        """Record the number of bytes written to the ``.part`` file."""
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'offset': offset, 'etag': etag, 'size': size}, fh)
+        os.replace(tmp_path, self.state_path)
+
+    def discard_state(self):
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+
+    def remove(self):
+        """Remove the ``.part`` file and its sidecar."""
+        self.discard_state()
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+
+    def commit(self):
+        """Rename the complete ``.part`` file to the target file."""
+        os.replace(self.part_path, self.file_path)
+        self.discard_state()
+
+
+class StreamReader(io.RawIOBase):
+    """Readable file object over an iterable of bytes-like blocks.
+
+    A block is only used until the next one is requested, so that
+    views of a reused buffer can be read without being copied first.
+
+    """
+    def __init__(self, blocks: Iterable):
+        self._blocks = iter(blocks)
+        self._view = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        while not self._view:
+            try:
+                self._view = memoryview(next(self._blocks)).cast('B')
+            except StopIteration:
+                return 0
+        buffer = memoryview(buffer).cast('B')
+        count = min(len(buffer), len(self._view))
+        buffer[:count] = self._view[:count]
+        self._view = self._view[count:]
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._view = memoryview(b'')
+            # stops the download of the remaining blocks
+            close = getattr(self._blocks, 'close', None)
+            if close is not None:
+                close()
+        super().close()
+
+
+class PositionalWriter(object):
+    """Write blocks of a file at given offsets from many threads.
+
+    Blocks are written with ``os.pwrite()`` when available, otherwise
+    under a lock.
+
+    """
+    def __init__(self, fh):
+        self._fh = fh
+        self._fd = fh.fileno()
+        self._lock = None if hasattr(os, 'pwrite') else threading.Lock()
+
+    def preallocate(self, size: int):
+        """Allocate the whole file before writing its blocks."""
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self._fd, 0, size)
+                return
+            except OSError:
+                # not supported by the file system
+                pass
+        os.ftruncate(self._fd, size)
+
+    def write(self, data, offset: int):
+        if self._lock is None:
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self._fd, view, offset)
+                view = view[written:]
+                offset += written
+        else:
+            with self._lock:
+                self._fh.seek(offset)
+                self._fh.write(data)
+
+
+class RangedDownload(object):
+    """Download a file in byte ranges fetched concurrently.
+
+    The file is preallocated and each range is written at its offset
+    as it is received, so that many streams fill high-latency links
+    that a single stream can't.
+
+    A range whose stream is interrupted is requested again from the
+    last byte received, up to ``max_attempts`` times.
+
+    Each stream is read into a buffer of ``buffer_size`` bytes (default
+    to ``DOWNLOAD_BUFFER_SIZE``) reused for all its blocks.
+
+    ``max_workers`` is capped so that the streams, including the first
+    one, fit in the pool of connections.
+
+    """
+    def __init__(self, connection, *,
+                 range_size: int = _DOWNLOAD_RANGE_SIZE,
+                 max_workers: int = 4, max_attempts: int = 5,
+                 backoff_factor: float = 0.5, backoff_max: float = 30.0,
+                 throttle: Optional[TokenBucket] = None,
+                 buffer_size: Optional[int] = None):
+        if max_attempts < 1:
+            raise ValueError('Expecting a positive number of attempts')
+
+        self._connection = connection
+        self._range_size = range_size
+        # the first range is read from a connection of the pool too
+        self._max_workers = max(1, min(max_workers, _POOL_MAXSIZE - 1))
+        self._max_attempts = max_attempts
+        self._backoff_factor = backoff_factor
+        self._backoff_max = backoff_max
+        self._throttle = throttle if throttle is not None else make_throttle()
+        self._buffer_size = buffer_size
+
+    def fetch(self, resp, file_path: str, *, size: int,
+              tracker: Optional[ProgressTracker] = None):
+        """Download a file to ``file_path``.
+
+        Args:
+            resp: Response to a request of the whole file, not yet
+                read. Its body provides the first range and its URL is
+                requested for the other ranges.
+
+            file_path: Path of the downloaded file.
+
+            size: Size of the file.
+
+            tracker: Optional tracker of the progress of the download.
+
+        Raises:
+            DownloadError: When a range can't be downloaded.
+
+        """
+        url = resp.geturl() or resp._request_url   # account for redirects
+        ranges = split_ranges(size, self._range_size)
+        with open(file_path, 'wb') as fh:
+            writer = PositionalWriter(fh)
+            writer.preallocate(size)
+            with concurrent.futures.ThreadPoolExecutor(
+                    self._max_workers) as executor:
+                futures = [executor.submit(self._fetch_range, url, writer,
+                                           start, end, tracker)
+                           for start, end in ranges[1:]]
+                try:
+                    start, end = ranges[0]
+                    offset = self._read(resp, writer, start, end, tracker,
+                                        close=True)
+                    if offset <= end:
+                        self._fetch_range(url, writer, offset, end, tracker)
+                    for future in concurrent.futures.as_completed(futures):
+                        future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+    def _fetch_range(self, url: str, writer: PositionalWriter, start: int,
+                     end: int, tracker: Optional[ProgressTracker]):
+        offset = start
+        attempt = 0
+        while offset <= end:
+            if attempt >= self._max_attempts:
+                raise DownloadError(
+                    'Failed to download bytes {}-{}'.format(offset, end))
+            if attempt > 0:
+                time.sleep(backoff_delay(attempt,
+                                         factor=self._backoff_factor,
+                                         maximum=self._backoff_max))
+            attempt += 1
+
+            headers = {'Cache-Control': 'no-cache',
+                       'Range': 'bytes={}-{}'.format(offset, end)}
+            try:
+                resp = self._connection.get(path=url, headers=headers,
+                                            as_json=False,
+                                            preload_content=False)
+            except _STREAM_ERRORS as e:
+                logger.warning('Failed to request bytes {}-{}: {!r}'.format(
+                    offset, end, e))
+                continue
+            if resp.status != 206:
+                resp.release_conn()
+                raise DownloadError('Byte ranges not supported by {}'.format(
+                    url.split('?')[0]))
+            offset = self._read(resp, writer, offset, end, tracker)
+
+    def _read(self, resp, writer: PositionalWriter, offset: int, end: int,
+              tracker: Optional[ProgressTracker], *,
+              close: bool = False) -> int:
+        """Write the body of a response from ``offset`` up to ``end``.
+
+        Returns:
+            The offset following the last byte written.
+
+        """
+        throttle = self._throttle if self._throttle.limited else None
+        try:
+            for view in iter_readinto(resp, buffer_size=self._buffer_size,
+                                      limit=end + 1 - offset):
+                writer.write(view, offset)
+                offset += len(view)
+                if tracker is not None:
+                    tracker.add(len(view))
+                if throttle is not None:
+                    throttle.consume(len(view))
+        except _STREAM_ERRORS as e:
+            logger.warning('Download interrupted at byte {}: {!r}'.format(
+                offset, e))
+        finally:
+            if close:
+                # the rest of the body is not read
+                resp.close()
+            resp.release_conn()     # since not preload_content
+        return offset
+
+
+class FileDownloadResult(object):
+    """Result of the download of a file of a bulk download.
+
+    """
+    def __init__(self, item: dict):
+        self.item = item
+        self.file_path = None
+        self.error = None
+        self.attempt = 0
+
+    @property
+    def dataset(self) -> str:
+        return self.item['dataset']
+
+    @property
+    def component(self) -> Optional[str]:
+        return self.item.get('component')
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and self.file_path is not None
+
+    def __repr__(self):
+        status = self.file_path if self.succeeded else 'failed'
+        return '<{} {}/{}: {}>'.format(type(self).__name__, self.dataset,
+                                       self.component, status)
+
+
+class BulkDownload(object):
+    """Download many files concurrently.
+
+    Files are downloaded by a pool of ``concurrency`` threads, capped
+    to the size of the pool of connections they share. A file whose
+    download fails with a transient error (e.g. an interrupted
+    stream or an unexpected MD5 hash) is downloaded again after a
+    random delay, up to ``max_attempts`` times.
+
+    """
+    def __init__(self, download: Callable[[dict], str], *,
+                 concurrency: int = 8, max_attempts: int = 3,
+                 backoff_factor: float = 0.5, backoff_max: float = 30.0):
+        """Initializes a bulk download.
+
+        Args:
+            download: Callable downloading the file described by an
+                item and returning the path of the downloaded file.
+
+            concurrency: Maximal number of simultaneous downloads, up
+                to the size of the pool of connections.
+
+            max_attempts: Maximal number of attempts per file.
+
+            backoff_factor: Factor of the delays between attempts.
+
+            backoff_max: Maximal delay between attempts.
+
+        """
+        if concurrency < 1:
+            raise ValueError('Expecting a positive concurrency')
+        if max_attempts < 1:
+            raise ValueError('Expecting a positive number of attempts')
+
+        self._download = download
+        # more connections wouldn't be kept in the pool for reuse
+        self._concurrency = min(concurrency, _POOL_MAXSIZE)
+        self._max_attempts = max_attempts
+        self._backoff_factor = backoff_factor
+        self._backoff_max = backoff_max
+
+    def send(self, items: Iterable[dict]) -> Generator[FileDownloadResult,
+                                                       None, None]:
+        """Download files.
+
+        The failure of a file doesn't stop the download of the others,
+        it's reported in its result.
+
+        Args:
+            items: Items describing the files to download.
+
+        Yields:
+            One result per item, as soon as its download is over.
+
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+                self._concurrency) as executor:
+            futures = [executor.submit(self._send_one, FileDownloadResult(i))
+                       for i in items]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    yield future.result()
+            finally:
+                # when the iteration is stopped early
+                for future in futures:
+                    future.cancel()
+
+    def _send_one(self, result: FileDownloadResult) -> FileDownloadResult:
+        while True:
+            result.attempt += 1
+            try:
+                result.file_path = self._download(result.item)
+                result.error = None
+                return result
+            except _RETRY_ERRORS as e:
+                result.error = e
+                if result.attempt >= self._max_attempts:
+                    break
+                logger.warning('Failed to download {}/{}: {!r}'.format(
+                    result.dataset, result.component, e))
+                time.sleep(backoff_delay(result.attempt,
+                                         factor=self._backoff_factor,
+                                         maximum=self._backoff_max))
+            except Exception as e:
+                result.error = e
+                break
+
+        logger.warning('Failed to download {}/{}: {!r}'.format(
+            result.dataset, result.component, result.error))
+        return result
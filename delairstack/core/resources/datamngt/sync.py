@@ -0,0 +1,271 @@
+"""Incremental mirror of datasets to a local directory.
+
+"""
+
+import json
+import os
+import time
+
+from .download import FileDownloadResult
+from .upload import component_checksum
+from delairstack.core.utils.typing import Callable, Iterable, List, Optional
+
+# Name of the manifest of a mirror in its directory
+MANIFEST_NAME = '.delairstack-sync.json'
+
+# Minimal delay between two saves of the manifest during the downloads
+# (in seconds)
+_MANIFEST_SAVE_INTERVAL = 5.0
+
+
+class SyncManifest(object):
+    """Manifest of the datasets mirrored in a directory.
+
+    The manifest maps the identifier of each dataset to its
+    modification date and, for each of its components, the checksum,
+    the modification date of the dataset when downloaded and the path
+    relative to the directory of the mirrored file. It also records
+    the modification date from which the datasets are listed by the
+    next synchronization.
+
+    """
+    def __init__(self, target_dir: str, path: Optional[str] = None):
+        self.target_dir = target_dir
+        self.path = path or os.path.join(target_dir, MANIFEST_NAME)
+        self.datasets = {}
+        self.modified_since = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            data = {}
+        self.datasets = data.get('datasets', {})
+        self.modified_since = data.get('modified_since')
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'datasets': self.datasets,
+                       'modified_since': self.modified_since}, fh)
+        os.replace(tmp_path, self.path)
+
+
+class SyncReport(object):
+    """Report of the synchronization of a mirror.
+
+    """
+    def __init__(self, *, downloads: List[FileDownloadResult],
+                 unchanged: int, pruned: List[str], elapsed: float):
+        self.downloads = downloads
+        self.unchanged = unchanged
+        self.pruned = pruned
+        self.elapsed = elapsed
+
+    @property
+    def failed(self) -> List[FileDownloadResult]:
+        """Results of the components whose download failed."""
+        return [r for r in self.downloads if not r.succeeded]
+
+    def __repr__(self):
+        return ('<{} {} downloaded, {} failed, {} unchanged, '
+                '{} pruned>').format(type(self).__name__,
+                                     len(self.downloads) - len(self.failed),
+                                     len(self.failed), self.unchanged,
+                                     len(self.pruned))
+
+
+class ProjectSync(object):
+    """Mirror datasets to a local directory, downloading changes only.
+
+    The component ``c`` of the dataset ``d`` is mirrored in the
+    directory ``d/c`` of the target directory. A component is
+    downloaded again when its checksum changes or, for components
+    without checksum, when the modification date of its dataset
+    changes. Files of the datasets or components no longer listed are
+    removed when ``prune`` is True.
+
+    Only the datasets modified since the previous synchronization are
+    listed, the files of the others being checked locally, unless
+    ``prune`` is True since deleted datasets are found by listing all
+    the datasets. The manifest is saved periodically during the
+    downloads, so that an interrupted synchronization doesn't download
+    again the files already mirrored.
+
+    """
+    def __init__(self, *, list_datasets: Callable[[Optional[str]],
+                                                  Iterable],
+                 download: Callable[[List[dict]],
+                                    Iterable[FileDownloadResult]],
+                 target_dir: str, prune: bool = False,
+                 manifest_path: Optional[str] = None):
+        """Initializes a synchronization.
+
+        Args:
+            list_datasets: Callable returning the descriptions of the
+                datasets to mirror modified since a date, or of all
+                the datasets when called with None.
+
+            download: Callable downloading items as
+                ``download_components()``, with a ``target_path``
+                per item, and yielding their results.
+
+            target_dir: Directory of the mirror.
+
+            prune: Whether to remove the files of the datasets and
+                components no longer listed.
+
+            manifest_path: Optional path to the manifest. Default to a
+                file in ``target_dir``.
+
+        """
+        self._list_datasets = list_datasets
+        self._download = download
+        self._target_dir = target_dir
+        self._prune = prune
+        self._manifest = SyncManifest(target_dir, manifest_path)
+
+    def _exists(self, entry: dict) -> bool:
+        path = entry.get('path')
+        return path is not None and os.path.isfile(
+            os.path.join(self._target_dir, path))
+
+    def _item(self, dataset: str, component: str,
+              checksum: Optional[str]) -> dict:
+        return {'dataset': dataset, 'component': component,
+                'md5hash': checksum,
+                'target_path': os.path.join(self._target_dir, dataset,
+                                            component)}
+
+    def send(self) -> SyncReport:
+        """Synchronize the mirror.
+
+        Returns:
+            A ``SyncReport`` with the results of the downloads, the
+            number of unchanged components and the removed files.
+
+        """
+        start = time.monotonic()
+        manifest = self._manifest
+        manifest.load()
+        previous = manifest.datasets
+        since = None if self._prune else manifest.modified_since
+
+        datasets = {}
+        dates = {}
+        items = []
+        unchanged = 0
+        for desc in self._list_datasets(since):
+            date = getattr(desc, 'modification_date', None)
+            dates[desc.id] = date
+            old_components = previous.get(desc.id, {}).get('components', {})
+            entry = {'modification_date': date, 'components': {}}
+            for comp in getattr(desc, 'components', None) or []:
+                name = comp.get('name')
+                checksum = component_checksum(desc, name)
+                old_comp = old_components.get(name)
+                if old_comp is not None:
+                    # kept until downloaded again
+                    entry['components'][name] = old_comp
+                    if checksum is not None:
+                        same = old_comp.get('checksum') == checksum
+                    else:
+                        same = (date is not None and
+                                old_comp.get('modification_date') == date)
+                    if same and self._exists(old_comp):
+                        unchanged += 1
+                        continue
+                items.append(self._item(desc.id, name, checksum))
+            datasets[desc.id] = entry
+
+        pruned = []
+        for dataset, old in previous.items():
+            if since is not None and dataset not in datasets:
+                # not modified, only the local files are checked
+                datasets[dataset] = old
+                for name, comp in old.get('components', {}).items():
+                    if self._exists(comp):
+                        unchanged += 1
+                    else:
+                        items.append(self._item(dataset, name,
+                                                comp.get('checksum')))
+                continue
+            removed = [(n, c) for n, c in old.get('components', {}).items()
+                       if n not in datasets.get(dataset, {})
+                       .get('components', {})]
+            if not self._prune:
+                # kept for a later pruning
+                entry = datasets.setdefault(dataset, old)
+                entry['components'].update(removed)
+                continue
+            for _, comp in removed:
+                if self._remove(comp):
+                    pruned.append(comp['path'])
+
+        manifest.datasets = datasets
+        downloads = []
+        failed_dates = []
+        saved_at = time.monotonic()
+        try:
+            for result in self._download(items):
+                downloads.append(result)
+                date = dates.get(result.dataset)
+                if result.succeeded:
+                    self._record(datasets[result.dataset], result,
+                                 date or datasets[result.dataset]
+                                 .get('modification_date'))
+                elif result.dataset in dates:
+                    failed_dates.append(date)
+                if time.monotonic() - saved_at >= _MANIFEST_SAVE_INTERVAL:
+                    manifest.save()
+                    saved_at = time.monotonic()
+
+            listed = [d for d in dates.values() if d is not None]
+            if failed_dates:
+                # listed again by the next synchronization
+                if None not in failed_dates:
+                    manifest.modified_since = min(failed_dates)
+            elif listed:
+                manifest.modified_since = max(listed + [since or ''])
+        finally:
+            manifest.save()
+
+        return SyncReport(downloads=downloads, unchanged=unchanged,
+                          pruned=pruned, elapsed=time.monotonic() - start)
+
+    def _record(self, entry: dict, result: FileDownloadResult,
+                date: Optional[str]):
+        path = os.path.relpath(result.file_path, self._target_dir)
+        old_comp = entry['components'].get(result.component)
+        if old_comp is not None and old_comp.get('path') != path:
+            # renamed since the previous download
+            self._remove(old_comp)
+        entry['components'][result.component] = {
+            'checksum': result.item.get('md5hash'),
+            'modification_date': date,
+            'path': path}
+
+    def _remove(self, comp: dict) -> bool:
+        path = comp.get('path')
+        if path is None:
+            return False
+        file_path = os.path.join(self._target_dir, path)
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            return False
+
+        # remove the emptied directories of the dataset
+        target_dir = os.path.abspath(self._target_dir)
+        directory = os.path.dirname(os.path.abspath(file_path))
+        while directory != target_dir and \
+                directory.startswith(target_dir + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+        return True
@@ -0,0 +1,152 @@
+"""Concurrent fetcher of tile pyramids.
+
+"""
+
+import concurrent.futures
+import logging
+import time
+
+import urllib3.exceptions
+
+from ...errors import ResponseError
+from .upload import backoff_delay
+from delairstack.core.utils.tiles import MBTilesCache
+from delairstack.core.utils.typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a tile is requested again
+_RETRY_ERRORS = (ConnectionError, urllib3.exceptions.HTTPError)
+
+# Number of tiles written between commits of the cache
+_COMMIT_INTERVAL = 500
+
+Tile = Tuple[int, int, int]
+
+
+class TileFetchReport(object):
+    """Report of the fetch of tiles.
+
+    """
+    def __init__(self, *, fetched: int, skipped: int, missing: List[Tile],
+                 failed: List[Tile], elapsed: float):
+        self.fetched = fetched
+        self.skipped = skipped
+        self.missing = missing
+        self.failed = failed
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return ('<{} {} fetched, {} skipped, {} missing, '
+                '{} failed>').format(type(self).__name__, self.fetched,
+                                     self.skipped, len(self.missing),
+                                     len(self.failed))
+
+
+class TileFetcher(object):
+    """Fetch tiles concurrently into an MBTiles cache.
+
+    Tiles are requested through the connection, sharing its pool, by
+    ``concurrency`` threads, and written to the cache by the calling
+    thread. Tiles already in the cache are skipped. Tiles the server
+    answers with an error status (e.g. outside of the dataset) are
+    reported as missing. Tiles failing with a transient error are
+    requested again after a random delay, up to ``max_attempts``
+    times.
+
+    """
+    def __init__(self, connection, url_template: str, cache: MBTilesCache,
+                 *, concurrency: int = 8, max_attempts: int = 3,
+                 backoff_factor: float = 0.5, backoff_max: float = 30.0):
+        if concurrency < 1:
+            raise ValueError('Expecting a positive concurrency')
+        if max_attempts < 1:
+            raise ValueError('Expecting a positive number of attempts')
+
+        self._connection = connection
+        self._url_template = url_template
+        self._cache = cache
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._backoff_factor = backoff_factor
+        self._backoff_max = backoff_max
+
+    def _fetch(self, tile: Tile) -> Optional[bytes]:
+        z, x, y = tile
+        url = self._url_template.format(z=z, x=x, y=y)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self._connection.get(path=url)
+            except ResponseError:
+                return None
+            except _RETRY_ERRORS as e:
+                if attempt >= self._max_attempts:
+                    raise
+                logger.warning('Failed to fetch tile {}: {!r}'.format(
+                    tile, e))
+                time.sleep(backoff_delay(attempt,
+                                         factor=self._backoff_factor,
+                                         maximum=self._backoff_max))
+
+    def send(self, tiles: Iterable[Tile]) -> TileFetchReport:
+        """Fetch tiles missing from the cache.
+
+        Args:
+            tiles: Tuples ``(z, x, y)`` of XYZ tiles.
+
+        Returns:
+            A ``TileFetchReport`` with the numbers of fetched and
+            skipped tiles, and the missing and failed tiles.
+
+        """
+        start = time.monotonic()
+        fetched = skipped = 0
+        missing = []
+        failed = []
+        pending = {}
+        # bounded to keep the memory constant for large pyramids
+        window = 4 * self._concurrency
+
+        def collect(done):
+            nonlocal fetched
+            for future in done:
+                tile = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    logger.warning('Failed to fetch tile {}: {!r}'.format(
+                        tile, e))
+                    failed.append(tile)
+                    continue
+                if not data:
+                    missing.append(tile)
+                    continue
+                self._cache.put(*tile, data)
+                fetched += 1
+                if fetched % _COMMIT_INTERVAL == 0:
+                    self._cache.commit()
+
+        with concurrent.futures.ThreadPoolExecutor(
+                self._concurrency) as executor:
+            try:
+                for tile in tiles:
+                    if tile in self._cache:
+                        skipped += 1
+                        continue
+                    pending[executor.submit(self._fetch, tile)] = tile
+                    if len(pending) >= window:
+                        done, _ = concurrent.futures.wait(
+                            pending,
+                            return_when=concurrent.futures.FIRST_COMPLETED)
+                        collect(done)
+                collect(concurrent.futures.as_completed(list(pending)))
+            finally:
+                for future in pending:
+                    future.cancel()
+                self._cache.commit()
+
+        return TileFetchReport(fetched=fetched, skipped=skipped,
+                               missing=missing, failed=failed,
+                               elapsed=time.monotonic() - start)
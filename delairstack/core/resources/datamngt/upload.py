@@ -2,17 +2,32 @@
 
 """
 
-import concurrent.futures as cf
+import concurrent.futures
 import functools
 import hashlib
+import io
 import json
 import logging
 import math
+import mmap
 import os
+import queue
+import random
+import threading
+import time
 import urllib
 
-from ...errors import UploadError
-from delairstack.core.utils.typing import Optional
+from appdirs import user_cache_dir
+
+from ...config import APPAUTHOR, APPNAME
+from ...errors import ResponseError, UploadError
+from delairstack.core.utils.filehelper import iter_readinto
+from delairstack.core.utils.progress import (ProgressCallback,
+                                             ProgressTracker,
+                                             TransferSummary)
+from delairstack.core.utils.throttle import (ThrottledBody, TokenBucket,
+                                             make_throttle)
+from delairstack.core.utils.typing import List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +35,243 @@ logger = logging.getLogger(__name__)
 # last part can be any size > 0
 _S3_CHUNK_MIN_SIZE = 5 * 1024 * 1024
 
+# Maximal number of parts of a multipart upload on AWS S3
+_S3_MAX_PARTS = 10000
+
+# Maximal chunk size accepted by the data-manager (in bytes)
+_CHUNK_MAX_SIZE = 50 * 1024 * 1024
+
+# Duration targeted for the upload of a part when the chunk size is
+# chosen from the measured throughput (in seconds)
+_AUTO_CHUNK_DURATION = 15.0
+
+# Number of parts targeted when no throughput has been measured
+_AUTO_CHUNK_COUNT = 1000
+
+# Minimal number of parts, for the parts of a file to be sent in parallel
+_AUTO_CHUNK_MIN_COUNT = 8
+
+# Size of the blocks read from non seekable file objects (in bytes)
+_STREAM_BLOCK_SIZE = 1024 * 1024
+
+# Default maximal size of the part buffers held by all uploads (in bytes)
+_DEFAULT_BUFFERS_MAX_SIZE = 512 * 1024 * 1024
+
+# Part uploads failing with those status codes (or without response)
+# are retried, 401 meaning that the token has been renewed
+_RETRY_STATUS_CODES = frozenset((401, 408, 429, 500, 502, 503, 504))
+
+
+def _is_rejected(status_code: Optional[int]) -> bool:
+    """Whether a status means that the upload is refused by the server."""
+    return status_code is not None and 400 <= status_code < 500 and \
+        status_code not in _RETRY_STATUS_CODES
+
+
+# Keys of the checksum of a component in a dataset description
+_COMPONENT_CHECKSUM_KEYS = ('md5hash', 'checksum')
+
+DEFAULT_JOURNAL_DIR = os.path.join(user_cache_dir(APPNAME, APPAUTHOR),
+                                   'uploads')
+
+DEFAULT_HASH_CACHE_PATH = os.path.join(user_cache_dir(APPNAME, APPAUTHOR),
+                                       'hashes.jsonl')
+
+
+def backoff_delay(attempt: int, *, factor: float, maximum: float) -> float:
+    """Return the delay before a new attempt (exponential, full jitter).
+
+    Args:
+        attempt: Number of the failed attempt, starting at 1.
+
+        factor: Base delay in seconds.
+
+        maximum: Maximal delay in seconds.
+
+    Returns:
+        A random delay between 0 and ``factor * 2 ** (attempt - 1)``
+        seconds, capped to ``maximum``.
+
+    """
+    delay = factor * (2 ** (attempt - 1))
+    return random.uniform(0, min(maximum, delay))
+
+
+class ThroughputEstimator(object):
+    """Exponentially weighted moving average of request throughputs.
+
+    """
+    def __init__(self, *, alpha: float = 0.3):
+        self._alpha = alpha
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> Optional[float]:
+        """Estimated throughput of a request in bytes per second."""
+        return self._value
+
+    def record(self, size: int, elapsed: float):
+        """Record the transfer of ``size`` bytes in ``elapsed`` seconds."""
+        if elapsed <= 0:
+            return
+
+        throughput = size / elapsed
+        with self._lock:
+            if self._value is None:
+                self._value = throughput
+            else:
+                self._value = (self._alpha * throughput +
+                               (1 - self._alpha) * self._value)
+
+
+upload_throughput = ThroughputEstimator()
+
+
+def choose_chunk_size(file_size: Optional[int], *,
+                      throughput: Optional[float] = None) -> int:
+    """Choose the size of the parts of a multipart upload.
+
+    The parts are large enough for the file to be split in at most
+    10,000 parts (S3 limit). Within that limit, a part should take
+    about 15 seconds to upload at ``throughput`` so that the overhead
+    of each request stays low on fast links while the retry of a part
+    stays cheap on slow links. When no throughput is known, the file
+    is split in about 1,000 parts. Files larger than 40MB are split
+    in at least 8 parts, to be sent in parallel.
+
+    Args:
+        file_size: Size of the file to upload, None when unknown.
+
+        throughput: Throughput of a request in bytes per second.
+            Default to the throughput measured on previous uploads.
+
+    Returns:
+        A chunk size between 5MB and 50MB, multiple of 1MB except for
+        the bounds.
+
+    Raises:
+        ValueError: When the file is too large to be uploaded in at
+            most 10,000 parts of 50MB.
+
+    """
+    min_size = _S3_CHUNK_MIN_SIZE
+    if file_size is not None:
+        min_size = max(min_size, math.ceil(file_size / _S3_MAX_PARTS))
+        if min_size > _CHUNK_MAX_SIZE:
+            raise ValueError('File too large for a multipart upload: '
+                             '{} bytes'.format(file_size))
+
+    if throughput is None:
+        throughput = upload_throughput.value
+
+    if throughput is not None:
+        size = throughput * _AUTO_CHUNK_DURATION
+    elif file_size is not None:
+        size = file_size / _AUTO_CHUNK_COUNT
+    else:
+        size = 0
+    if file_size is not None:
+        size = min(size, file_size / _AUTO_CHUNK_MIN_COUNT)
+
+    mb = 1024 * 1024
+    size = math.ceil(size / mb) * mb
+    return min(max(size, min_size), _CHUNK_MAX_SIZE)
+
+
+class BufferBudget(object):
+    """Bound the size of the buffers held by concurrent uploads.
+
+    A buffer larger than the budget is accepted when no other buffer
+    is held, so that any part can eventually be sent.
+
+    """
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._used = 0
+        self._cond = threading.Condition()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value: int):
+        if value <= 0:
+            raise ValueError('Expecting a positive size')
+        with self._cond:
+            self._max_size = value
+            self._cond.notify_all()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def acquire(self, size: int):
+        """Wait until ``size`` bytes are available and reserve them."""
+        with self._cond:
+            while self._used > 0 and self._used + size > self._max_size:
+                self._cond.wait()
+            self._used += size
+
+    def release(self, size: int):
+        """Release ``size`` bytes previously reserved."""
+        with self._cond:
+            self._used -= size
+            self._cond.notify_all()
+
+
+upload_buffers = BufferBudget(_DEFAULT_BUFFERS_MAX_SIZE)
+
+
+def set_upload_buffers_max_size(max_size: int):
+    """Set the maximal size of the part buffers held by all uploads.
+
+    Args:
+        max_size: Size in bytes. Default to 512MB.
+
+    """
+    upload_buffers.max_size = max_size
+
+
+class FilePart(object):
+    """Read-only view on a range of a file.
+
+    The range is memory mapped when possible, otherwise it is read in
+    memory. ``view`` can be sent and hashed without any copy.
+
+    """
+    def __init__(self, fh, *, offset: int, size: int, lock=None):
+        self._map = None
+        self._base = None
+        try:
+            # mmap offsets must be multiples of the allocation granularity
+            delta = offset % mmap.ALLOCATIONGRANULARITY
+            self._map = mmap.mmap(fh.fileno(), size + delta,
+                                  offset=offset - delta,
+                                  access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            with lock or threading.Lock():
+                fh.seek(offset)
+                self.view = memoryview(fh.read(size))
+        else:
+            self._base = memoryview(self._map)
+            self.view = self._base[delta:delta + size]
+
+    def __len__(self):
+        return len(self.view)
+
+    def close(self):
+        self.view.release()
+        if self._base is not None:
+            self._base.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # still exported by the HTTP layer, closed once collected
+                pass
+
 
 class Chunk(object):
     """Store the state of the upload of a file chunk.
@@ -31,6 +283,11 @@ class Chunk(object):
         self.status = status
         self.attempt = 0
         self.req = None
+        self.part = None
+        self.md5hash = None
+        self.data = None
+        self.sent_at = None
+        self.status_code = None
 
     def __str__(self):
         template = 'Chunk {index}: {size} {status} {attempt} {req}'
@@ -73,26 +330,492 @@ def prepare_chunks(*, file_size: int, chunk_size: int):
     return chunks
 
 
+def compute_checksums(file_path: str, *,
+                      chunk_size: int) -> Tuple[str, List[str]]:
+    """Compute the MD5 hashes of a file and of its parts in one pass.
+
+    Each part is memory mapped once and both hashes are updated from
+    the same view.
+
+    Args:
+        file_path: Path to the file.
+
+        chunk_size: Common size of the parts.
+
+    Returns:
+        Tuple made of the MD5 hash of the file and the list of MD5
+        hashes of its parts, as hexadecimal digits.
+
+    """
+    file_size = os.path.getsize(file_path)
+    file_hash = hashlib.md5()
+    part_hashes = []
+    with open(file_path, 'rb') as fh:
+        for chunk in prepare_chunks(file_size=file_size,
+                                    chunk_size=chunk_size):
+            part = FilePart(fh, offset=chunk.index * chunk_size,
+                            size=chunk.size)
+            try:
+                file_hash.update(part.view)
+                part_hashes.append(hashlib.md5(part.view).hexdigest())
+            finally:
+                part.close()
+    return file_hash.hexdigest(), part_hashes
+
+
+class UploadJournal(object):
+    """Journal of the parts of a multipart upload already uploaded.
+
+    The journal of the upload of a file to a dataset component is a
+    JSON lines file made of a header identifying the uploaded file
+    followed by the numbers of the uploaded parts. A journal whose
+    header doesn't match the file (e.g. modified since) is discarded.
+
+    """
+    def __init__(self, journal_dir: Optional[str], *, file_path: str,
+                 dataset: str, component_name: str,
+                 chunk_size: Optional[int], md5hash: Optional[str] = None):
+        stat = os.stat(file_path)
+        self._header = {'dataset': dataset,
+                        'component': component_name,
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime_ns,
+                        'chunk_size': chunk_size,
+                        'checksum': md5hash}
+        name = hashlib.sha1(json.dumps([dataset, component_name])
+                            .encode('utf-8')).hexdigest()
+        self._path = os.path.join(journal_dir or DEFAULT_JOURNAL_DIR,
+                                  '{}.journal'.format(name))
+        self._lock = threading.Lock()
+        self._fh = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> Set[int]:
+        """Read the numbers of the uploaded parts.
+
+        Returns:
+            Set of part numbers, empty when no matching journal is found.
+
+        """
+        try:
+            with open(self._path, 'r') as fh:
+                lines = fh.read().splitlines()
+        except OSError:
+            return set()
+
+        parts = set()
+        try:
+            if not lines or json.loads(lines[0]) != self._header:
+                return set()
+            for line in lines[1:]:
+                parts.add(int(line))
+        except ValueError:
+            # truncated by an interruption, the complete lines are kept
+            pass
+        return parts
+
+    def recorded_chunk_size(self) -> Optional[int]:
+        """Read the size of the parts of an upload of the same file.
+
+        The sizes of the parts and the checksums aren't compared, so
+        that an upload whose chunk size was chosen automatically can be
+        resumed with the same chunk size.
+
+        Returns:
+            The chunk size recorded in the journal, None when no journal
+            of the upload of the file is found.
+
+        """
+        try:
+            with open(self._path, 'r') as fh:
+                header = json.loads(fh.readline())
+        except (OSError, ValueError):
+            return None
+
+        keys = ('dataset', 'component', 'size', 'mtime')
+        if not isinstance(header, dict) or \
+                any(header.get(k) != self._header[k] for k in keys):
+            return None
+        chunk_size = header.get('chunk_size')
+        return chunk_size if isinstance(chunk_size, int) else None
+
+    def open(self, parts: Set[int]):
+        """Open the journal for recording.
+
+        Args:
+            parts: Numbers of the parts already uploaded, the journal
+                being rewritten from scratch when empty.
+
+        """
+        if parts:
+            self._fh = open(self._path, 'a')
+        else:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            self._fh = open(self._path, 'w')
+            self._fh.write(json.dumps(self._header) + '\n')
+            self._fh.flush()
+
+    def record(self, part_number: int):
+        """Record an uploaded part."""
+        with self._lock:
+            self._fh.write('{}\n'.format(part_number))
+            self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def remove(self):
+        """Close and remove the journal."""
+        self.close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class FileHashCache(object):
+    """Cache of the MD5 hashes of local files.
+
+    Hashes are recorded in a JSON lines file, one line per file with
+    its absolute path, size and modification time. A hash is computed
+    again when the file has been modified since it was recorded. The
+    file is rewritten when loaded if it holds superseded lines.
+
+    """
+    def __init__(self, path: str = None):
+        self._path = path or DEFAULT_HASH_CACHE_PATH
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _load(self) -> dict:
+        entries = {}
+        count = 0
+        try:
+            with open(self._path, 'r') as fh:
+                for line in fh:
+                    count += 1
+                    try:
+                        entry = json.loads(line)
+                        entries[entry['path']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        # truncated by an interruption
+                        continue
+        except OSError:
+            pass
+        if count > len(entries):
+            self._compact(entries)
+        return entries
+
+    def _compact(self, entries: dict):
+        tmp_path = self._path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as fh:
+                for entry in entries.values():
+                    fh.write(json.dumps(entry) + '\n')
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.warning('Failed to compact {}: {!r}'.format(
+                self._path, e))
+
+    def get(self, file_path: str) -> str:
+        """Return the MD5 hash of a file, computing it if needed.
+
+        Args:
+            file_path: Path to the file.
+
+        Returns:
+            The MD5 hash of the file as hexadecimal digits.
+
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            entry = self._entries.get(file_path)
+        if entry is not None and entry.get('size') == stat.st_size \
+                and entry.get('mtime') == stat.st_mtime_ns:
+            return entry['md5hash']
+
+        file_hash = hashlib.md5()
+        with open(file_path, 'rb') as fh:
+            for view in iter_readinto(fh, buffer_size=_STREAM_BLOCK_SIZE):
+                file_hash.update(view)
+        md5hash = file_hash.hexdigest()
+        entry = {'path': file_path, 'size': stat.st_size,
+                 'mtime': stat.st_mtime_ns, 'md5hash': md5hash}
+        with self._lock:
+            self._entries[file_path] = entry
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                with open(self._path, 'a') as fh:
+                    fh.write(json.dumps(entry) + '\n')
+            except OSError as e:
+                logger.warning('Failed to record the hash of {}: {!r}'.format(
+                    file_path, e))
+        return md5hash
+
+
+file_hashes = FileHashCache()
+
+
+def component_checksum(desc, component: str) -> Optional[str]:
+    """Return the checksum of a component from a dataset description.
+
+    Args:
+        desc: Dataset description (resource or dictionary).
+
+        component: Name of the component.
+
+    Returns:
+        The MD5 hash recorded for the component, None when the
+        component is missing or has no recorded checksum.
+
+    """
+    if isinstance(desc, dict):
+        components = desc.get('components')
+    else:
+        components = getattr(desc, 'components', None)
+    for comp in components or []:
+        if comp.get('name') == component:
+            for key in _COMPONENT_CHECKSUM_KEYS:
+                if comp.get(key):
+                    return comp[key]
+            return None
+    return None
+
+
+class _MemoryPart(object):
+    """Part held in memory, with the same interface as ``FilePart``."""
+    def __init__(self, view: memoryview):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+    def close(self):
+        self.view.release()
+
+
+class FileSource(object):
+    """Data of a seekable file object, read from its current position.
+
+    Parts are memory mapped when the file object has a file
+    descriptor, otherwise they are read under a lock.
+
+    """
+    def __init__(self, fh, *, size: Optional[int] = None):
+        self._fh = fh
+        self._offset = fh.tell()
+        if size is None:
+            size = fh.seek(0, io.SEEK_END) - self._offset
+            fh.seek(self._offset)
+        self.size = size
+        self._lock = threading.Lock()
+
+    def chunks(self, chunk_size: int):
+        return iter(prepare_chunks(file_size=self.size,
+                                   chunk_size=chunk_size))
+
+    def open_part(self, chunk: Chunk, chunk_size: int):
+        offset = self._offset + chunk.index * chunk_size
+        return FilePart(self._fh, offset=offset, size=chunk.size,
+                        lock=self._lock)
+
+    def open_all(self):
+        return FilePart(self._fh, offset=self._offset, size=self.size,
+                        lock=self._lock)
+
+
+class BufferSource(object):
+    """Data of an object supporting the buffer protocol.
+
+    Parts are slices of the buffer, no copy is made.
+
+    """
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self.size = self._view.nbytes
+
+    def chunks(self, chunk_size: int):
+        return iter(prepare_chunks(file_size=self.size,
+                                   chunk_size=chunk_size))
+
+    def open_part(self, chunk: Chunk, chunk_size: int):
+        offset = chunk.index * chunk_size
+        return _MemoryPart(self._view[offset:offset + chunk.size])
+
+    def open_all(self):
+        return _MemoryPart(self._view[:])
+
+
+class IterSource(object):
+    """Data of an iterable of bytes, of possibly unknown size.
+
+    The data are split into parts as they are read, a part being held
+    in memory until it's uploaded.
+
+    """
+    def __init__(self, iterable, *, size: Optional[int] = None):
+        self._it = iter(iterable)
+        self._head = bytearray()
+        self.size = size
+
+    def probe(self, size: int) -> Optional[int]:
+        """Read ahead at most ``size`` bytes to learn the data size.
+
+        Args:
+            size: Number of bytes to read ahead.
+
+        Returns:
+            Size of the data if they are shorter than ``size`` bytes,
+            else the size given at creation (maybe None).
+
+        """
+        for data in self._it:
+            self._head += data
+            if len(self._head) >= size:
+                break
+        else:
+            self.size = len(self._head)
+        return self.size
+
+    def chunks(self, chunk_size: int):
+        buf = self._head
+        self._head = bytearray()
+        index = 0
+        for data in self._it:
+            buf += data
+            while len(buf) >= chunk_size:
+                chunk = Chunk(index, size=chunk_size)
+                chunk.data = buf[:chunk_size]
+                del buf[:chunk_size]
+                index += 1
+                yield chunk
+        if buf:
+            chunk = Chunk(index, size=len(buf))
+            chunk.data = buf
+            yield chunk
+
+    def open_part(self, chunk: Chunk, chunk_size: int):
+        return _MemoryPart(memoryview(chunk.data))
+
+    def open_all(self):
+        for data in self._it:
+            self._head += data
+        self.size = len(self._head)
+        return _MemoryPart(memoryview(self._head))
+
+
+def make_upload_source(data, *, size: Optional[int] = None):
+    """Wrap data to upload.
+
+    Args:
+        data: A seekable file object, an object supporting the buffer
+            protocol (e.g. ``bytes``), a non seekable file object or
+            an iterable of bytes.
+
+        size: Optional size of the data, read from the current
+            position for file objects. Required by seekable file
+            objects not supporting ``seek(0, SEEK_END)``.
+
+    Returns:
+        A ``FileSource``, ``BufferSource`` or ``IterSource``.
+
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return BufferSource(data)
+
+    if hasattr(data, 'read'):
+        try:
+            seekable = data.seekable()
+        except AttributeError:
+            seekable = False
+        if seekable:
+            return FileSource(data, size=size)
+        return IterSource(iter(lambda: data.read(_STREAM_BLOCK_SIZE), b''),
+                          size=size)
+
+    return IterSource(data, size=size)
+
+
 class MultipartUpload(object):
     """Send a given file in multiple requests.
 
     It raises a ``ValueError`` when ``chunk_size`` is < _S3_CHUNK_MIN_SIZE.
 
+    The parts are memory mapped instead of being read in memory. The
+    size of the parts held until their request ends is bounded by
+    ``buffers`` (default to the budget shared by all uploads, see
+    ``set_upload_buffers_max_size()``).
+
+    Resumable uploads record the uploaded parts in a journal stored in
+    ``journal_dir`` (default to ``DEFAULT_JOURNAL_DIR``).
+
+    A part whose upload fails with a transient error (e.g. a timeout
+    or a 502 status) is sent again after a random delay, up to
+    ``max_attempts`` times. The delay is drawn between 0 and
+    ``backoff_factor * 2 ** (attempt - 1)`` seconds, capped to
+    ``backoff_max``.
+
+    The window of in-flight requests can be shared with other uploads
+    through ``window``, a semaphore initialized with the number of
+    requests allowed in flight.
+
+    The throughput of the parts is recorded in ``throughput`` (default
+    to the estimator used by ``choose_chunk_size()``).
+
+    The parts are sent at the rate allowed by ``throttle`` (default to
+    the bandwidth limit shared by all transfers, see
+    ``set_bandwidth_limit()``).
+
     """
-    def __init__(self, connection, base_url, *, chunk_size=_S3_CHUNK_MIN_SIZE):
+    def __init__(self, connection, base_url, *, chunk_size=_S3_CHUNK_MIN_SIZE,
+                 buffers: BufferBudget = None,
+                 journal_dir: Optional[str] = None,
+                 max_attempts: int = 5, backoff_factor: float = 0.5,
+                 backoff_max: float = 30.0,
+                 window: Optional[threading.Semaphore] = None,
+                 throughput: Optional[ThroughputEstimator] = None,
+                 throttle: Optional[TokenBucket] = None):
         if chunk_size < _S3_CHUNK_MIN_SIZE:
             raise ValueError(
                 "Chunk size must be >= {} bytes; received : {}".format(
                     _S3_CHUNK_MIN_SIZE, chunk_size)
             )
 
+        if max_attempts < 1:
+            raise ValueError('Expecting a positive number of attempts')
+
         self._base_url = base_url
         self._chunk_size = chunk_size
         self._connection = connection
+        self._buffers = buffers if buffers is not None else upload_buffers
+        self._journal_dir = journal_dir or DEFAULT_JOURNAL_DIR
+        self._max_attempts = max_attempts
+        self._backoff_factor = backoff_factor
+        self._backoff_max = backoff_max
+        self._window = window
+        self._throughput = (throughput if throughput is not None
+                            else upload_throughput)
+        self._throttle = throttle if throttle is not None else make_throttle()
 
         # updated through send() calls
         self._chunks = []
 
+    def _get_backoff(self, attempt: int) -> float:
+        return backoff_delay(attempt, factor=self._backoff_factor,
+                             maximum=self._backoff_max)
+
     @property
     def creation_url(self):
         return '{}/create-multipart-upload'.format(self._base_url)
@@ -117,28 +840,27 @@ class MultipartUpload(object):
     def completion_url(self):
         return '{}/complete-multipart-upload'.format(self._base_url)
 
-    @property
-    def _ongoing_chunks(self):
-        return [c for c in self._chunks
-                if c.status == 'preupload' and c.req is not None
-                and not c.req.done()]
-
-    @property
-    def _unfinished_chunks(self):
-        return [c for c in self._chunks
-                if c.status not in ('available', 'failed')]
-
-    @property
-    def _waiting_chunks(self):
-        return [c for c in self._chunks
-                if c.status not in ('available', 'failed') and c.req is None]
-
     def send(self, file_path: str, *,
-             dataset: str, component_name: str, md5hash: Optional[str] = None):
+             dataset: str, component_name: str, md5hash: Optional[str] = None,
+             compute_md5: bool = False, resume: bool = False,
+             progress: Optional[ProgressCallback] = None) -> TransferSummary:
         """Send a file in multiple requests.
 
         It raises ``UploadError`` in case of failure.
 
+        The parts are hashed by worker threads, right before being
+        sent. When ``compute_md5`` is True, the hashes of the file and
+        of its parts are computed in a single pass before the upload
+        is created, and the parts aren't hashed again.
+
+        When ``resume`` is True, the uploaded parts are recorded in a
+        journal kept in case of failure. A later call with ``resume``
+        equal to True, for the same unmodified file, only sends the
+        parts missing from the journal before completing the upload.
+        The journal is removed when the server rejects the upload
+        (e.g. expired or aborted), and a resumed upload rejected by the
+        server is sent again from scratch.
+
         Args:
             file_path: Path to the file to upload.
 
@@ -148,37 +870,185 @@ class MultipartUpload(object):
 
             md5hash: Optional MD5 hash of the file to upload read in
                 binary mode and containing only hexadecimal digits.
-                Will be computed when equal to None (the default).
+                Not sent when equal to None (the default), unless
+                ``compute_md5`` is True.
+
+            compute_md5: Whether to compute ``md5hash`` when equal to
+                None. Default to False.
+
+            resume: Whether to record the uploaded parts and resume a
+                previously interrupted upload. Default to False.
+
+            progress: Optional callable called with a
+                ``TransferProgress`` at most twice per second and at
+                the end of the upload, possibly from worker threads.
+
+        Returns:
+            A ``TransferSummary``.
 
         """
         if not os.path.exists(file_path):
             raise UploadError('File not found {}'.format(file_path))
 
         file_size = os.path.getsize(file_path)
-        params = {'file_path': file_path,
-                  'dataset': dataset,
+        params = {'dataset': dataset,
                   'component_name': component_name}
+        journal = None
+        tracker = ProgressTracker(total=file_size, callback=progress)
         try:
             self._chunks = prepare_chunks(file_size=file_size,
                                           chunk_size=self._chunk_size)
-            self._create(md5hash=md5hash, **params)
-            self._start(**params)
+            if md5hash is None and compute_md5:
+                md5hash, part_hashes = compute_checksums(
+                    file_path, chunk_size=self._chunk_size)
+                for chunk, part_hash in zip(self._chunks, part_hashes):
+                    chunk.md5hash = part_hash
+
+            uploaded = set()
+            if resume:
+                journal = UploadJournal(self._journal_dir,
+                                        file_path=file_path,
+                                        chunk_size=self._chunk_size,
+                                        md5hash=md5hash, **params)
+                uploaded = journal.load()
+                for chunk in self._chunks:
+                    if chunk.index + 1 in uploaded:
+                        chunk.status = 'available'
+                journal.open(uploaded)
+
+            if uploaded:
+                logger.info('Resuming upload of {}: {} parts already '
+                            'uploaded'.format(file_path, len(uploaded)))
+                tracker.add(sum(c.size for c in self._chunks
+                                if c.status == 'available'))
+                try:
+                    self._send_parts(file_path, file_size, journal=journal,
+                                     tracker=tracker, **params)
+                except (ResponseError, UploadError) as e:
+                    if not self._rejected(e):
+                        raise
+                    logger.warning('Resumed upload of {} rejected ({}), '
+                                   'uploading it again'.format(file_path, e))
+                    journal.remove()
+                    journal.open(set())
+                    for chunk in self._chunks:
+                        chunk.status = 'preupload'
+                        chunk.attempt = 0
+                        chunk.status_code = None
+                    tracker = ProgressTracker(total=file_size,
+                                              callback=progress)
+                    uploaded = set()
+
+            if not uploaded:
+                self._create(filename=os.path.basename(file_path),
+                             size=file_size, md5hash=md5hash, **params)
+                self._send_parts(file_path, file_size, journal=journal,
+                                 tracker=tracker, **params)
+        except Exception as e:
+            if journal is not None:
+                if self._rejected(e):
+                    # can't be resumed
+                    journal.remove()
+                else:
+                    journal.close()
+            self._chunks = []
+            raise e
+
+        if journal is not None:
+            journal.remove()
+        return tracker.finish()
+
+    def _send_parts(self, file_path: str, file_size: int, *, dataset: str,
+                    component_name: str,
+                    journal: Optional[UploadJournal] = None,
+                    tracker: Optional[ProgressTracker] = None):
+        """Send the parts not uploaded yet and complete the upload."""
+        params = {'dataset': dataset,
+                  'component_name': component_name}
+        with open(file_path, 'rb') as fh:
+            chunks = [c for c in self._chunks if c.status != 'available']
+            self._start(FileSource(fh, size=file_size), chunks,
+                        journal=journal, tracker=tracker, **params)
+        self._complete(**params)
+
+    def _rejected(self, error: Exception) -> bool:
+        """Whether an upload failed because the server refused it."""
+        if isinstance(error, ResponseError):
+            return _is_rejected(error.status)
+        if isinstance(error, UploadError):
+            return any(_is_rejected(c.status_code) for c in self._chunks)
+        return False
+
+    def send_stream(self, data, *, dataset: str, component_name: str,
+                    filename: str, size: Optional[int] = None,
+                    md5hash: Optional[str] = None,
+                    progress: Optional[ProgressCallback] = None
+                    ) -> TransferSummary:
+        """Send a file object, a buffer or an iterable in multiple requests.
+
+        The data are split into parts as they are read, without being
+        written to disk. Seekable file objects and buffers are read in
+        parallel like files, while the parts of other file objects and
+        iterables are read sequentially and held in memory until
+        they're uploaded.
+
+        It raises ``UploadError`` in case of failure.
+
+        Args:
+            data: A file object, an object supporting the buffer
+                protocol (e.g. ``bytes``) or an iterable of bytes.
+
+            dataset: Unique identifier of dataset.
+
+            component_name: Name of component to upload to.
+
+            filename: Name of the uploaded file.
+
+            size: Optional size of the data. The total size isn't
+                sent at upload creation when it's unknown.
+
+            md5hash: Optional MD5 hash of the data containing only
+                hexadecimal digits.
+
+            progress: Optional callable called with a
+                ``TransferProgress``, as in ``send()``.
+
+        Returns:
+            A ``TransferSummary``.
+
+        """
+        source = (data if isinstance(data, (FileSource, BufferSource,
+                                            IterSource))
+                  else make_upload_source(data, size=size))
+        if source.size is None:
+            source.probe(1)
+        if source.size == 0:
+            raise UploadError('No data to upload')
+
+        params = {'dataset': dataset,
+                  'component_name': component_name}
+        tracker = ProgressTracker(total=source.size, callback=progress)
+        try:
+            self._create(filename=filename, size=source.size,
+                         md5hash=md5hash, **params)
+            self._chunks = self._start(source, source.chunks(self._chunk_size),
+                                       tracker=tracker, **params)
             self._complete(**params)
         except Exception as e:
             self._chunks = []
             raise e
+        return tracker.finish()
 
-    def _create(self, *, file_path: str, dataset: str, component_name: str,
-                md5hash: Optional[str] = None):
+    def _create(self, *, filename: str, size: Optional[int], dataset: str,
+                component_name: str, md5hash: Optional[str] = None):
         headers = {'Cache-Control': 'no-cache',
                    'Content-Type': 'application/json'}
-        src_file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
         creation_desc = {'dataset': dataset,
                          'component': component_name,
-                         'filename': src_file_name,
-                         'chunk_size': self._chunk_size,
-                         'total_size': file_size}
+                         'filename': filename,
+                         'chunk_size': self._chunk_size}
+        if size is not None:
+            creation_desc.update({'total_size': size})
         if md5hash is not None:
             creation_desc.update({'checksum': md5hash})
 
@@ -186,73 +1056,158 @@ class MultipartUpload(object):
                               headers=headers,
                               data=json.dumps(creation_desc))
 
-    def _start(self, *, file_path: str, dataset: str, component_name: str):
+    def _start(self, source, chunks, *, dataset: str, component_name: str,
+               journal: Optional[UploadJournal] = None,
+               tracker: Optional[ProgressTracker] = None):
+        """Send the chunks.
+
+        At most ``max_request_workers`` chunks are in flight. Each
+        completion frees a slot in that window and immediately
+        unblocks the sending of the next chunk.
+
+        Chunks are taken lazily from ``chunks``, the chunks to retry
+        first. They are mapped, hashed and posted by worker threads so
+        that the dispatching thread is never blocked by hashing. The
+        uploaded chunks are recorded in ``journal`` and the progress
+        is reported to ``tracker``.
+
+        Returns:
+            List of the chunks sent.
+
+        """
         async_conn = self._connection.asynchronous
         max_simultaneous = async_conn.max_request_workers
+        if tracker is None:
+            tracker = ProgressTracker()
+
+        # chunks to retry, None marks the end of the upload
+        pending = queue.Queue()
+        started = []
+        chunks = iter(chunks)
+        exhausted = False
+
+        window = self._window or threading.BoundedSemaphore(max_simultaneous)
+        lock = threading.Lock()
+        unfinished = 0
 
-        def update_chunk(chunk, resp):
-            if resp.status_code == 200:
+        def on_done(chunk, req):
+            nonlocal unfinished
+            try:
+                status_code = req.result().status_code if req else None
+            except Exception as e:
+                logger.warning('Failed to upload chunk {}: {!r}'.format(
+                    chunk.index, e))
+                status_code = None
+
+            chunk.req = None
+            chunk.status_code = status_code
+            try:
+                if chunk.part is not None:
+                    chunk.part.close()
+            finally:
+                chunk.part = None
+                self._buffers.release(chunk.size)
+                window.release()
+            if status_code == 200:
                 chunk.status = 'available'
-            elif resp.status_code == 401 and chunk.attempt == 1:
+                self._throughput.record(chunk.size,
+                                        time.monotonic() - chunk.sent_at)
+                tracker.end_part(chunk.size)
+                if journal is not None:
+                    journal.record(chunk.index + 1)
+            elif (status_code is None or status_code in _RETRY_STATUS_CODES) \
+                    and chunk.attempt < self._max_attempts:
+                tracker.end_part(retried=True)
                 chunk.status = 'preupload'
+                delay = self._get_backoff(chunk.attempt)
+                logger.debug('Retrying chunk {} in {:.1f}s (status {})'.format(
+                    chunk.index, delay, status_code))
+                timer = threading.Timer(delay, pending.put, args=(chunk,))
+                timer.daemon = True
+                timer.start()
+                return
             else:
+                tracker.end_part()
                 chunk.status = 'failed'
-            chunk.req = None
+
+            chunk.data = None
+            with lock:
+                unfinished -= 1
+                if exhausted and unfinished == 0:
+                    pending.put(None)
 
         connection_delay = 30.0
-        request_delay = 10.0
-        join_delay = max_simultaneous * 60.0
+        join_delay = max_simultaneous * 60.0 + self._backoff_max
         upload_part_headers = {'Cache-Control': 'no-cache',
                                'Content-Type': 'application/octet-stream'}
-        with open(file_path, 'rb') as st:
-            while len(self._unfinished_chunks) > 0:
-                # limit the number of simultaneous enqueued requests
-                queued_requests = async_conn.executor._work_queue.qsize()
-                if queued_requests >= max_simultaneous:
-                    reqs = [c.req for c in self._ongoing_chunks]
-                    cf.wait(reqs, timeout=request_delay,
-                            return_when=cf.FIRST_COMPLETED)
-                    continue
-
-                # check whether all chunks have been sent
-                candidates = self._waiting_chunks
-                if len(candidates) == 0:
-                    break
-
-                # send first candidate
-                chunk = candidates[0]
-                chunk.attempt += 1
 
-                offset = chunk.index * self._chunk_size
-                st.seek(offset)
-                blob = st.read(chunk.size)
-                algo = hashlib.md5()
-                algo.update(blob)
-                md5hash = algo.hexdigest()
-                # chunk.index must start at 0 to get the proper file offset
-                # however, part_number must start at 1 (S3 requirement)
-                path = self.get_upload_part_url(dataset=dataset,
-                                                component_name=component_name,
-                                                part_number=chunk.index+1,
-                                                checksum=md5hash)
-                cb = functools.partial(update_chunk, chunk)
+        def send_chunk(chunk):
+            tracker.start_part()
+            try:
+                chunk.part = source.open_part(chunk, self._chunk_size)
+                if chunk.md5hash is None:
+                    chunk.md5hash = hashlib.md5(chunk.part.view).hexdigest()
+                # chunk.index must start at 0 to get the proper file
+                # offset however, part_number must start at 1 (S3
+                # requirement)
+                path = self.get_upload_part_url(
+                    dataset=dataset, component_name=component_name,
+                    part_number=chunk.index+1, checksum=chunk.md5hash)
+                data = chunk.part.view
+                if self._throttle.limited:
+                    data = ThrottledBody(data, self._throttle)
+                chunk.sent_at = time.monotonic()
                 chunk.req = async_conn.post(path=path,
                                             headers=upload_part_headers,
-                                            data=blob,
-                                            callback=cb,
+                                            data=data,
                                             timeout=connection_delay)
+            except Exception as e:
+                logger.warning('Failed to send chunk {}: {!r}'.format(
+                    chunk.index, e))
+                on_done(chunk, None)
+                return
+            chunk.req.add_done_callback(functools.partial(on_done, chunk))
 
-            reqs = [c.req for c in self._ongoing_chunks]
-            try:
-                all(cf.as_completed(reqs, timeout=join_delay))
-            except cf.TimeoutError:
-                logger.warning('Timeout while waiting for chunk uploads '
-                               'to end')
+        workers = min(max_simultaneous, os.cpu_count() or 1)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            while True:
+                chunk = None
+                if not exhausted:
+                    try:
+                        chunk = pending.get_nowait()
+                    except queue.Empty:
+                        chunk = next(chunks, None)
+                        with lock:
+                            if chunk is None:
+                                exhausted = True
+                                if unfinished == 0:
+                                    pending.put(None)
+                            else:
+                                unfinished += 1
+                                started.append(chunk)
+
+                if chunk is None:
+                    try:
+                        chunk = pending.get(timeout=join_delay)
+                    except queue.Empty:
+                        raise UploadError('Timeout while waiting for chunk '
+                                          'uploads to end')
+                    if chunk is None:
+                        break
+
+                window.acquire()
+                self._buffers.acquire(chunk.size)
+                chunk.attempt += 1
+                executor.submit(send_chunk, chunk)
 
-        if any(map(lambda ch: ch.status != 'available', self._chunks)):
-            raise UploadError('Failed to upload some chunks')
+        failed = [c.index + 1 for c in started if c.status != 'available']
+        if failed:
+            raise UploadError('Failed to upload some chunks: parts {} '
+                              '(up to {} attempts each)'.format(
+                                  failed, self._max_attempts))
+        return started
 
-    def _complete(self, *, file_path: str, dataset: str, component_name: str):
+    def _complete(self, *, dataset: str, component_name: str):
         headers = {'Cache-Control': 'no-cache',
                    'Content-Type': 'application/json'}
         completion_desc = {'dataset': dataset,
@@ -7,6 +7,8 @@ class Flights(ResourcesManagerBase):
 
 
 class Flight(Resource):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         """Flight resource.
 
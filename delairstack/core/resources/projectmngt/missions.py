@@ -7,6 +7,8 @@ class Missions(ResourcesManagerBase):
 
 
 class Mission(Resource):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         """Mission resource.
 
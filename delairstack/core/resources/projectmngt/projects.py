@@ -7,6 +7,8 @@ class Projects(ResourcesManagerBase):
 
 
 class Project(Resource):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         """Project resource.
 
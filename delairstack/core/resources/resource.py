@@ -1,12 +1,266 @@
+import collections
 import copy
+import functools
+import weakref
 
 from delairstack.core.errors import ImmutableAttribute
 from delairstack.core.utils.utils import flatten_dict, get_full_class_path
 
 
+class _Missing(object):
+    """Marks attributes missing from the original description."""
+    def __repr__(self):
+        return '<missing>'
+
+    def __reduce__(self):
+        # copied and pickled as a reference to the module singleton
+        return '_MISSING'
+
+
+_MISSING = _Missing()
+
+_BASE_IMMUTABLE = ('_id', 'id', '_hidden', '_immutable')
+_BASE_HIDDEN = ('_ori', '_desc', '__v')
+
+_AttributePolicy = collections.namedtuple('_AttributePolicy',
+                                          ['hidden', 'immutable',
+                                           'full_diff'])
+
+
+@functools.lru_cache(maxsize=None)
+def _get_attribute_policy(manager_type: type) -> _AttributePolicy:
+    """Return the policy shared by the resources of a manager type.
+
+    The attributes ``_hidden``, ``_immutable`` and ``_full_diff`` are
+    read from the manager class; they are never modified.
+
+    """
+    hidden = getattr(manager_type, '_hidden', None) or ()
+    immutable = getattr(manager_type, '_immutable', None) or ()
+    return _AttributePolicy(
+        hidden=frozenset(hidden).union(_BASE_HIDDEN),
+        immutable=frozenset(immutable).union(_BASE_IMMUTABLE),
+        full_diff=bool(getattr(manager_type, '_full_diff', False)))
+
+
+def _tracked(value, root: tuple):
+    """Return a value of the description tracked for changes.
+
+    Dictionaries and lists are replaced by a shallow copy notifying
+    ``root`` before their first change; other values are returned
+    unchanged.
+
+    Args:
+        value: Value of the description.
+
+        root: Tuple made of a weak reference to the resource and the
+            name of the attribute holding ``value``.
+
+    """
+    if (isinstance(value, (_TrackedDict, _TrackedList)) and
+            value._root is root):
+        return value
+
+    if isinstance(value, dict):
+        tracked = _TrackedDict(value)
+    elif isinstance(value, list):
+        tracked = _TrackedList(value)
+    else:
+        return value
+    tracked._root = root
+    return tracked
+
+
+def _changing(root: tuple):
+    resource = root[0]()
+    if resource is not None:
+        resource._Resource__changing(root[1])
+
+
+class _TrackedDict(dict):
+    """Dictionary of a description, copied on its first change.
+
+    Nested dictionaries and lists are tracked when they are returned.
+
+    """
+    __slots__ = ('_root',)
+
+    def __reduce_ex__(self, protocol):
+        # copied and pickled as a plain dictionary
+        return dict, (dict(self),)
+
+    def __track(self, key, value):
+        tracked = _tracked(value, self._root)
+        if tracked is not value:
+            dict.__setitem__(self, key, tracked)
+        return tracked
+
+    def __track_values(self):
+        for key, value in dict.items(self):
+            self.__track(key, value)
+
+    def __getitem__(self, key):
+        return self.__track(key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self[key]
+
+    def values(self):
+        self.__track_values()
+        return dict.values(self)
+
+    def items(self):
+        self.__track_values()
+        return dict.items(self)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            _changing(self._root)
+            dict.__setitem__(self, key, default)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        _changing(self._root)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        _changing(self._root)
+        dict.__delitem__(self, key)
+
+    def __ior__(self, other):
+        # dict.__ior__ is only available from Python 3.9
+        self.update(other)
+        return self
+
+    def clear(self):
+        _changing(self._root)
+        dict.clear(self)
+
+    def pop(self, *args):
+        _changing(self._root)
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        _changing(self._root)
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        _changing(self._root)
+        dict.update(self, *args, **kwargs)
+
+
+class _TrackedList(list):
+    """List of a description, copied on its first change.
+
+    Nested dictionaries and lists are tracked when they are returned.
+
+    """
+    __slots__ = ('_root',)
+
+    def __reduce_ex__(self, protocol):
+        # copied and pickled as a plain list
+        return list, (list(self),)
+
+    def __track_items(self):
+        root = self._root
+        for i, value in enumerate(list.__iter__(self)):
+            tracked = _tracked(value, root)
+            if tracked is not value:
+                list.__setitem__(self, i, tracked)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self.__track_items()
+            return list.__getitem__(self, index)
+        value = list.__getitem__(self, index)
+        tracked = _tracked(value, self._root)
+        if tracked is not value:
+            list.__setitem__(self, index, tracked)
+        return tracked
+
+    def __iter__(self):
+        self.__track_items()
+        return list.__iter__(self)
+
+    def __reversed__(self):
+        self.__track_items()
+        return list.__reversed__(self)
+
+    def __setitem__(self, index, value):
+        _changing(self._root)
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        _changing(self._root)
+        list.__delitem__(self, index)
+
+    def __iadd__(self, other):
+        _changing(self._root)
+        return list.__iadd__(self, other)
+
+    def __imul__(self, n):
+        _changing(self._root)
+        return list.__imul__(self, n)
+
+    def append(self, value):
+        _changing(self._root)
+        list.append(self, value)
+
+    def extend(self, values):
+        _changing(self._root)
+        list.extend(self, values)
+
+    def insert(self, index, value):
+        _changing(self._root)
+        list.insert(self, index, value)
+
+    def pop(self, *args):
+        _changing(self._root)
+        return list.pop(self, *args)
+
+    def remove(self, value):
+        _changing(self._root)
+        list.remove(self, value)
+
+    def clear(self):
+        _changing(self._root)
+        list.clear(self)
+
+    def reverse(self):
+        _changing(self._root)
+        list.reverse(self)
+
+    def sort(self, *args, **kwargs):
+        _changing(self._root)
+        list.sort(self, *args, **kwargs)
+
+
 class Resource(object):
-    __base_immutable = ['_id', 'id', '_hidden', '_immutable']
-    __base_hidden = ['_ori', '_desc', '__v']
+    """Resource proxying the attributes of its description.
+
+    The original description isn't copied at creation. Instead, the
+    original value of an attribute is saved the first time that
+    attribute is set. Mutable values (``dict`` or ``list``) are
+    returned as tracked copies of themselves, stored in place of the
+    original ones, whose original value is saved before their first
+    change in place. This is enough to compute the changes made to
+    the resource, while resources only read are never copied.
+
+    Values changed in place without being tracked (e.g. through a
+    reference taken from the description directly) are missed though.
+    When the manager sets ``_full_diff``, the original description is
+    copied at creation instead and the whole description is compared
+    with it.
+
+    """
+    __slots__ = ('__id', '__name', '_desc', '_snapshot', '_original',
+                 '_policy', '__weakref__')
+
+    # names that must never be looked up in the description
+    __reserved = frozenset(('_Resource__id', '_Resource__name', '_desc',
+                            '_snapshot', '_original', '_policy'))
 
     def __init__(self, id: str, *, desc: dict,
                  manager: object = None):
@@ -23,59 +277,116 @@ class Resource(object):
             Resource: Resource created.
 
         """
-        self.__id = id
-        self._desc = desc
+        set_slot = super().__setattr__
+        set_slot('_Resource__id', id)
+        set_slot('_desc', desc)
+        set_slot('_snapshot', None)
+        set_slot('_Resource__name',
+                 manager._name if manager is not None else None)
+        policy = _get_attribute_policy(type(manager))
+        set_slot('_original',
+                 copy.deepcopy(desc) if policy.full_diff else None)
 
-        self._ori = copy.deepcopy(desc)
+        # must be set last since it changes setattr behavior
+        set_slot('_policy', policy)
 
-        self.__name = None
-        if manager is not None:
-            self.__name = manager._name
+    @property
+    def id(self):
+        return self.__id
 
-        hidden = getattr(manager, '_hidden', [])
-        hidden += self.__base_hidden
-        self._hidden = hidden
+    @property
+    def _hidden(self) -> frozenset:
+        return self._policy.hidden
 
-        # must be set last since it changes setattr behavior
-        immutable = getattr(manager, '_immutable', [])
-        immutable += self.__base_immutable
-        self._immutable = immutable
+    @property
+    def _immutable(self) -> frozenset:
+        return self._policy.immutable
+
+    @property
+    def _ori(self) -> dict:
+        """Original description of the resource."""
+        if self._original is not None:
+            return self._original
+
+        snapshot = self._snapshot
+        if not snapshot:
+            return self._desc
+
+        ori = {k: v for k, v in self._desc.items() if k not in snapshot}
+        ori.update((k, v) for k, v in snapshot.items() if v is not _MISSING)
+        return ori
 
     def __dir__(self):
-        names = [n for n in self._desc if n not in self._hidden]
+        hidden = self._policy.hidden
+        names = [n for n in self._desc if n not in hidden]
         names += ['id']
         return names
 
     def __getattr__(self, name):
-        if '_hidden' not in self.__dict__:
-            return super().__getattr__(name)
-
-        if name in self.__dict__['_hidden']:
+        # only called when the attribute isn't found in the slots
+        if name in self.__reserved or name in self._policy.hidden:
             raise AttributeError(name)
 
-        # proxy for id, _desc, _hidden and _immutable
-        if name == 'id':
-            return self.__id
-
-        if name in ('_ori', '_desc', '_hidden', '_immutable'):
-            if (name == '_immutable' or name == '_hidden') and name not in self.__dict__:
-                return super().__getattr__(name)
-            else:
-                return self.__dict__[name]
-
-        if name not in self.__dict__['_desc']:
+        desc = self._desc
+        try:
+            value = desc[name]
+        except KeyError:
             raise AttributeError(name)
 
-        return self.__dict__['_desc'][name]
+        if isinstance(value, (dict, list)):
+            # the caller may mutate the value in place
+            if (isinstance(value, (_TrackedDict, _TrackedList)) and
+                    value._root[0]() is self and value._root[1] == name):
+                return value
+            value = _tracked(value, (weakref.ref(self), name))
+            desc[name] = value
+
+        return value
 
     def __setattr__(self, name, value):
-        if '_immutable' not in self.__dict__:
+        try:
+            policy = self._policy
+        except AttributeError:
+            # not initialized yet
             return super().__setattr__(name, value)
 
-        if name in self._immutable:
+        if name in policy.immutable:
             raise ImmutableAttribute(name)
 
-        self._desc[name] = value
+        desc = self._desc
+        snapshot = self._snapshot
+        if self._original is None and (snapshot is None or
+                                       name not in snapshot):
+            # the replaced value is detached from the description, no
+            # need for a copy unless it was returned to the caller
+            original = desc.get(name, _MISSING)
+            if isinstance(original, (_TrackedDict, _TrackedList)):
+                original = copy.deepcopy(original)
+            self.__save_original(name, original)
+
+        desc[name] = value
+
+    def __changing(self, name):
+        # called before the first change of a mutable value in place
+        snapshot = self._snapshot
+        if self._original is None and (snapshot is None or
+                                       name not in snapshot):
+            self.__save_original(name, copy.deepcopy(
+                self._desc.get(name, _MISSING)))
+
+    def __save_original(self, name, value):
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = {}
+            super().__setattr__('_snapshot', snapshot)
+        snapshot[name] = value
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__reserved}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            super().__setattr__(name, value)
 
     def __repr__(self):
         if not self.__id:
@@ -90,37 +401,93 @@ class Resource(object):
                 type=get_full_class_path(self), id=self.__id)
 
     def _diff(self):
-        """Compute a diff between two dicts.
+        """Compute a diff between the original and current descriptions.
+
+        Only the attributes saved in the snapshot are compared, e.g.
+        the attributes that were set or changed in place, unless the
+        original description is kept (see ``_full_diff``). All the
+        attributes are then compared, equal ones being skipped without
+        being flattened.
 
         Returns:
             List of paths of changed attributes.
 
         """
-        copy = flatten_dict(self._desc)
-        ori = flatten_dict(self._ori)
+        return self.__changes(self.__compared_names())
+
+    def check_attribute(self, attribute_path):
+        # a change of attribute "a" has path "a" or "a.<...>"
+        names = [n for n in self.__compared_names()
+                 if n.startswith(attribute_path) or
+                 attribute_path.startswith(n + '.')]
 
+        for v in self.__changes(names):
+            if v.startswith(attribute_path):
+                return True
+
+        return False
+
+    def __compared_names(self):
+        original = self._original
+        if original is None:
+            return self._snapshot or ()
+        return list(original) + [n for n in self._desc if n not in original]
+
+    def __changes(self, names):
+        ori = self._original
+        if ori is None:
+            ori = self._snapshot
+        desc = self._desc
         changes = []
+        for name in names:
+            changes += _diff_values(ori.get(name, _MISSING),
+                                    desc.get(name, _MISSING), name)
+        return changes
+
 
-        for v in ori:
-            # added attributes
-            if v not in copy:
-                changes.append(v)
-            # updated attributes
-            elif ori[v] != copy[v]:
-                changes.append(v)
+def _diff_values(ori, new, path: str) -> list:
+    """Compute the paths of the changes between two values.
 
-        # deleted attributes
-        for v in copy:
-            if v not in ori:
-                changes.append(v)
+    Paths are built as the keys of ``flatten_dict()`` applied on the
+    descriptions holding ``ori`` and ``new`` at ``path``. Equal
+    sub-dictionaries are skipped without being flattened.
 
+    Args:
+        ori: Original value or ``_MISSING``.
+
+        new: Current value or ``_MISSING``.
+
+        path: Path of the compared values.
+
+    Returns:
+        List of paths of changed attributes.
+
+    """
+    if ori is new:
+        return []
+
+    if isinstance(ori, dict) and isinstance(new, dict):
+        if ori == new:
+            return []
+
+        changes = []
+        for k, v in ori.items():
+            changes += _diff_values(v, new.get(k, _MISSING),
+                                    '{}.{}'.format(path, k))
+        for k, v in new.items():
+            if k not in ori:
+                changes += _diff_values(_MISSING, v, '{}.{}'.format(path, k))
         return changes
 
-    def check_attribute(self, attribute_path):
-        changes = self._diff()
+    if ori is not _MISSING and new is not _MISSING and ori == new:
+        return []
 
-        for v in changes:
-            if v.startswith(attribute_path):
-                return True
+    flat_ori = flatten_dict(ori, prefix=path) if ori is not _MISSING else {}
+    flat_new = flatten_dict(new, prefix=path) if new is not _MISSING else {}
 
-        return False
+    # updated or deleted attributes
+    changes = [v for v in flat_ori
+               if v not in flat_new or flat_ori[v] != flat_new[v]]
+    # added attributes
+    changes += [v for v in flat_new if v not in flat_ori]
+    return changes
@@ -0,0 +1,154 @@
+"""Lazy container of search results.
+
+"""
+
+import collections.abc
+
+from .resource import Resource
+
+_MISSING = object()
+
+
+class ResultSet(collections.abc.Sequence):
+    """Sequence of resources built on access from decoded descriptions.
+
+    The descriptions returned by a search are kept as is. A
+    ``Resource`` is only created when an item is accessed, which
+    saves time and memory when only a few attributes of the results
+    are needed. Such attributes are better extracted through
+    ``column()``, ``columns()``, ``to_pandas()`` or ``to_arrow()``.
+
+    Examples:
+        >>> results = sdk.datasets.search(filter={...}, as_result_set=True)
+        >>> results.column('name')
+        ['My image', 'My raster', ...]
+        >>> results.to_pandas(['_id', 'name', 'properties.x'])
+                                _id       name  properties.x
+        0  5d9b6bc0b0b1b4f7e8b1b1a5   My image           1.0
+        ...
+
+    """
+    def __init__(self, descs: list, *, manager: object = None):
+        """Initializes a result set.
+
+        Args:
+            descs: Descriptions of the resources.
+
+            manager: Optional manager of the resources.
+
+        """
+        self._descs = descs
+        self._manager = manager
+        self._resources = [None] * len(descs)
+
+    @property
+    def raw(self) -> list:
+        """Descriptions of the resources as decoded from the response."""
+        return self._descs
+
+    def __len__(self):
+        return len(self._descs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        resource = self._resources[index]
+        if resource is None:
+            desc = self._descs[index]
+            resource = Resource(id=desc['_id'], desc=desc,
+                                manager=self._manager)
+            self._resources[index] = resource
+        return resource
+
+    def __repr__(self):
+        return '<{} of {} results>'.format(type(self).__name__, len(self))
+
+    def column(self, path: str, *, default=None) -> list:
+        """Extract an attribute of all the results.
+
+        Args:
+            path: Path of the attribute, nested attributes being
+                separated by dots (e.g. ``properties.x``).
+
+            default: Value for results missing the attribute. Default
+                to ``None``.
+
+        Returns:
+            List of values, one per result.
+
+        """
+        keys = path.split('.')
+        values = []
+        for desc in self._descs:
+            value = desc
+            for key in keys:
+                if not isinstance(value, dict):
+                    value = default
+                    break
+                value = value.get(key, _MISSING)
+                if value is _MISSING:
+                    value = default
+                    break
+            values.append(value)
+        return values
+
+    def columns(self, paths: list = None, *, default=None) -> dict:
+        """Extract attributes of all the results.
+
+        Args:
+            paths: Optional list of attribute paths. Default to the
+                top-level attributes found in the results.
+
+            default: Value for results missing an attribute. Default
+                to ``None``.
+
+        Returns:
+            Dictionary of lists of values indexed by path.
+
+        """
+        if paths is None:
+            paths = list(dict.fromkeys(k for desc in self._descs
+                                       for k in desc))
+        return {p: self.column(p, default=default) for p in paths}
+
+    def to_pandas(self, columns: list = None):
+        """Export attributes of the results as a pandas data frame.
+
+        It requires the ``pandas`` package to be installed.
+
+        Args:
+            columns: Optional list of attribute paths. Default to the
+                top-level attributes found in the results.
+
+        Returns:
+            A ``pandas.DataFrame`` with a column per attribute path.
+
+        """
+        try:
+            import pandas
+        except ImportError as e:
+            raise ImportError('pandas is required by to_pandas()') from e
+
+        data = self.columns(columns)
+        return pandas.DataFrame(data, columns=list(data))
+
+    def to_arrow(self, columns: list = None):
+        """Export attributes of the results as an Arrow table.
+
+        It requires the ``pyarrow`` package to be installed.
+
+        Args:
+            columns: Optional list of attribute paths. Default to the
+                top-level attributes found in the results.
+
+        Returns:
+            A ``pyarrow.Table`` with a column per attribute path.
+
+        """
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError('pyarrow is required by to_arrow()') from e
+
+        return pyarrow.Table.from_pydict(self.columns(columns))
@@ -15,6 +15,8 @@ class Tags():
 
 
 class Tag(Resource):
+    __slots__ = ()
+
     def __init__(self, id: ResourceId, *, name: str, project: ResourceId,
                  type: str, creation_date: str, target: ResourceId = None,
                  flight: ResourceId = None, creation_user: ResourceId,
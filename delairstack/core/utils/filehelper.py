@@ -8,15 +8,49 @@ Helper class containing functions that assist in working with files.
 
 BLOCK_SIZE = 4096
 
+# Default size of the buffer streamed responses are read into (in bytes)
+DOWNLOAD_BUFFER_SIZE = 4 * 1024 * 1024
 
-def write_stream_as_file(file_path, response: HTTPResponse):
+
+def iter_readinto(response: HTTPResponse, *, buffer_size: int = None,
+                  limit: int = None):
+    """Read a streamed response into one reused buffer.
+
+    Each view yielded is only valid until the next one is requested,
+    since the buffer is then overwritten.
+
+    Args:
+        response: Response not preloaded.
+
+        buffer_size: Size of the buffer. Default to
+            ``DOWNLOAD_BUFFER_SIZE``.
+
+        limit: Optional maximal number of bytes to read.
+
+    Yields:
+        Memory views of the data read.
+
+    """
+    buffer = memoryview(bytearray(buffer_size or DOWNLOAD_BUFFER_SIZE))
+    remaining = limit
+    while remaining is None or remaining > 0:
+        view = buffer if remaining is None else buffer[:remaining]
+        count = response.readinto(view)
+        if not count:
+            break
+        if remaining is not None:
+            remaining -= count
+        yield view[:count]
+
+
+def write_stream_as_file(file_path, response: HTTPResponse,
+                         buffer_size: int = None):
     """
     serialize the object to a file. The response comes from the Connection response allowing streaming response
     """
     with open(file_path, 'wb') as f:
-        for chunk in response.stream(BLOCK_SIZE):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
+        for view in iter_readinto(response, buffer_size=buffer_size):
+            f.write(view)
 
 
 def get_base_name_without_extension(file_path):
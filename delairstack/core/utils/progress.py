@@ -0,0 +1,149 @@
+"""Progress of file transfers.
+
+"""
+
+import logging
+import threading
+import time
+
+from delairstack.core.utils.typing import Callable, NamedTuple, Optional
+
+TransferProgress = NamedTuple('TransferProgress',
+                              [('bytes_done', int),
+                               ('bytes_total', Optional[int]),
+                               ('parts_in_flight', int),
+                               ('throughput', float),
+                               ('average_throughput', float),
+                               ('retries', int),
+                               ('elapsed', float),
+                               ('finished', bool)])
+TransferProgress.__doc__ = """Snapshot of the progress of a transfer.
+
+Throughputs are in bytes per second, ``throughput`` being measured
+since the previous snapshot. ``bytes_total`` is None when unknown.
+
+"""
+
+TransferSummary = NamedTuple('TransferSummary',
+                             [('bytes', int),
+                              ('elapsed', float),
+                              ('average_throughput', float),
+                              ('retries', int),
+                              ('skipped', bool)])
+TransferSummary.__new__.__defaults__ = (False,)
+TransferSummary.__doc__ = """Summary of a completed transfer.
+
+``skipped`` is True when the transfer was skipped, the data being
+already up to date.
+
+"""
+
+ProgressCallback = Callable[[TransferProgress], None]
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ProgressTracker(object):
+    """Track the progress of a transfer and report it at a bounded rate.
+
+    The callback is called at most once per ``min_interval`` seconds,
+    plus once when the transfer is finished. It may be called from
+    worker threads. Its exceptions are logged and ignored, so that
+    they never interrupt a transfer.
+
+    """
+    def __init__(self, *, total: Optional[int] = None,
+                 callback: Optional[ProgressCallback] = None,
+                 min_interval: float = 0.5):
+        self._total = total
+        self._callback = callback
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._done = 0
+        self._in_flight = 0
+        self._retries = 0
+        self._last_time = self._start
+        self._last_done = 0
+
+    @property
+    def bytes_done(self) -> int:
+        return self._done
+
+    def set_total(self, total: Optional[int]):
+        self._total = total
+
+    def start_part(self):
+        """Mark a request as in flight."""
+        with self._lock:
+            self._in_flight += 1
+
+    def end_part(self, size: int = 0, *, retried: bool = False):
+        """Mark a request as finished.
+
+        Args:
+            size: Number of bytes transferred by the request, 0 when
+                it failed.
+
+            retried: Whether the request will be sent again.
+
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._done += size
+            if retried:
+                self._retries += 1
+        self._notify()
+
+    def add(self, size: int):
+        """Record the transfer of ``size`` bytes."""
+        with self._lock:
+            self._done += size
+        self._notify()
+
+    def _snapshot(self, now: float, finished: bool) -> TransferProgress:
+        elapsed = now - self._start
+        interval = now - self._last_time
+        current = ((self._done - self._last_done) / interval
+                   if interval > 0 else 0.0)
+        self._last_time = now
+        self._last_done = self._done
+        return TransferProgress(
+            bytes_done=self._done, bytes_total=self._total,
+            parts_in_flight=self._in_flight, throughput=current,
+            average_throughput=self._done / elapsed if elapsed > 0 else 0.0,
+            retries=self._retries, elapsed=elapsed, finished=finished)
+
+    def _notify(self):
+        if self._callback is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_time < self._min_interval:
+                return
+            progress = self._snapshot(now, False)
+        self._call(progress)
+
+    def _call(self, progress: TransferProgress):
+        try:
+            self._callback(progress)
+        except Exception:
+            LOGGER.exception('Progress callback failed')
+
+    def finish(self) -> TransferSummary:
+        """Report the end of the transfer.
+
+        Returns:
+            Summary of the transfer.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            progress = self._snapshot(now, True)
+        if self._callback is not None:
+            self._call(progress)
+        return TransferSummary(bytes=progress.bytes_done,
+                               elapsed=progress.elapsed,
+                               average_throughput=progress.average_throughput,
+                               retries=progress.retries)
@@ -1,28 +1,205 @@
-from pkg_resources import resource_string
+import re
+import threading
 
-from delairstack.core.utils.typing import AnyStr
+from pkg_resources import resource_listdir, resource_string
 
+from delairstack.core.utils.typing import AnyStr, List, Optional
 
-def __name2wkt(name: AnyStr, *, wkts_path: AnyStr) -> AnyStr:
-    """Convert a vert SRS name to WKT format.
+# A WKT starts with a keyword followed by an opening bracket,
+# something a vertical SRS name never contains
+_WKT_PREFIX = re.compile(r'\s*[A-Za-z_][A-Za-z0-9_]*\s*[\[(]')
+
+
+def _flatten_wkt(wkt: AnyStr) -> AnyStr:
+    """Join the lines of a WKT after removal of surrounding whitespaces."""
+    return ''.join([line.strip() for line in wkt.splitlines()])
+
+
+def normalize_wkt(wkt: AnyStr) -> AnyStr:
+    """Normalize a WKT for comparison purposes.
+
+    Whitespaces are removed except those enclosed in double quotes
+    (e.g. in ``VERT_CS["WGS84 ellipsoid (meters)", ...]``).
+
+    Args:
+        wkt: WKT to normalize.
+
+    Returns:
+        The normalized WKT.
+
+    """
+    parts = wkt.split('"')
+    # items with even indices are outside of quoted strings
+    parts[::2] = [''.join(p.split()) for p in parts[::2]]
+    return '"'.join(parts)
+
+
+def is_wkt(desc: AnyStr) -> bool:
+    """Check whether ``desc`` looks like a WKT.
+
+    Args:
+        desc: A WKT or a SRS name.
+
+    Returns:
+        True when ``desc`` starts with a WKT keyword followed by a
+        bracket.
+
+    """
+    return _WKT_PREFIX.match(desc) is not None
+
+
+class VertCRSRegistry(object):
+    """Registry of vertical SRS indexed by name and by WKT.
+
+    The WKT files bundled in ``wkts_path`` are loaded once, on first
+    access to the registry. Custom vertical SRS can be added through
+    ``register()``.
+
+    """
+    def __init__(self, *, wkts_path: AnyStr = 'vertcrs'):
+        self._wkts_path = wkts_path
+        self._lock = threading.Lock()
+        self._wkts = None
+        self._names = None
+
+    def _load(self):
+        with self._lock:
+            if self._wkts is not None:
+                return
+
+            wkts = {}
+            names = {}
+            for res_name in resource_listdir(__name__, self._wkts_path):
+                if not res_name.endswith('.wkt'):
+                    continue
+
+                name = res_name[:-len('.wkt')].lower()
+                path = '{}/{}'.format(self._wkts_path, res_name)
+                wkt = _flatten_wkt(resource_string(__name__, path).decode('utf-8'))
+                wkts[name] = wkt
+                names.setdefault(normalize_wkt(wkt), name)
+
+            self._names = names
+            self._wkts = wkts     # set last, it marks the registry as loaded
+
+    def _ensure_loaded(self):
+        if self._wkts is None:
+            self._load()
+
+    def register(self, name: AnyStr, wkt: AnyStr, *, overwrite: bool = False):
+        """Register a vertical SRS.
+
+        Args:
+            name: Name of the vertical SRS (case insensitive).
+
+            wkt: Definition of the vertical SRS in WKT format.
+
+            overwrite: Whether to replace an already registered SRS
+                with the same name. Default to False.
+
+        Raises:
+            ValueError: When ``wkt`` isn't a WKT, when ``name`` looks
+                like a WKT or when a SRS is already registered with
+                that name and ``overwrite`` is False.
+
+        """
+        if not is_wkt(wkt):
+            raise ValueError('Expecting a WKT; received: {!r}'.format(wkt))
+
+        if is_wkt(name):
+            raise ValueError('Invalid SRS name: {!r}'.format(name))
+
+        self._ensure_loaded()
+        name = name.lower()
+        wkt = _flatten_wkt(wkt)
+        with self._lock:
+            previous = self._wkts.get(name)
+            if previous is not None:
+                if not overwrite:
+                    raise ValueError('SRS already registered: {}'.format(name))
+                normalized = normalize_wkt(previous)
+                if self._names.get(normalized) == name:
+                    del self._names[normalized]
+
+            self._wkts[name] = wkt
+            self._names.setdefault(normalize_wkt(wkt), name)
+
+    def name2wkt(self, name: AnyStr) -> Optional[AnyStr]:
+        """Return the WKT of a registered vertical SRS.
+
+        Args:
+            name: Name of the vertical SRS (case insensitive).
+
+        Returns:
+            The WKT or None when no SRS is registered with that name.
+
+        """
+        self._ensure_loaded()
+        return self._wkts.get(name.lower())
+
+    def wkt2name(self, wkt: AnyStr) -> Optional[AnyStr]:
+        """Return the name of a registered vertical SRS.
+
+        The given WKT is normalized before lookup, hence line breaks
+        and indentation don't matter.
+
+        Args:
+            wkt: WKT of the vertical SRS.
+
+        Returns:
+            The name or None when no SRS is registered with that WKT.
+
+        """
+        self._ensure_loaded()
+        return self._names.get(normalize_wkt(wkt))
+
+    @property
+    def names(self) -> List[AnyStr]:
+        """Sorted names of the registered vertical SRS."""
+        self._ensure_loaded()
+        return sorted(self._wkts)
+
+    def __contains__(self, name):
+        return self.name2wkt(name) is not None
+
+
+vertcrs_registry = VertCRSRegistry(wkts_path='vertcrs')
+
+
+def register_vertcrs(name: AnyStr, wkt: AnyStr, *, overwrite: bool = False):
+    """Register a custom vertical SRS.
+
+    Once registered, ``name`` is accepted wherever a vertical SRS
+    name is supported (e.g. the ``vertical_srs_wkt`` parameter of
+    dataset creation functions).
 
     Args:
-        name: Name of vertical SRS to convert.
+        name: Name of the vertical SRS (case insensitive).
 
-        wkts_path: Path to the WKTs directory.
+        wkt: Definition of the vertical SRS in WKT format.
+
+        overwrite: Whether to replace an already registered SRS with
+            the same name. Default to False.
 
     Raises:
-        ValueError: When ``name`` doesn't match any known WKT file.
+        ValueError: When ``wkt`` isn't a WKT or ``name`` is already
+            registered and ``overwrite`` is False.
+
+    """
+    vertcrs_registry.register(name, wkt, overwrite=overwrite)
+
+
+def find_vertcrs_name(wkt: AnyStr) -> Optional[AnyStr]:
+    """Find the name of a vertical SRS given its WKT.
+
+    Args:
+        wkt: A WKT.
+
+    Returns:
+        The name of the matching registered SRS or None.
 
     """
-    name = name.lower()
-    res_name = '{}/{}.wkt'.format(wkts_path, name)
-    try:
-        wkt = resource_string(__name__, res_name).decode('utf-8')
-        flatten_wkt = ''.join([line.strip() for line in wkt.splitlines()])
-        return flatten_wkt
-    except FileNotFoundError:
-        raise ValueError('Unknown SRS name: {}'.format(name))
+    return vertcrs_registry.wkt2name(wkt)
 
 
 def expand_vertcrs_to_wkt(desc: AnyStr) -> AnyStr:
@@ -32,7 +209,8 @@ def expand_vertcrs_to_wkt(desc: AnyStr) -> AnyStr:
     ``"arbitrary_feet_us"``, ``"egm96"``, ``"egm96_feet"``,
     ``"egm96_feet_us"``, ``"egm2008"``, ``"egm2008_feet"``,
     ``"egm2008_feet_us"``, ``"wgs84"``, ``"wgs84_feet"`` or
-    ``"wgs84_feet_us"``.
+    ``"wgs84_feet_us"``, plus the names registered through
+    ``register_vertcrs()``.
 
     Args:
         desc: A WKT or one of the supported SRS names.
@@ -42,8 +220,8 @@ def expand_vertcrs_to_wkt(desc: AnyStr) -> AnyStr:
         corresponding WKT is returned. Otherwise ``desc`` is returned.
 
     """
-    try:
-        return __name2wkt(desc, wkts_path='vertcrs')
-    except ValueError:
-        pass
-    return desc
+    if is_wkt(desc):
+        return desc
+
+    wkt = vertcrs_registry.name2wkt(desc)
+    return wkt if wkt is not None else desc
@@ -0,0 +1,146 @@
+"""Bandwidth throttling of file transfers.
+
+"""
+
+import threading
+import time
+
+from delairstack.core.utils.typing import Optional
+
+# Size of the blocks sent by throttled request bodies (in bytes)
+_BLOCK_SIZE = 64 * 1024
+
+
+class TokenBucket(object):
+    """Token bucket limiting a rate in bytes per second.
+
+    Consumers may take more tokens than available; they then wait for
+    the debt to be refilled. Hence concurrent consumers share the rate
+    whatever the size of the blocks they consume.
+
+    Tokens consumed from a bucket are also consumed from its
+    ``parent`` (e.g. the bucket shared by all the transfers of the
+    process).
+
+    """
+    def __init__(self, rate: Optional[float] = None, *, burst: float = 1.0,
+                 parent: Optional['TokenBucket'] = None):
+        """Initializes a token bucket.
+
+        Args:
+            rate: Maximal rate in bytes per second, None for no limit.
+
+            burst: Duration in seconds of the bursts allowed after
+                an idle period.
+
+            parent: Optional bucket limiting the rate of this bucket
+                and others.
+
+        """
+        self._lock = threading.Lock()
+        self._burst = burst
+        self._parent = parent
+        self._rate = None
+        self._tokens = 0.0
+        self._time = time.monotonic()
+        self.rate = rate
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+    @rate.setter
+    def rate(self, value: Optional[float]):
+        if value is not None and value <= 0:
+            raise ValueError('Expecting a positive rate')
+
+        with self._lock:
+            self._rate = value
+            self._time = time.monotonic()
+            self._tokens = value * self._burst if value is not None else 0.0
+
+    @property
+    def limited(self) -> bool:
+        """Whether this bucket or one of its parents limits the rate."""
+        return self._rate is not None or (self._parent is not None and
+                                          self._parent.limited)
+
+    def consume(self, size: int):
+        """Take ``size`` tokens, waiting for them to be available.
+
+        Args:
+            size: Number of bytes to transfer.
+
+        """
+        delay = 0.0
+        with self._lock:
+            rate = self._rate
+            if rate is not None:
+                now = time.monotonic()
+                self._tokens = min(rate * self._burst,
+                                   self._tokens + (now - self._time) * rate)
+                self._time = now
+                self._tokens -= size
+                if self._tokens < 0:
+                    delay = -self._tokens / rate
+        if delay > 0:
+            time.sleep(delay)
+
+        if self._parent is not None:
+            self._parent.consume(size)
+
+
+bandwidth_limiter = TokenBucket()
+
+
+def set_bandwidth_limit(rate: Optional[float]):
+    """Limit the bandwidth used by all the transfers of the process.
+
+    The limit applies to the sum of the uploads and downloads made
+    through the SDK.
+
+    Args:
+        rate: Maximal rate in bytes per second, None to remove the
+            limit.
+
+    """
+    bandwidth_limiter.rate = rate
+
+
+def make_throttle(rate: Optional[float] = None) -> TokenBucket:
+    """Create the bucket of a transfer.
+
+    Args:
+        rate: Optional maximal rate of the transfer in bytes per
+            second, the global limit applying in any case.
+
+    Returns:
+        A bucket consuming from the bucket shared by all transfers.
+
+    """
+    return TokenBucket(rate, parent=bandwidth_limiter)
+
+
+class ThrottledBody(object):
+    """Request body sending a buffer by blocks at a limited rate.
+
+    Its length is known so that requests are sent with a
+    ``Content-Length`` header, and it can be iterated many times for
+    retries.
+
+    """
+    def __init__(self, view: memoryview, throttle: TokenBucket, *,
+                 block_size: int = _BLOCK_SIZE):
+        self._view = view
+        self._throttle = throttle
+        self._block_size = block_size
+
+    def __len__(self):
+        return self._view.nbytes
+
+    def __iter__(self):
+        view = self._view
+        for offset in range(0, view.nbytes, self._block_size):
+            block = view[offset:offset + self._block_size]
+            self._throttle.consume(len(block))
+            yield block
@@ -0,0 +1,159 @@
+"""Tile pyramids and their storage in MBTiles files.
+
+"""
+
+import math
+import sqlite3
+
+from delairstack.core.utils.typing import (Dict, Generator, Iterable,
+                                           List, Optional, Tuple)
+
+# Latitude limit of the Web Mercator projection (in degrees)
+_MAX_LATITUDE = 85.0511287798066
+
+
+def tile_index(lon: float, lat: float, zoom: int) -> Tuple[int, int]:
+    """Return the XYZ tile containing a point.
+
+    Args:
+        lon: Longitude of the point in degrees.
+
+        lat: Latitude of the point in degrees.
+
+        zoom: Zoom level.
+
+    Returns:
+        Tuple made of the column and row of the tile, rows starting at
+        the north.
+
+    """
+    n = 2 ** zoom
+    lat = max(-_MAX_LATITUDE, min(_MAX_LATITUDE, lat))
+    lat_rad = math.radians(lat)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(bbox: List[float],
+                  zooms: Iterable[int]) -> Generator[Tuple[int, int, int],
+                                                     None, None]:
+    """Iterate over the tiles covering a bounding box.
+
+    Args:
+        bbox: Bounding box in degrees as ``[xmin, xmax, ymin, ymax]``
+            (see ``compute_bbox()``).
+
+        zooms: Zoom levels.
+
+    Yields:
+        Tuples ``(z, x, y)`` of XYZ tiles.
+
+    """
+    xmin, xmax, ymin, ymax = bbox
+    for z in zooms:
+        x0, y0 = tile_index(xmin, ymax, z)
+        x1, y1 = tile_index(xmax, ymin, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+class MBTilesCache(object):
+    """Tiles stored in an MBTiles file (a SQLite database).
+
+    Tiles are given with XYZ indices, rows being flipped to the TMS
+    scheme of MBTiles files. The cache must be used from the thread
+    that created it.
+
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+            CREATE UNIQUE INDEX IF NOT EXISTS metadata_name
+                ON metadata (name);
+            CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER,
+                                              tile_column INTEGER,
+                                              tile_row INTEGER,
+                                              tile_data BLOB);
+            CREATE UNIQUE INDEX IF NOT EXISTS tile_index
+                ON tiles (zoom_level, tile_column, tile_row);
+        """)
+
+    @staticmethod
+    def _row(z: int, y: int) -> int:
+        return 2 ** z - 1 - y
+
+    def __contains__(self, tile: Tuple[int, int, int]) -> bool:
+        z, x, y = tile
+        cursor = self._db.execute(
+            'SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? '
+            'AND tile_row = ?', (z, x, self._row(z, y)))
+        return cursor.fetchone() is not None
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        cursor = self._db.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? '
+            'AND tile_column = ? AND tile_row = ?', (z, x, self._row(z, y)))
+        row = cursor.fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, z: int, x: int, y: int, data: bytes):
+        self._db.execute('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                         (z, x, self._row(z, y), sqlite3.Binary(data)))
+
+    def metadata(self) -> Dict[str, str]:
+        return dict(self._db.execute('SELECT name, value FROM metadata'))
+
+    def set_metadata(self, values: Dict[str, str]):
+        self._db.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?)',
+                             [(k, str(v)) for k, v in values.items()])
+
+    def extend(self, bbox: List[float], zooms: Iterable[int]):
+        """Widen the bounds and zoom levels recorded in the metadata.
+
+        The recorded extent is the union of the stored one and the
+        given one, so that tiles fetched incrementally stay covered.
+
+        Args:
+            bbox: Bounding box in degrees as ``[xmin, xmax, ymin, ymax]``.
+
+            zooms: Zoom levels.
+
+        """
+        xmin, xmax, ymin, ymax = bbox
+        zooms = list(zooms)
+        minzoom, maxzoom = min(zooms), max(zooms)
+        metadata = self.metadata()
+        try:
+            west, south, east, north = (
+                float(v) for v in metadata['bounds'].split(','))
+            xmin, ymin = min(xmin, west), min(ymin, south)
+            xmax, ymax = max(xmax, east), max(ymax, north)
+        except (KeyError, ValueError):
+            # missing or invalid
+            pass
+        try:
+            minzoom = min(minzoom, int(metadata['minzoom']))
+            maxzoom = max(maxzoom, int(metadata['maxzoom']))
+        except (KeyError, ValueError):
+            pass
+        self.set_metadata({
+            'bounds': '{},{},{},{}'.format(xmin, ymin, xmax, ymax),
+            'minzoom': minzoom,
+            'maxzoom': maxzoom})
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
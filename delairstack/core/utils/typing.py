@@ -12,25 +12,31 @@ if sys.version_info.minor < 5:
 
     __inst = MagicMock()
     AnyStr = __inst
+    Callable = __inst
     Dict = __inst
     Generator = __inst
+    Iterable = __inst
     List = __inst
     NamedTuple = __inst
     NewType = __inst
     Optional = __inst
     Sequence = __inst
+    Set = __inst
     Tuple = __inst
     Union = __inst
 else:
     # for others to import
     from typing import (AnyStr,
+                        Callable,
                         Dict,
                         Generator,
+                        Iterable,
                         List,
                         NamedTuple,
                         NewType,
                         Optional,
                         Sequence,
+                        Set,
                         Tuple,
                         Union)
 
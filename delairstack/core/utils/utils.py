@@ -1,6 +1,8 @@
 import collections
 import hashlib
 import importlib
+import queue
+import threading
 
 from ..errors import ConfigError
 
@@ -126,3 +128,73 @@ def get_full_class_path(o):
         return o.__class__.__name__  # Avoid reporting __builtin__
     else:
         return module + '.' + o.__class__.__name__
+
+
+def iter_pages(fetch_page, *, prefetch=0):
+    """Iterate over the items of successive pages, until an empty page.
+
+    With a positive ``prefetch``, pages are fetched by a background
+    thread while the items of the previous pages are consumed. At most
+    ``prefetch`` pages wait to be consumed, so that the memory stays
+    bounded. An error raised while fetching a page is raised when the
+    page is reached.
+
+    Args:
+        fetch_page: Callable returning the items of a page from its
+            number, starting at 0.
+
+        prefetch: Number of pages fetched ahead. Default to 0, pages
+            being fetched once the previous one is consumed.
+
+    Yields:
+        The items of the pages.
+
+    """
+    if prefetch < 0:
+        raise ValueError('Expecting a non-negative prefetch depth')
+
+    if prefetch == 0:
+        page = 0
+        while True:
+            items = fetch_page(page)
+            if len(items) == 0:
+                return
+            yield from items
+            page += 1
+
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # give up once the consumer stopped
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        page = 0
+        try:
+            while not stop.is_set():
+                items = fetch_page(page)
+                put(items)
+                if len(items) == 0:
+                    return
+                page += 1
+        except Exception as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            items = pages.get()
+            if isinstance(items, Exception):
+                raise items
+            if len(items) == 0:
+                return
+            yield from items
+    finally:
+        stop.set()
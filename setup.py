@@ -56,6 +56,7 @@ setup(name='python-delairstack',
       extras_require={
           'development': ['pycodestyle>=2.4.0'],
           'coverage': ['coverage>=4.4', 'pytest-cov'],
+          'dataframes': ['pandas', 'pyarrow'],
           'documentation': ['sphinx>=1.8.5', 'sphinx_rtd_theme',
                             'sphinx_autodoc_typehints',
                             'sphinx-autobuild', 'recommonmark'],
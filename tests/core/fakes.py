@@ -0,0 +1,218 @@
+"""Fake servers and connections shared by the tests of the core package.
+
+"""
+
+import collections
+import concurrent.futures as cf
+import hashlib
+import json
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock
+
+from delairstack.apis.client.datamngt.datasetsimpl import DatasetsImpl
+from delairstack.apis.provider import AuthAPI, DataManagementAPI
+from delairstack.core.connection.connection import Connection
+from delairstack.core.errors import ResponseError
+
+Request = collections.namedtuple('Request', ('method', 'path', 'query',
+                                             'headers', 'body',
+                                             'received_at', 'read_at'))
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only available from Python 3.7
+    daemon_threads = True
+
+
+class LocalServer(object):
+    """HTTP/1.1 server on the loopback interface.
+
+    Handlers are registered per method and path. They are called with
+    the ``Request`` and return a tuple made of the status, a dictionary
+    of headers and the body. Requests to other paths get a 404 status.
+
+    """
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                received_at = time.monotonic()
+                length = int(self.headers.get('Content-Length') or 0)
+                if self.headers.get('Transfer-Encoding') == 'chunked':
+                    body = self._read_chunked()
+                else:
+                    body = self.rfile.read(length)
+                url = urllib.parse.urlsplit(self.path)
+                request = Request(self.command, url.path,
+                                  dict(urllib.parse.parse_qsl(url.query)),
+                                  self.headers, body, received_at,
+                                  time.monotonic())
+                with server._lock:
+                    server.requests.append(request)
+                handler = server.routes.get((self.command, url.path))
+                if handler is None:
+                    status, headers, data = 404, {}, b'Not found'
+                else:
+                    status, headers, data = handler(request)
+                try:
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # closed by the client before the end of the body
+                    self.close_connection = True
+
+            def _read_chunked(self):
+                body = b''
+                while True:
+                    size = int(self.rfile.readline().strip(), 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return body
+                    body += self.rfile.read(size)
+                    self.rfile.readline()
+
+            do_GET = do_POST = _handle
+
+        self._httpd = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self._httpd.server_address[1])
+
+    def route(self, method: str, path: str, handler):
+        self.routes[(method, path)] = handler
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def serve_bytes(data: bytes, *, etag: str = None, filename: str = 'file',
+                ranges: bool = True):
+    """Return a handler serving ``data``, honoring ``Range`` headers.
+
+    """
+    def handler(request):
+        headers = {'Content-Disposition':
+                   'attachment; filename="{}"'.format(filename)}
+        if etag is not None:
+            headers['ETag'] = etag
+        match = re.match(r'bytes=(\d+)-(\d*)',
+                         request.headers.get('Range') or '')
+        if not ranges or match is None:
+            return 200, headers, data
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(data) - 1
+        headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end,
+                                                           len(data))
+        return 206, headers, data[start:end + 1]
+    return handler
+
+
+def make_datasets(server: LocalServer) -> DatasetsImpl:
+    """Return the datasets API of a connection to ``server``."""
+    connection = Connection(base_url=server.url, access_token='token')
+    return DatasetsImpl(DataManagementAPI(connection),
+                        AuthAPI(connection))
+
+
+class FakeAsyncConnection(object):
+    """Asynchronous connection recording the uploaded files and parts.
+
+    Uploads are recorded by dataset and part number (0 for files sent
+    in one request). ``statuses`` maps such keys, or part numbers, to
+    the statuses of the successive requests; ``None`` stands for a
+    connection error.
+
+    """
+    def __init__(self, *, max_request_workers=4, statuses=None):
+        self.max_request_workers = max_request_workers
+        self.executor = cf.ThreadPoolExecutor(max_workers=8)
+        self.uploads = {}
+        self.parts = {}
+        self.calls = []
+        self._statuses = statuses or {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def post(self, path, headers=None, callback=None, data=None,
+             timeout=30.0):
+        if not data:
+            # an empty body is taken for missing data
+            raise ValueError('Missing data')
+        if isinstance(data, (bytes, memoryview)):
+            data = bytes(data)
+        elif hasattr(data, 'read'):
+            data = data.read()
+        else:
+            data = b''.join(data)
+        return self.executor.submit(self._post, path, data)
+
+    def _post(self, path, data):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            qs = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+            part_number = int(qs.get('part_number', [0])[0])
+            key = (qs['dataset'][0], part_number)
+            with self._lock:
+                self.calls.append(part_number)
+                statuses = (self._statuses.get(key) or
+                            self._statuses.get(part_number, []))
+                status = statuses.pop(0) if statuses else 200
+
+            if qs['checksum'][0] != hashlib.md5(data).hexdigest():
+                status = 400
+
+            if status is None:
+                raise ConnectionError('Connection reset')
+            if status == 200:
+                self.uploads[key] = data
+                self.parts[part_number] = data
+            return MagicMock(status_code=status)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class FakeConnection(object):
+    """Connection recording the JSON requests, with an asynchronous
+    ``FakeAsyncConnection``.
+
+    The paths ending with the successive items of ``rejected`` are
+    answered with a 404 status.
+
+    """
+    def __init__(self, *, rejected=None, **kwargs):
+        self.asynchronous = FakeAsyncConnection(**kwargs)
+        self.posts = []
+        self._rejected = list(rejected or [])
+
+    def post(self, path, headers=None, data=None, **kwargs):
+        self.posts.append((path, json.loads(data)))
+        if self._rejected and path.endswith(self._rejected[0]):
+            self._rejected.pop(0)
+            raise ResponseError('404: No such upload', status=404)
@@ -0,0 +1,156 @@
+"""Tests related to bulk loads of datasets.
+
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import MagicMock
+
+from delairstack.core.errors import ResponseError
+from delairstack.core.resources.datamngt.bulk_load import (BulkLoad,
+                                                           LoadJournal)
+from delairstack.core.resources.datamngt.bulk_upload import (
+    BulkUploadReport, FileUploadResult)
+from tests.delairstacktest import DelairStackTestBase
+
+
+class FakeDatasets(object):
+    """Datasets manager recording created datasets and uploaded files."""
+    def __init__(self, *, fail_creation=False, failed_files=(),
+                 missing=0):
+        self.created = []
+        self.uploads = []
+        self._fail_creation = fail_creation
+        self._failed_files = failed_files
+        self._missing = missing
+        self._lock = threading.Lock()
+
+    def create_datasets(self, datasets):
+        if self._fail_creation:
+            raise ConnectionError('Connection reset')
+        with self._lock:
+            resources = []
+            for desc in datasets:
+                self.created.append(desc)
+                resources.append(MagicMock(
+                    id='dataset{}'.format(len(self.created))))
+            # fewer datasets than requested
+            return resources[:len(resources) - self._missing]
+
+    def upload_files(self, files, *, if_changed=False):
+        results = []
+        for f in files:
+            self.uploads.append((f['dataset'], f['component'], if_changed))
+            result = FileUploadResult(dataset=f['dataset'],
+                                      component=f['component'],
+                                      file_path=f['file_path'], size=0)
+            if f['file_path'] in self._failed_files:
+                result.error = ConnectionError('Connection reset')
+            results.append(result)
+        return BulkUploadReport(results, elapsed=1.0)
+
+
+class TestBulkLoad(DelairStackTestBase):
+    """Tests for bulk loads.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.journal = LoadJournal(os.path.join(self.tmp_dir,
+                                                'datasets.jsonl'))
+        self.manifest = []
+        for i in range(5):
+            file_path = os.path.join(self.tmp_dir, 'image{}'.format(i))
+            self.manifest.append({'dataset': {'name': 'image{}'.format(i),
+                                              'type': 'image'},
+                                  'files': {'image': file_path}})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def load(self, datasets):
+        return BulkLoad(create=datasets.create_datasets,
+                        upload=datasets.upload_files, batch_size=2,
+                        journal=self.journal)
+
+    def test_send(self):
+        """Test the creation and upload of datasets."""
+        datasets = FakeDatasets(failed_files=(
+            self.manifest[3]['files']['image'],))
+        report = self.load(datasets).send(self.manifest)
+
+        self.assertEqual(report.datasets,
+                         ['dataset{}'.format(i) for i in range(1, 6)])
+        self.assertEqual([r.status for r in report.results],
+                         ['created'] * 3 + ['failed', 'created'])
+        self.assertEqual([r.index for r in report.failed], [3])
+        self.assertEqual(datasets.created[0],
+                         {'name': 'image0', 'type': 'image',
+                          'components': [{'name': 'image'}]})
+        self.assertEqual(sorted(datasets.uploads),
+                         [('dataset{}'.format(i), 'image', False)
+                          for i in range(1, 6)])
+        self.assertNotIn('components', self.manifest[0]['dataset'])
+
+    def test_send_again(self):
+        """Test the files skipped when loaded again."""
+        self.load(FakeDatasets(failed_files=(
+            self.manifest[1]['files']['image'],))).send(self.manifest[:3])
+
+        datasets = FakeDatasets()
+        report = self.load(datasets).send(self.manifest)
+        self.assertEqual([r.status for r in report.results],
+                         ['existing'] * 3 + ['created'] * 2)
+        self.assertEqual(len(datasets.created), 2)
+        self.assertEqual(sorted(datasets.uploads),
+                         [('dataset1', 'image', False),
+                          ('dataset1', 'image', True),
+                          ('dataset2', 'image', False),
+                          ('dataset2', 'image', True),
+                          ('dataset3', 'image', True)])
+
+    def test_send_prunes_journal(self):
+        """Test the journal pruned of other files."""
+        other = {'dataset': {'name': 'other', 'type': 'file'},
+                 'files': {'file': os.path.join(self.tmp_dir, 'other')}}
+        failing = FakeDatasets(failed_files=(
+            other['files']['file'], self.manifest[0]['files']['image']))
+        self.load(failing).send([other])
+        self.load(failing).send(self.manifest)
+        self.assertEqual(len(self.journal.load()), 6)
+
+        # completely loaded, the entries of the manifest are discarded
+        report = self.load(FakeDatasets()).send(self.manifest)
+        self.assertEqual(report.failed, [])
+        self.assertEqual(len(self.journal.load()), 1)
+
+        self.load(FakeDatasets()).send([other])
+        self.assertFalse(os.path.exists(self.journal.path))
+
+    def test_send_missing_datasets(self):
+        """Test the datasets missing from a batch."""
+        datasets = FakeDatasets(missing=1)
+        report = self.load(datasets).send(self.manifest)
+
+        # the last dataset of each batch isn't returned
+        self.assertEqual(report.datasets, ['dataset1', None, 'dataset3',
+                                           None, None])
+        self.assertEqual([r.index for r in report.failed], [1, 3, 4])
+        self.assertIsInstance(report.failed[0].error, ResponseError)
+        self.assertEqual(sorted(d for d, _, _ in datasets.uploads),
+                         ['dataset1', 'dataset3'])
+        self.assertEqual(sorted(self.journal.load().values()),
+                         ['dataset1', 'dataset3'])
+
+    def test_send_creation_failure(self):
+        """Test the failure of a batch creation."""
+        datasets = FakeDatasets(fail_creation=True)
+        report = self.load(datasets).send(self.manifest)
+
+        self.assertEqual(len(report.failed), 5)
+        self.assertEqual(report.datasets, [None] * 5)
+        self.assertEqual(datasets.uploads, [])
+        self.assertEqual(self.journal.load(), {})
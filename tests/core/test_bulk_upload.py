@@ -0,0 +1,86 @@
+"""Tests related to bulk uploads.
+
+"""
+
+import os
+import shutil
+import tempfile
+
+from delairstack.core.resources.datamngt.bulk_upload import BulkUpload
+from tests.core.fakes import FakeConnection
+from tests.delairstacktest import DelairStackTestBase
+
+CHUNK_SIZE = 5 * 1024 * 1024
+
+
+class TestBulkUpload(DelairStackTestBase):
+    """Tests for bulk uploads.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.contents = {}
+        sizes = [1024] * 10 + [2 * CHUNK_SIZE + 1]
+        self.files = []
+        for i, size in enumerate(sizes):
+            file_path = os.path.join(self.tmp_dir, 'file{}'.format(i))
+            content = os.urandom(size)
+            with open(file_path, 'wb') as fh:
+                fh.write(content)
+            dataset = 'dataset{}'.format(i)
+            self.contents[dataset] = content
+            self.files.append({'dataset': dataset,
+                               'component': 'image',
+                               'file_path': file_path})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_send(self):
+        """Test the upload of many files."""
+        conn = FakeConnection(statuses={('dataset3', 0): [503]})
+        upload = BulkUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                            backoff_factor=0.01)
+        report = upload.send(self.files)
+
+        self.assertEqual(report.failed, [])
+        self.assertEqual(len(report.results), len(self.files))
+        self.assertEqual(report.size,
+                         sum(len(c) for c in self.contents.values()))
+        self.assertGreater(report.throughput, 0)
+        self.assertLessEqual(conn.asynchronous.max_in_flight, 4)
+
+        uploads = conn.asynchronous.uploads
+        for i in range(10):
+            dataset = 'dataset{}'.format(i)
+            self.assertEqual(uploads[(dataset, 0)], self.contents[dataset])
+        self.assertEqual(b''.join(uploads[('dataset10', i)]
+                                  for i in (1, 2, 3)),
+                         self.contents['dataset10'])
+        self.assertEqual([p for p, _ in conn.posts],
+                         ['data-manager/create-multipart-upload',
+                          'data-manager/complete-multipart-upload'])
+
+    def test_send_failure(self):
+        """Test the report of the failed uploads."""
+        conn = FakeConnection(statuses={('dataset2', 0): [403],
+                                        ('dataset10', 2): [403]})
+        upload = BulkUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE)
+        report = upload.send(self.files)
+
+        self.assertEqual([r.dataset for r in report.failed],
+                         ['dataset2', 'dataset10'])
+        self.assertEqual(len(conn.asynchronous.uploads), 9 + 2)
+
+    def test_send_empty_file(self):
+        """Test the upload of an empty file."""
+        file_path = os.path.join(self.tmp_dir, 'empty')
+        open(file_path, 'wb').close()
+        conn = FakeConnection()
+        upload = BulkUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE)
+        report = upload.send([{'dataset': 'dataset-id', 'component': 'image',
+                               'file_path': file_path}])
+
+        self.assertEqual(report.failed, [])
+        self.assertEqual(conn.asynchronous.uploads, {('dataset-id', 0): b''})
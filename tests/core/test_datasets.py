@@ -0,0 +1,411 @@
+"""Tests related to the transfers of the datasets API.
+
+"""
+
+import hashlib
+import json
+import os
+import select
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from delairstack.core.errors import DownloadError, ResponseError
+from delairstack.core.resources.datamngt.upload import (ThroughputEstimator,
+                                                        UploadJournal)
+from delairstack.core.utils.tiles import MBTilesCache
+from tests.core.fakes import LocalServer, make_datasets, serve_bytes
+from tests.delairstacktest import DelairStackTestBase
+
+
+class DatasetsTestBase(DelairStackTestBase):
+    """Base class of tests against a local server.
+
+    """
+
+    def setUp(self):
+        self.server = LocalServer()
+        self.datasets = make_datasets(self.server)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def idle_sockets(self):
+        """Return the sockets of the connections kept in the pools."""
+        sockets = []
+        for key in self.datasets._connection._http.pools.keys():
+            pool = self.datasets._connection._http.pools[key]
+            for conn in list(pool.pool.queue):
+                if conn is not None and conn.sock is not None:
+                    sockets.append(conn.sock)
+        return sockets
+
+    def write_file(self, name, content):
+        file_path = os.path.join(self.tmp_dir, name)
+        with open(file_path, 'wb') as fh:
+            fh.write(content)
+        return file_path
+
+
+class TestUpload(DatasetsTestBase):
+    """Tests for uploads.
+
+    """
+
+    def test_upload_throttled(self):
+        """Test an upload limited in bandwidth."""
+        self.server.route('POST', '/data-manager/upload-component',
+                          lambda request: (200, {}, b''))
+        content = os.urandom(1536 * 1024)
+        file_path = self.write_file('file', content)
+
+        # 1MB of burst, then 512KB at 1MB/s
+        self.datasets.upload_file('dataset-id', component='raster',
+                                  file_path=file_path, multipart=False,
+                                  bandwidth_limit=1024 * 1024)
+
+        request, = self.server.requests
+        self.assertEqual(request.body, content)
+        self.assertEqual(request.headers['Content-Length'],
+                         str(len(content)))
+        self.assertIsNone(request.headers.get('Transfer-Encoding'))
+        # paced while sent instead of waiting before sending
+        self.assertGreater(request.read_at - request.received_at, 0.3)
+
+    def test_upload_resumed_auto_chunk_size(self):
+        """Test that the chunk size chosen at first is kept on resume."""
+        for path in ('create-multipart-upload', 'upload-part',
+                     'complete-multipart-upload'):
+            self.server.route('POST', '/data-manager/' + path,
+                              lambda request: (200, {}, b'{}'))
+        chunk_size = 6 * 1024 * 1024
+        content = os.urandom(2 * chunk_size)
+        file_path = self.write_file('file', content)
+        journal_dir = os.path.join(self.tmp_dir, 'journals')
+        journal = UploadJournal(journal_dir, file_path=file_path,
+                                dataset='dataset-id', component_name='raster',
+                                chunk_size=chunk_size)
+        journal.open(set())
+        journal.record(1)
+        journal.close()
+
+        # no throughput measured in this process, 5MB would be chosen
+        with patch('delairstack.core.resources.datamngt.upload.'
+                   'DEFAULT_JOURNAL_DIR', journal_dir), \
+                patch('delairstack.core.resources.datamngt.upload.'
+                      'upload_throughput', ThroughputEstimator()):
+            self.datasets.upload_file('dataset-id', component='raster',
+                                      file_path=file_path, chunk_size='auto',
+                                      resume=True)
+
+        paths = [r.path for r in self.server.requests]
+        self.assertEqual(paths, ['/data-manager/upload-part',
+                                 '/data-manager/complete-multipart-upload'])
+        request = self.server.requests[0]
+        self.assertEqual(request.query['part_number'], '2')
+        self.assertEqual(request.body, content[chunk_size:])
+        self.assertEqual(os.listdir(journal_dir), [])
+
+
+class TestStreamComponent(DatasetsTestBase):
+    """Tests for components streamed in memory.
+
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.urandom(8 * 1024 * 1024)
+        self.server.route('GET', '/data-manager/download-component',
+                          serve_bytes(self.content))
+
+    def test_close_before_end(self):
+        """Test a component closed before its end."""
+        for _ in range(2):
+            with self.datasets.open_component('dataset-id',
+                                              component='raster') as fh:
+                self.assertEqual(fh.read(1024), self.content[:1024])
+
+            blocks = self.datasets.iter_component('dataset-id',
+                                                  component='raster',
+                                                  buffer_size=1024)
+            self.assertEqual(bytes(next(blocks)), self.content[:1024])
+            blocks.close()
+
+            # no connection is returned to the pool with unread data
+            readable, _, _ = select.select(self.idle_sockets(), [], [], 0.2)
+            self.assertEqual(readable, [])
+
+        md5hash = hashlib.md5(self.content).hexdigest()
+        with self.datasets.open_component('dataset-id', component='raster',
+                                          md5hash=md5hash) as fh:
+            self.assertEqual(fh.read(), self.content)
+
+
+class TestResumeDownload(DatasetsTestBase):
+    """Tests for downloads resumed from a ``.part`` file.
+
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.urandom(1024 * 1024)
+        self.md5hash = hashlib.md5(self.content).hexdigest()
+        self.file_path = os.path.join(self.tmp_dir, 'file')
+
+    def serve(self, content, **kwargs):
+        self.server.route('GET', '/data-manager/download-component',
+                          serve_bytes(content, **kwargs))
+
+    def write_partial(self, content, *, etag='"v1"', size=None):
+        self.write_file('file.part', content)
+        self.write_file('file.part.json', json.dumps({
+            'offset': len(content), 'etag': etag,
+            'size': size or len(self.content)}).encode())
+
+    def download(self, **kwargs):
+        return self.datasets.download_component(
+            'dataset-id', component='raster', target_path=self.tmp_dir,
+            **kwargs)
+
+    def assertDownloaded(self):
+        with open(self.file_path, 'rb') as fh:
+            self.assertEqual(fh.read(), self.content)
+        self.assertEqual(os.listdir(self.tmp_dir), ['file'])
+
+    def ranges(self):
+        return [r.headers.get('Range') for r in self.server.requests]
+
+    def test_resume(self):
+        """Test a download resumed from a partial file."""
+        self.serve(self.content, etag='"v1"')
+        self.write_partial(self.content[:1000])
+
+        self.assertEqual(self.download(md5hash=self.md5hash), self.file_path)
+        self.assertDownloaded()
+        self.assertEqual(self.ranges(), [None, 'bytes=1000-'])
+
+    def test_resume_mismatched_state(self):
+        """Test a partial file ignored for another version."""
+        self.serve(self.content, etag='"v2"')
+        # written for another version of the file
+        self.write_partial(b'x' * 1000, etag='"v1"')
+
+        self.download(md5hash=self.md5hash)
+        self.assertDownloaded()
+        self.assertEqual(self.ranges(), [None])
+
+        # recorded beyond the end of the .part file
+        self.write_partial(self.content[:1000], etag='"v2"')
+        with open(self.file_path + '.part', 'ab') as fh:
+            fh.truncate(500)
+        self.download(md5hash=self.md5hash, overwrite=True)
+        self.assertDownloaded()
+
+    def test_resume_range_ignored(self):
+        """Test a download sent again when ranges are ignored."""
+        # the whole file is sent again
+        self.serve(self.content, etag='"v1"', ranges=False)
+        self.write_partial(self.content[:1000])
+
+        self.download(md5hash=self.md5hash)
+        self.assertDownloaded()
+        self.assertEqual(self.ranges(), [None, 'bytes=1000-'])
+
+    def test_resume_changed_content(self):
+        """Test the failure when the remote file changed."""
+        # the remote file changed without its ETag
+        self.serve(self.content, etag='"v1"')
+        self.write_partial(b'x' * 1000)
+
+        with self.assertRaises(DownloadError):
+            self.download(md5hash=self.md5hash)
+        # the partial download is discarded
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+        self.download(md5hash=self.md5hash)
+        self.assertDownloaded()
+        self.assertEqual(self.ranges(), [None, 'bytes=1000-', None])
+
+
+class TestRangedDownload(DatasetsTestBase):
+    """Tests for downloads in byte ranges fetched concurrently.
+
+    """
+
+    def test_download_ranges(self):
+        """Test the MD5 hash check of a file downloaded in ranges."""
+        content = os.urandom(16 * 1024 * 1024 + 1024)
+        self.server.route('GET', '/data-manager/download-component',
+                          serve_bytes(content))
+
+        file_path = self.datasets.download_component(
+            'dataset-id', component='raster', target_path=self.tmp_dir,
+            md5hash=hashlib.md5(content).hexdigest(), parallel_ranges=2)
+        with open(file_path, 'rb') as fh:
+            self.assertEqual(fh.read(), content)
+        self.assertEqual([r.headers.get('Range')
+                          for r in self.server.requests],
+                         [None, 'bytes=16777216-16778239'])
+
+        with self.assertRaises(DownloadError):
+            self.datasets.download_component(
+                'dataset-id', component='raster', target_path=self.tmp_dir,
+                md5hash=hashlib.md5(b'other').hexdigest(),
+                parallel_ranges=2, overwrite=True)
+
+
+class TestDownloadComponents(DatasetsTestBase):
+    """Tests for concurrent downloads of components.
+
+    """
+
+    def test_download_components(self):
+        """Test the download of many components."""
+        contents = {'d{}'.format(i): os.urandom(1024) for i in range(6)}
+
+        def handler(request):
+            content = contents.get(request.query['dataset'])
+            if content is None:
+                return 404, {}, b'Not found'
+            filename = '{}.bin'.format(request.query['dataset'])
+            return serve_bytes(content, filename=filename)(request)
+
+        self.server.route('GET', '/data-manager/download-component', handler)
+        items = [{'dataset': d, 'component': 'raster',
+                  'md5hash': hashlib.md5(c).hexdigest()}
+                 for d, c in contents.items()]
+        # missing, then with an unexpected MD5 hash
+        items.append({'dataset': 'd6', 'component': 'raster'})
+        items[2]['md5hash'] = hashlib.md5(b'other').hexdigest()
+
+        results = list(self.datasets.download_components(
+            items, target_path=self.tmp_dir, concurrency=3, max_attempts=2))
+
+        self.assertEqual(len(results), 7)
+        failed = {r.dataset: r for r in results if not r.succeeded}
+        self.assertEqual(sorted(failed), ['d2', 'd6'])
+        self.assertIsInstance(failed['d2'].error, DownloadError)
+        self.assertEqual(failed['d2'].attempt, 2)
+        self.assertIsInstance(failed['d6'].error, ResponseError)
+        self.assertEqual(failed['d6'].error.status, 404)
+        for result in results:
+            if result.succeeded:
+                with open(result.file_path, 'rb') as fh:
+                    self.assertEqual(fh.read(), contents[result.dataset])
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ['d0.bin', 'd1.bin', 'd3.bin', 'd4.bin', 'd5.bin'])
+
+
+class TestSyncProject(DatasetsTestBase):
+    """Tests for the mirror of the datasets of a project.
+
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.contents = {}
+        self.descs = []
+        self.server.route('POST', '/data-manager/search-datasets',
+                          self.search)
+        self.server.route('GET', '/data-manager/download-component',
+                          self.download)
+
+    def add_dataset(self, dataset, date, content):
+        self.contents[dataset] = content
+        self.descs = [d for d in self.descs if d['_id'] != dataset]
+        self.descs.append({
+            '_id': dataset, 'project': 'project-id',
+            'modification_date': date,
+            'components': [{'name': 'raster',
+                            'md5hash': hashlib.md5(content).hexdigest()}]})
+
+    def search(self, request):
+        query = json.loads(request.body.decode('utf-8'))
+        since = query['filter'].get('modification_date', {}).get('$gte')
+        descs = [d for d in self.descs
+                 if since is None or d['modification_date'] >= since]
+        start = query['page'] * query['limit']
+        results = descs[start:start + query['limit']]
+        return 200, {'Content-Type': 'application/json'}, json.dumps(
+            {'results': results}).encode()
+
+    def download(self, request):
+        dataset = request.query['dataset']
+        return serve_bytes(self.contents[dataset],
+                           filename='{}.tif'.format(dataset))(request)
+
+    def searched_since(self):
+        return [json.loads(r.body.decode('utf-8'))['filter']
+                .get('modification_date')
+                for r in self.server.requests
+                if r.path.endswith('search-datasets') and
+                json.loads(r.body.decode('utf-8'))['page'] == 0]
+
+    def downloaded(self):
+        return sorted(r.query['dataset'] for r in self.server.requests
+                      if r.path.endswith('download-component'))
+
+    def test_sync_project(self):
+        """Test the sync of a project over several pages."""
+        for i in range(60):
+            self.add_dataset('d{:02}'.format(i), '2020-01-01',
+                             os.urandom(64))
+        report = self.datasets.sync_project('project-id', self.tmp_dir)
+        self.assertEqual(len(report.downloads), 60)
+        self.assertEqual(report.failed, [])
+        with open(os.path.join(self.tmp_dir, 'd07', 'raster',
+                               'd07.tif'), 'rb') as fh:
+            self.assertEqual(fh.read(), self.contents['d07'])
+
+        self.server.requests.clear()
+        self.add_dataset('d07', '2020-01-02', os.urandom(64))
+        report = self.datasets.sync_project('project-id', self.tmp_dir)
+        self.assertEqual(self.searched_since(), [{'$gte': '2020-01-01'}])
+        self.assertEqual(self.downloaded(), ['d07'])
+        self.assertEqual(report.unchanged, 59)
+        with open(os.path.join(self.tmp_dir, 'd07', 'raster',
+                               'd07.tif'), 'rb') as fh:
+            self.assertEqual(fh.read(), self.contents['d07'])
+
+        self.server.requests.clear()
+        report = self.datasets.sync_project('project-id', self.tmp_dir,
+                                            prune=True)
+        self.assertEqual(self.searched_since(), [None])
+        self.assertEqual(self.downloaded(), [])
+        self.assertEqual(report.unchanged, 60)
+
+
+class TestFetchTiles(DatasetsTestBase):
+    """Tests for the fetch of tiles into an MBTiles file.
+
+    """
+
+    def test_fetch_tiles_metadata(self):
+        """Test that the name set in the file is kept."""
+        for z, x, y in ((1, 0, 0), (1, 1, 0), (2, 2, 1)):
+            self.server.route('GET', '/tiles/{}/{}/{}.png'.format(z, x, y),
+                              lambda request: (200, {}, b'tile'))
+        url = self.server.url + '/tiles/{z}/{x}/{y}.png'
+        path = os.path.join(self.tmp_dir, 'tiles.mbtiles')
+
+        report = self.datasets.fetch_tiles('dataset-id', url=url,
+                                           bbox=[-0.1, 0.1, 0.1, 0.2],
+                                           zooms=[1], mbtiles_path=path)
+        self.assertEqual(report.fetched, 2)
+        with MBTilesCache(path) as cache:
+            self.assertEqual(cache.metadata()['name'], 'dataset-id')
+            cache.set_metadata({'name': 'Quarry', 'type': 'baselayer'})
+
+        self.datasets.fetch_tiles('dataset-id', url=url,
+                                  bbox=[0.1, 0.2, 0.1, 0.2], zooms=[2],
+                                  mbtiles_path=path)
+        with MBTilesCache(path) as cache:
+            metadata = cache.metadata()
+            self.assertIn((2, 2, 1), cache)
+        self.assertEqual(metadata['name'], 'Quarry')
+        self.assertEqual(metadata['type'], 'baselayer')
+        self.assertEqual(metadata['format'], 'png')
+        self.assertEqual((metadata['minzoom'], metadata['maxzoom']),
+                         ('1', '2'))
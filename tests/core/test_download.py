@@ -0,0 +1,303 @@
+"""Tests related to ranged downloads.
+
+"""
+
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+import urllib3.exceptions
+
+from delairstack.core.errors import DownloadError
+from delairstack.core.resources.datamngt.download import (BulkDownload,
+                                                          PartialDownload,
+                                                          RangedDownload,
+                                                          StreamReader,
+                                                          split_ranges)
+from delairstack.core.utils.progress import ProgressTracker
+from tests.delairstacktest import DelairStackTestBase
+
+RANGE_SIZE = 1024
+
+
+class FakeResponse(object):
+    """Streamed response, interrupted after ``fail_after`` bytes."""
+    def __init__(self, content, *, status=200, fail_after=None):
+        self.status = status
+        self._content = content
+        self._fail_after = fail_after
+        self._offset = 0
+        self.closed = False
+
+    def geturl(self):
+        return 'https://storage/file?signature=abc'
+
+    def readinto(self, buffer):
+        # small blocks whatever the size of the buffer
+        if self._fail_after is not None and self._offset >= self._fail_after:
+            raise urllib3.exceptions.ProtocolError('Connection reset')
+        end = self._offset + min(len(buffer), 100)
+        data = self._content[self._offset:end]
+        buffer[:len(data)] = data
+        self._offset += len(data)
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+class FakeConnection(object):
+    """Connection serving byte ranges of a content."""
+    def __init__(self, content, *, failures=None, ranges=True):
+        self.content = content
+        self.requests = []
+        self.threads = set()
+        self._failures = failures or {}
+        self._ranges = ranges
+        self._lock = threading.Lock()
+
+    def get(self, path, headers=None, as_json=False, preload_content=True):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)',
+                                       headers['Range']).groups())
+        with self._lock:
+            self.requests.append((start, end))
+            self.threads.add(threading.get_ident())
+            fail_after = self._failures.pop(start, None)
+        if not self._ranges:
+            return FakeResponse(self.content)
+        return FakeResponse(self.content[start:end + 1], status=206,
+                            fail_after=fail_after)
+
+
+class TestRangedDownload(DelairStackTestBase):
+    """Tests for ranged downloads.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp_dir, 'file')
+        self.content = os.urandom(5 * RANGE_SIZE + 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self):
+        with open(self.file_path, 'rb') as fh:
+            return fh.read()
+
+    def test_split_ranges(self):
+        """Test the split of a file into ranges."""
+        self.assertEqual(split_ranges(10, 4), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(split_ranges(8, 4), [(0, 3), (4, 7)])
+
+    def test_fetch(self):
+        """Test a download over several ranges."""
+        conn = FakeConnection(self.content)
+        first = FakeResponse(self.content)
+        tracker = ProgressTracker(total=len(self.content))
+        download = RangedDownload(conn, range_size=RANGE_SIZE, max_workers=3)
+        download.fetch(first, self.file_path, size=len(self.content),
+                       tracker=tracker)
+
+        self.assertEqual(self.read(), self.content)
+        self.assertTrue(first.closed)
+        self.assertEqual(sorted(conn.requests),
+                         split_ranges(len(self.content), RANGE_SIZE)[1:])
+        self.assertEqual(tracker.bytes_done, len(self.content))
+
+    def test_fetch_pool_size(self):
+        """Test the streams capped to the pool size."""
+        content = os.urandom(64 * RANGE_SIZE)
+        conn = FakeConnection(content)
+        download = RangedDownload(conn, range_size=RANGE_SIZE,
+                                  max_workers=32)
+        download.fetch(FakeResponse(content), self.file_path,
+                       size=len(content))
+
+        self.assertEqual(self.read(), content)
+        # with the first range, as many streams as connections in the pool
+        self.assertLessEqual(len(conn.threads), 7)
+
+    def test_fetch_interrupted(self):
+        """Test the ranges resumed after a failure."""
+        conn = FakeConnection(self.content, failures={2 * RANGE_SIZE: 100})
+        first = FakeResponse(self.content, fail_after=500)
+        download = RangedDownload(conn, range_size=RANGE_SIZE,
+                                  backoff_factor=0.01)
+        download.fetch(first, self.file_path, size=len(self.content))
+
+        self.assertEqual(self.read(), self.content)
+        self.assertIn((500, RANGE_SIZE - 1), conn.requests)
+        self.assertIn((2 * RANGE_SIZE + 100, 3 * RANGE_SIZE - 1),
+                      conn.requests)
+
+    def test_fetch_attempts_exhausted(self):
+        """Test the failure after too many attempts."""
+        conn = FakeConnection(self.content, failures={RANGE_SIZE: 0})
+        download = RangedDownload(conn, range_size=RANGE_SIZE,
+                                  max_attempts=1)
+        with self.assertRaises(DownloadError):
+            download.fetch(FakeResponse(self.content), self.file_path,
+                           size=len(self.content))
+
+    def test_fetch_ranges_unsupported(self):
+        """Test the failure when ranges are not supported."""
+        conn = FakeConnection(self.content, ranges=False)
+        download = RangedDownload(conn, range_size=RANGE_SIZE)
+        with self.assertRaises(DownloadError):
+            download.fetch(FakeResponse(self.content), self.file_path,
+                           size=len(self.content))
+
+
+class TestPartialDownload(DelairStackTestBase):
+    """Tests for partial downloads.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.partial = PartialDownload(os.path.join(self.tmp_dir, 'file'))
+        with open(self.partial.part_path, 'wb') as fh:
+            fh.write(b'0' * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load(self):
+        """Test the offset read back for the same file only."""
+        self.assertEqual(self.partial.load(etag='"abc"', size=300), 0)
+
+        self.partial.save(80, etag='"abc"', size=300)
+        self.assertEqual(self.partial.load(etag='"abc"', size=300), 80)
+        # modified since
+        self.assertEqual(self.partial.load(etag='"def"', size=300), 0)
+        self.assertEqual(self.partial.load(etag='"abc"', size=400), 0)
+        # unknown version
+        self.assertEqual(self.partial.load(etag=None, size=300), 0)
+
+        # more bytes recorded than written
+        self.partial.save(120, etag='"abc"', size=300)
+        self.assertEqual(self.partial.load(etag='"abc"', size=300), 0)
+
+    def test_commit(self):
+        """Test the partial file moved to its destination."""
+        self.partial.save(100, etag='"abc"', size=100)
+        self.partial.commit()
+        self.assertEqual(os.listdir(self.tmp_dir), ['file'])
+
+    def test_remove(self):
+        """Test the partial file and its state removed."""
+        self.partial.save(80, etag='"abc"', size=100)
+        self.partial.remove()
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+
+class TestStreamReader(DelairStackTestBase):
+    """Tests for file objects over blocks.
+
+    """
+
+    def test_read(self):
+        """Test the reads over blocks of a reused buffer."""
+        buffer = bytearray(4)
+
+        def blocks():
+            for block in (b'0123', b'45', b'6789'):
+                buffer[:len(block)] = block
+                yield memoryview(buffer)[:len(block)]
+
+        with io.BufferedReader(StreamReader(blocks()), 3) as fh:
+            self.assertEqual(fh.read(5), b'01234')
+            self.assertEqual(fh.read(), b'56789')
+            self.assertEqual(fh.read(), b'')
+
+    def test_close(self):
+        """Test the blocks closed with the reader."""
+        closed = []
+
+        def blocks():
+            try:
+                yield b'0123'
+                yield b'4567'
+            finally:
+                closed.append(True)
+
+        reader = StreamReader(blocks())
+        self.assertEqual(reader.read(2), b'01')
+        reader.close()
+        self.assertEqual(closed, [True])
+        with self.assertRaises(ValueError):
+            reader.read(2)
+
+
+class TestBulkDownload(DelairStackTestBase):
+    """Tests for bulk downloads.
+
+    """
+
+    def setUp(self):
+        self.failures = {'dataset2': [DownloadError('Unexpected MD5 hash')],
+                         'dataset3': [FileExistsError('File found')],
+                         'dataset4': [ConnectionError('Reset')] * 3}
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.delay = 0.0
+
+    def download(self, item):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            with self.lock:
+                failures = self.failures.get(item['dataset'], [])
+                error = failures.pop(0) if failures else None
+            if error is not None:
+                raise error
+            return '/tmp/{}'.format(item['dataset'])
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def test_send(self):
+        """Test the results and retries of bulk downloads."""
+        items = [{'dataset': 'dataset{}'.format(i), 'component': 'image'}
+                 for i in range(10)]
+        bulk = BulkDownload(self.download, concurrency=3, max_attempts=3,
+                            backoff_factor=0.01)
+        results = {r.dataset: r for r in bulk.send(items)}
+
+        self.assertEqual(len(results), 10)
+        self.assertLessEqual(self.max_running, 3)
+        self.assertEqual(results['dataset0'].file_path, '/tmp/dataset0')
+        self.assertTrue(results['dataset2'].succeeded)
+        self.assertEqual(results['dataset2'].attempt, 2)
+        self.assertIsInstance(results['dataset3'].error, FileExistsError)
+        self.assertEqual(results['dataset3'].attempt, 1)
+        self.assertIsInstance(results['dataset4'].error, ConnectionError)
+        self.assertEqual(results['dataset4'].attempt, 3)
+        self.assertEqual(sorted(d for d, r in results.items()
+                                if not r.succeeded),
+                         ['dataset3', 'dataset4'])
+
+    def test_send_concurrency_capped(self):
+        """Test that the concurrency is capped to the pool size."""
+        items = [{'dataset': 'dataset{}'.format(i), 'component': 'image'}
+                 for i in range(5, 50)]
+        self.delay = 0.01
+        bulk = BulkDownload(self.download, concurrency=32)
+        results = list(bulk.send(items))
+
+        self.assertEqual(len(results), 45)
+        self.assertTrue(all(r.succeeded for r in results))
+        # no more than the connections kept in the pool
+        self.assertLessEqual(self.max_running, 8)
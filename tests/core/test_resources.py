@@ -1,3 +1,4 @@
+import copy
 import json
 
 from delairstack.core.errors import ImmutableAttribute
@@ -87,6 +88,168 @@ class TestResourceBase(DelairStackTestBase):
         r.fake_attribute = 'value'
         self.assertEqual(r.fake_attribute, 'value')
 
+    def test_lazy_snapshot(self):
+        """Test that the original description is saved on demand."""
+        r = Resource('5a4cb0d2c6d4f00007e90e07', desc=self.user_desc)
+        self.assertFalse(hasattr(r, '__dict__'))
+        self.assertIsNone(r._snapshot)
+        self.assertEqual(r.lastName, 'Eiffel')
+        self.assertIsNone(r._snapshot)
+        self.assertEqual(r._diff(), [])
+
+        r.lastName = 'Courbet'
+        self.assertEqual(r._ori['lastName'], 'Eiffel')
+        self.assertEqual(r._diff(), ['lastName'])
+
+        r.eula['version'] = 2
+        self.assertEqual(r._ori['eula']['version'], 1)
+        self.assertCountEqual(r._diff(), ['lastName', 'eula.version'])
+        self.assertTrue(r.check_attribute('eula'))
+        self.assertFalse(r.check_attribute('units'))
+
+    def test_copy_on_write(self):
+        """Test that mutable values are copied on their first change."""
+        r = Resource('5a4cb0d2c6d4f00007e90e07', desc=self.user_desc)
+        projects = r.scope['projects']
+        self.assertEqual(sorted(projects.get('5b4f46a2c41b427c5c563a58')),
+                         ['6666'])
+        self.assertEqual([p for ps in projects.values() for p in ps],
+                         ['6666'] * 15)
+        self.assertIs(r.scope, r.scope)
+        self.assertIsNone(r._snapshot)
+
+        projects['5b4f46a2c41b427c5c563a58'].append('7777')
+        self.assertEqual(r._ori['scope']['projects'][
+            '5b4f46a2c41b427c5c563a58'], ['6666'])
+        self.assertEqual(r._diff(),
+                         ['scope.projects.5b4f46a2c41b427c5c563a58'])
+        self.assertEqual(r.scope['projects']['5b4f46a2c41b427c5c563a58'],
+                         ['6666', '7777'])
+        self.assertEqual(json.loads(json.dumps(r._desc))['scope'],
+                         r.scope)
+        self.assertIs(type(copy.deepcopy(r.scope)), dict)
+        self.assertIs(type(copy.copy(r.scope)), dict)
+
+        # replaced, but changed in place by the caller afterwards
+        eula = r.eula
+        r.eula = None
+        eula['version'] = 2
+        self.assertEqual(r._ori['eula']['version'], 1)
+        self.assertCountEqual(r._diff(),
+                              ['scope.projects.5b4f46a2c41b427c5c563a58',
+                               'eula', 'eula.approvalDate', 'eula.version'])
+
+        r = Resource('annotation-id',
+                     desc={'features': [{'name': 'a'}, {'name': 'b'}]})
+        for feature in r.features:
+            self.assertEqual(len(feature), 1)
+        self.assertIsNone(r._snapshot)
+        r.features[1]['name'] = 'c'
+        self.assertEqual(r._ori['features'], [{'name': 'a'}, {'name': 'b'}])
+        self.assertEqual(r._diff(), ['features'])
+
+        r = Resource('5a4cb0d2c6d4f00007e90e07',
+                     desc=json.loads(A_USER_DESC))
+        eula = r.eula
+        eula |= {'version': 2}
+        self.assertIs(r.eula, eula)
+        self.assertEqual(r.eula['version'], 2)
+        self.assertEqual(r._diff(), ['eula.version'])
+
+    def test_copy(self):
+        """Test copy of a modified resource."""
+        r = Resource('5a4cb0d2c6d4f00007e90e07', desc=self.user_desc)
+        r.units = 'imperial'
+        r.fake_attribute = 'value'
+
+        c = copy.deepcopy(r)
+        self.assertEqual(c.id, r.id)
+        self.assertEqual(c.units, 'imperial')
+        self.assertCountEqual(c._diff(), ['units', 'fake_attribute'])
+        with self.assertRaises(ImmutableAttribute):
+            c.id = 'acb04dc6d42f0000e9700e4a'
+
+    def test_diff(self):
+        """Test computation of changes."""
+        geometry = {'type': 'Polygon',
+                    'coordinates': [[[float(i), float(i)] for i in range(1000)]]}
+        r = Resource('annotation-id',
+                     desc={'feature': {'geometry': geometry,
+                                       'properties': {'name': 'a',
+                                                      'comment': 'b'}},
+                           'name': 'a'})
+        self.assertEqual(r._diff(), [])
+
+        r.feature['properties']['name'] = 'c'
+        del r.feature['properties']['comment']
+        r.feature['properties']['icon'] = 'd'
+        self.assertCountEqual(r._diff(), ['feature.properties.name',
+                                          'feature.properties.comment',
+                                          'feature.properties.icon'])
+        self.assertTrue(r.check_attribute('feature.properties'))
+        self.assertTrue(r.check_attribute('feature'))
+        self.assertFalse(r.check_attribute('feature.geometry'))
+        self.assertFalse(r.check_attribute('name'))
+
+        r.name = {'first': 'a'}
+        self.assertIn('name', r._diff())
+        self.assertIn('name.first', r._diff())
+
+    def test_full_diff(self):
+        """Test changes made in place without being tracked."""
+        class Manager(ResourcesManagerBase):
+            _full_diff = True
+
+        desc = {'feature': {'geometry': {'type': 'Point',
+                                         'coordinates': [0.0, 0.0]},
+                            'properties': {'name': 'a'}},
+                'name': 'a'}
+        r = Resource('annotation-id', desc=desc,
+                     manager=Manager(provider=None))
+        # references taken before being tracked
+        properties = desc['feature']['properties']
+        coordinates = r.feature.copy()['geometry']['coordinates']
+        self.assertEqual(r._diff(), [])
+
+        properties['name'] = 'b'
+        coordinates.append(1.0)
+        self.assertCountEqual(r._diff(), ['feature.properties.name',
+                                          'feature.geometry.coordinates'])
+        self.assertTrue(r.check_attribute('feature.properties'))
+        self.assertTrue(r.check_attribute('feature.geometry'))
+        self.assertFalse(r.check_attribute('name'))
+        self.assertEqual(r._ori['feature']['properties']['name'], 'a')
+
+        r.name = 'c'
+        r.icon = 'd'
+        self.assertCountEqual(r._diff(), ['feature.properties.name',
+                                          'feature.geometry.coordinates',
+                                          'name', 'icon'])
+
+    def test_manager_policy(self):
+        """Test hidden and immutable attributes defined by managers."""
+        class Manager(ResourcesManagerBase):
+            _hidden = ['units']
+            _immutable = ['email']
+
+        rmb = Manager(provider=None)
+        resources = [Resource(str(i), desc=dict(self.user_desc), manager=rmb)
+                     for i in range(3)]
+        self.assertEqual(Manager._hidden, ['units'])
+        self.assertEqual(Manager._immutable, ['email'])
+        self.assertIs(resources[0]._policy, resources[2]._policy)
+
+        r = resources[0]
+        self.assertNotIn('units', dir(r))
+        with self.assertRaises(AttributeError):
+            r.units
+
+        with self.assertRaises(ImmutableAttribute):
+            r.email = 'gustave.choquet@example.com'
+
+        with self.assertRaises(ImmutableAttribute):
+            r._hidden = []
+
     def test_str(self):
         rmb = ResourcesManagerBase(provider=None)
         rmb._name = "unit test name"
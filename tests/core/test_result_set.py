@@ -0,0 +1,74 @@
+"""Test the container of search results.
+
+"""
+
+import importlib.util
+from unittest import skipUnless
+
+from delairstack.core.resources.resource import Resource
+from delairstack.core.resources.resources_manager_base import ResourcesManagerBase
+from delairstack.core.resources.result_set import ResultSet
+from tests.delairstacktest import DelairStackTestBase
+
+DESCS = [
+    {'_id': 'dataset-1', 'name': 'image', 'type': 'image',
+     'properties': {'x': 1}},
+    {'_id': 'dataset-2', 'name': 'raster', 'type': 'raster'},
+    {'_id': 'dataset-3', 'name': 'pcl', 'type': 'pcl',
+     'properties': {'x': 3}},
+]
+
+
+class TestResultSet(DelairStackTestBase):
+    """Tests for result sets.
+
+    """
+
+    def setUp(self):
+        manager = ResourcesManagerBase(provider=None)
+        manager._name = 'dataset'
+        self.results = ResultSet(DESCS, manager=manager)
+
+    def test_sequence(self):
+        """Test access to resources."""
+        self.assertEqual(len(self.results), 3)
+        self.assertIs(self.results.raw, DESCS)
+
+        r = self.results[1]
+        self.assertIsInstance(r, Resource)
+        self.assertEqual(r.id, 'dataset-2')
+        self.assertIs(self.results[1], r)
+        self.assertEqual(self.results[-1].id, 'dataset-3')
+        self.assertEqual([r.id for r in self.results[:2]],
+                         ['dataset-1', 'dataset-2'])
+        self.assertEqual([r.name for r in self.results],
+                         ['image', 'raster', 'pcl'])
+
+        with self.assertRaises(IndexError):
+            self.results[3]
+
+    def test_column(self):
+        """Test extraction of attributes."""
+        self.assertEqual(self.results.column('type'),
+                         ['image', 'raster', 'pcl'])
+        self.assertEqual(self.results.column('properties.x'), [1, None, 3])
+        self.assertEqual(self.results.column('name.x', default=0), [0, 0, 0])
+
+        columns = self.results.columns()
+        self.assertEqual(list(columns),
+                         ['_id', 'name', 'type', 'properties'])
+        self.assertEqual(columns['properties'],
+                         [{'x': 1}, None, {'x': 3}])
+
+        columns = self.results.columns(['_id', 'properties.x'])
+        self.assertEqual(columns, {'_id': ['dataset-1', 'dataset-2',
+                                           'dataset-3'],
+                                   'properties.x': [1, None, 3]})
+
+    @skipUnless(importlib.util.find_spec('pandas'), 'pandas not installed')
+    def test_to_pandas(self):
+        """Test export to a pandas data frame."""
+        df = self.results.to_pandas(['_id', 'properties.x'])
+        self.assertEqual(list(df.columns), ['_id', 'properties.x'])
+        self.assertEqual(list(df['_id']),
+                         ['dataset-1', 'dataset-2', 'dataset-3'])
@@ -0,0 +1,180 @@
+"""Tests related to the mirror of datasets.
+
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from delairstack.core.resources.datamngt.download import FileDownloadResult
+from delairstack.core.resources.datamngt.sync import (MANIFEST_NAME,
+                                                      ProjectSync)
+from delairstack.core.resources.resource import Resource
+from tests.delairstacktest import DelairStackTestBase
+
+
+def dataset(id, date, **checksums):
+    components = [{'name': name, 'md5hash': checksum}
+                  for name, checksum in checksums.items()]
+    return Resource(id=id, desc={'_id': id, 'modification_date': date,
+                                 'components': components})
+
+
+class TestProjectSync(DelairStackTestBase):
+    """Tests for the mirror of datasets.
+
+    """
+
+    def setUp(self):
+        self.target_dir = tempfile.mkdtemp()
+        self.datasets = []
+        self.downloaded = []
+        self.failures = set()
+        self.since = []
+
+    def tearDown(self):
+        shutil.rmtree(self.target_dir)
+
+    def download(self, items):
+        for item in items:
+            self.downloaded.append((item['dataset'], item['component']))
+            result = FileDownloadResult(item)
+            result.attempt = 1
+            if (item['dataset'], item['component']) in self.failures:
+                result.error = ConnectionError('Connection reset')
+            else:
+                os.makedirs(item['target_path'], exist_ok=True)
+                result.file_path = os.path.join(item['target_path'], 'file')
+                with open(result.file_path, 'w') as fh:
+                    fh.write(str(item['md5hash']))
+            yield result
+
+    def list_datasets(self, since):
+        self.since.append(since)
+        return [d for d in self.datasets
+                if since is None or d.modification_date >= since]
+
+    def sync(self, **kwargs):
+        self.downloaded = []
+        sync = ProjectSync(list_datasets=self.list_datasets,
+                           download=self.download,
+                           target_dir=self.target_dir, **kwargs)
+        return sync.send()
+
+    def path(self, *parts):
+        return os.path.join(self.target_dir, *parts, 'file')
+
+    def test_sync(self):
+        """Test the components downloaded and reported."""
+        self.datasets = [dataset('d1', '2020-01-01', raster='a', preview='b'),
+                         dataset('d2', '2020-01-01', image=None)]
+        self.failures = {('d1', 'preview')}
+        report = self.sync()
+        self.assertEqual(sorted(self.downloaded),
+                         [('d1', 'preview'), ('d1', 'raster'),
+                          ('d2', 'image')])
+        self.assertEqual(len(report.failed), 1)
+        self.assertTrue(os.path.exists(self.path('d1', 'raster')))
+
+        # failed downloads are attempted again
+        self.failures = set()
+        report = self.sync()
+        self.assertEqual(self.downloaded, [('d1', 'preview')])
+        self.assertEqual(report.unchanged, 2)
+
+        # changed checksums or dates, deleted files
+        self.datasets = [dataset('d1', '2020-01-01', raster='c', preview='b'),
+                         dataset('d2', '2020-02-01', image=None),
+                         dataset('d3', '2020-02-01', mesh='d')]
+        os.remove(self.path('d1', 'preview'))
+        report = self.sync()
+        self.assertEqual(sorted(self.downloaded),
+                         [('d1', 'preview'), ('d1', 'raster'),
+                          ('d2', 'image'), ('d3', 'mesh')])
+        self.assertEqual(report.unchanged, 0)
+
+        report = self.sync()
+        self.assertEqual(self.downloaded, [])
+        self.assertEqual(report.unchanged, 4)
+
+    def test_sync_prune(self):
+        """Test the files removed with their components."""
+        self.datasets = [dataset('d1', '2020-01-01', raster='a', preview='b'),
+                         dataset('d2', '2020-01-01', image='c')]
+        self.sync()
+
+        self.datasets = [dataset('d1', '2020-01-01', raster='a')]
+        report = self.sync()
+        self.assertEqual(report.pruned, [])
+        self.assertTrue(os.path.exists(self.path('d2', 'image')))
+
+        report = self.sync(prune=True)
+        self.assertEqual(sorted(report.pruned),
+                         [os.path.join('d1', 'preview', 'file'),
+                          os.path.join('d2', 'image', 'file')])
+        self.assertEqual(sorted(os.listdir(self.target_dir)),
+                         ['.delairstack-sync.json', 'd1'])
+        self.assertEqual(os.listdir(os.path.join(self.target_dir, 'd1')),
+                         ['raster'])
+
+        report = self.sync(prune=True)
+        self.assertEqual(report.pruned, [])
+        self.assertEqual(report.unchanged, 1)
+
+    def test_sync_modified_since(self):
+        """Test the datasets listed since a sync."""
+        self.datasets = [dataset('d1', '2020-01-01', raster='a'),
+                         dataset('d2', '2020-01-02', image=None)]
+        self.sync()
+        report = self.sync()
+        self.assertEqual(self.since, [None, '2020-01-02'])
+        self.assertEqual(self.downloaded, [])
+        self.assertEqual(report.unchanged, 2)
+
+        # files of datasets not listed are checked locally
+        os.remove(self.path('d1', 'raster'))
+        self.datasets = [dataset('d1', '2020-01-01', raster='a'),
+                         dataset('d2', '2020-01-02', image=None),
+                         dataset('d3', '2020-01-03', mesh='b', pcl='c')]
+        self.failures = {('d3', 'pcl')}
+        report = self.sync()
+        self.assertEqual(sorted(self.downloaded),
+                         [('d1', 'raster'), ('d3', 'mesh'), ('d3', 'pcl')])
+        self.assertEqual(report.unchanged, 1)
+
+        # listed again until its downloads succeed
+        self.failures = set()
+        self.sync()
+        self.assertEqual(self.since[-1], '2020-01-03')
+        self.assertEqual(self.downloaded, [('d3', 'pcl')])
+        self.sync()
+        self.assertEqual(self.downloaded, [])
+
+        # all the datasets are listed to prune the deleted ones
+        self.sync(prune=True)
+        self.assertEqual(self.since[-1], None)
+
+    def test_sync_saved_during_downloads(self):
+        """Test the manifest saved during the downloads."""
+        self.datasets = [dataset('d1', '2020-01-01', raster='a'),
+                         dataset('d2', '2020-01-01', image='b')]
+        manifest_path = os.path.join(self.target_dir, MANIFEST_NAME)
+        download = self.download
+        saved = []
+
+        def record_saved(items):
+            for result in download(items):
+                yield result
+                # read as if the process was killed at this point
+                with open(manifest_path) as fh:
+                    saved.append(json.load(fh))
+
+        self.download = record_saved
+        with patch('delairstack.core.resources.datamngt.sync.'
+                   '_MANIFEST_SAVE_INTERVAL', 0.0):
+            self.sync()
+        components = saved[0]['datasets']['d1']['components']
+        self.assertEqual(components['raster']['checksum'], 'a')
+        self.assertIsNone(saved[0]['modified_since'])
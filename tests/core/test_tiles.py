@@ -0,0 +1,167 @@
+"""Tests related to the fetch of tile pyramids.
+
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+from delairstack.core.errors import ResponseError
+from delairstack.core.resources.datamngt.tiles import TileFetcher
+from delairstack.core.utils.tiles import (MBTilesCache, tile_index,
+                                          tiles_in_bbox)
+from tests.delairstacktest import DelairStackTestBase
+
+
+class FakeConnection(object):
+    """Connection serving tiles from a dictionary.
+
+    """
+    def __init__(self, tiles, failures=None):
+        self.tiles = tiles
+        self.failures = failures or {}
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def get(self, path, **kwargs):
+        with self._lock:
+            self.requested.append(path)
+            if self.failures.get(path, 0) > 0:
+                self.failures[path] -= 1
+                raise ConnectionError('Connection reset')
+        if path not in self.tiles:
+            raise ResponseError('404: Not found')
+        return self.tiles[path]
+
+
+class TestTileIndex(DelairStackTestBase):
+    """Tests for the tile math.
+
+    """
+
+    def test_tile_index(self):
+        """Test the tile containing a point."""
+        self.assertEqual(tile_index(0.0, 0.0, 0), (0, 0))
+        self.assertEqual(tile_index(0.1, 0.1, 1), (1, 0))
+        self.assertEqual(tile_index(-0.1, -0.1, 1), (0, 1))
+        self.assertEqual(tile_index(1.4437, 43.6043, 12), (2064, 1495))
+        # clamped to the limits of the projection
+        self.assertEqual(tile_index(180.0, -90.0, 2), (3, 3))
+        self.assertEqual(tile_index(-180.0, 90.0, 2), (0, 0))
+
+    def test_tiles_in_bbox(self):
+        """Test the tiles covering a bounding box."""
+        tiles = list(tiles_in_bbox([-0.1, 0.1, -0.1, 0.1], [0, 1]))
+        self.assertEqual(tiles, [(0, 0, 0),
+                                 (1, 0, 0), (1, 0, 1),
+                                 (1, 1, 0), (1, 1, 1)])
+        tiles = list(tiles_in_bbox([0.1, 0.2, 0.1, 0.2], range(3)))
+        self.assertEqual(tiles, [(0, 0, 0), (1, 1, 0), (2, 2, 1)])
+
+
+class TestMBTilesCache(DelairStackTestBase):
+    """Tests for the MBTiles cache.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'tiles.mbtiles')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cache(self):
+        """Test the tiles and metadata of the cache."""
+        with MBTilesCache(self.path) as cache:
+            cache.put(2, 1, 0, b'tile')
+            cache.set_metadata({'format': 'png', 'minzoom': 2})
+            self.assertIn((2, 1, 0), cache)
+            self.assertNotIn((2, 1, 3), cache)
+
+        with MBTilesCache(self.path) as cache:
+            self.assertEqual(cache.get(2, 1, 0), b'tile')
+            self.assertIsNone(cache.get(2, 0, 0))
+            self.assertEqual(cache.metadata(),
+                             {'format': 'png', 'minzoom': '2'})
+            # rows are stored in the TMS scheme
+            rows = list(cache._db.execute(
+                'SELECT zoom_level, tile_column, tile_row FROM tiles'))
+            self.assertEqual(rows, [(2, 1, 3)])
+
+    def test_extend(self):
+        """Test the bounds and zoom levels extended."""
+        with MBTilesCache(self.path) as cache:
+            cache.extend([1.0, 2.0, 43.0, 44.0], range(10, 13))
+            self.assertEqual(cache.metadata(),
+                             {'bounds': '1.0,43.0,2.0,44.0',
+                              'minzoom': '10', 'maxzoom': '12'})
+
+        # fetched incrementally, the extent is widened
+        with MBTilesCache(self.path) as cache:
+            cache.extend([1.5, 3.0, 42.0, 43.5], [14, 15])
+            self.assertEqual(cache.metadata(),
+                             {'bounds': '1.0,42.0,3.0,44.0',
+                              'minzoom': '10', 'maxzoom': '15'})
+            cache.extend([1.5, 1.6, 43.1, 43.2], [8])
+            self.assertEqual(cache.metadata()['minzoom'], '8')
+            self.assertEqual(cache.metadata()['maxzoom'], '15')
+
+
+class TestTileFetcher(DelairStackTestBase):
+    """Tests for the concurrent fetch of tiles.
+
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = MBTilesCache(os.path.join(self.tmp_dir, 'tiles.mbtiles'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_send(self):
+        """Test the tiles fetched, retried or missing."""
+        tiles = [(1, x, y) for x in range(2) for y in range(2)]
+        served = {'{}/{}/{}'.format(*t): 't{}{}{}'.format(*t).encode()
+                  for t in tiles[:3]}
+        connection = FakeConnection(served, failures={'1/0/1': 2,
+                                                      '1/1/0': 4})
+        self.cache.put(1, 0, 0, b'cached')
+        fetcher = TileFetcher(connection, '{z}/{x}/{y}', self.cache,
+                              concurrency=2, max_attempts=3,
+                              backoff_factor=0.0)
+        report = fetcher.send(tiles)
+
+        self.assertEqual(report.fetched, 1)
+        self.assertEqual(report.skipped, 1)
+        self.assertEqual(report.missing, [(1, 1, 1)])
+        self.assertEqual(report.failed, [(1, 1, 0)])
+        self.assertEqual(self.cache.get(1, 0, 0), b'cached')
+        self.assertEqual(self.cache.get(1, 0, 1), b't101')
+        self.assertNotIn('1/0/0', connection.requested)
+        self.assertEqual(connection.requested.count('1/0/1'), 3)
+        self.assertEqual(connection.requested.count('1/1/0'), 3)
+
+        # only the failed and missing tiles are requested again
+        connection.requested = []
+        report = fetcher.send(tiles)
+        self.assertEqual(report.fetched, 1)
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual(sorted(connection.requested),
+                         ['1/1/0', '1/1/0', '1/1/1'])
+        self.assertEqual(self.cache.get(1, 1, 0), b't110')
+
+    def test_send_many(self):
+        """Test the fetch of many tiles."""
+        tiles = list(tiles_in_bbox([-10.0, 10.0, -10.0, 10.0], range(8)))
+        served = {'{}/{}/{}'.format(*t): b'tile' for t in tiles}
+        connection = FakeConnection(served)
+        fetcher = TileFetcher(connection, '{z}/{x}/{y}', self.cache,
+                              concurrency=4)
+        report = fetcher.send(iter(tiles))
+        self.assertEqual(report.fetched, len(tiles))
+        self.assertEqual(len(connection.requested), len(tiles))
+        self.assertTrue(all(t in self.cache for t in tiles))
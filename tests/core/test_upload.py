@@ -0,0 +1,452 @@
+"""Tests related to multipart uploads.
+
+"""
+
+import hashlib
+import io
+import math
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from delairstack.core.errors import ResponseError, UploadError
+from delairstack.core.resources.datamngt.upload import (BufferBudget,
+                                                        BufferSource,
+                                                        FileHashCache,
+                                                        FilePart,
+                                                        FileSource,
+                                                        IterSource,
+                                                        MultipartUpload,
+                                                        ThroughputEstimator,
+                                                        UploadJournal,
+                                                        choose_chunk_size,
+                                                        component_checksum,
+                                                        compute_checksums,
+                                                        make_upload_source,
+                                                        prepare_chunks)
+from delairstack.core.utils.throttle import TokenBucket
+from tests.core.fakes import FakeConnection
+from tests.delairstacktest import DelairStackTestBase
+
+CHUNK_SIZE = 5 * 1024 * 1024
+
+
+class TestMultipartUpload(DelairStackTestBase):
+    """Tests for multipart uploads.
+
+    """
+
+    def setUp(self):
+        fd, self.file_path = tempfile.mkstemp()
+        self.content = os.urandom(3 * CHUNK_SIZE + 1024)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(self.content)
+
+    def tearDown(self):
+        os.remove(self.file_path)
+
+    def assertUploaded(self, conn):
+        parts = conn.asynchronous.parts
+        self.assertEqual(sorted(parts), [1, 2, 3, 4])
+        self.assertEqual(b''.join(parts[i] for i in sorted(parts)),
+                         self.content)
+
+    def test_prepare_chunks(self):
+        """Test the split of a file into parts."""
+        chunks = prepare_chunks(file_size=2 * CHUNK_SIZE + 1,
+                                chunk_size=CHUNK_SIZE)
+        self.assertEqual([c.size for c in chunks],
+                         [CHUNK_SIZE, CHUNK_SIZE, 1])
+
+        with self.assertRaises(ValueError):
+            prepare_chunks(file_size=0, chunk_size=CHUNK_SIZE)
+
+    def test_file_part(self):
+        """Test the views over parts of a file."""
+        with open(self.file_path, 'rb') as fh:
+            for offset in (0, CHUNK_SIZE, 12345):
+                part = FilePart(fh, offset=offset, size=1000)
+                self.assertEqual(len(part), 1000)
+                self.assertEqual(bytes(part.view),
+                                 self.content[offset:offset + 1000])
+                part.close()
+
+    def test_compute_checksums(self):
+        """Test the MD5 of a file and of its parts."""
+        file_hash, part_hashes = compute_checksums(self.file_path,
+                                                   chunk_size=CHUNK_SIZE)
+        self.assertEqual(file_hash, hashlib.md5(self.content).hexdigest())
+        self.assertEqual(part_hashes, [
+            hashlib.md5(self.content[i:i + CHUNK_SIZE]).hexdigest()
+            for i in range(0, len(self.content), CHUNK_SIZE)])
+
+    @patch('delairstack.core.resources.datamngt.upload.upload_throughput',
+           ThroughputEstimator())
+    def test_choose_chunk_size(self):
+        """Test the part size chosen from the throughput."""
+        mb = 1024 * 1024
+        # no throughput known, about 1000 parts
+        self.assertEqual(choose_chunk_size(40 * 1024 * mb, throughput=None),
+                         41 * mb)
+        self.assertEqual(choose_chunk_size(100 * mb, throughput=None),
+                         5 * mb)
+        # a part uploaded in 15s, at least 8 parts
+        self.assertEqual(choose_chunk_size(40 * 1024 * mb, throughput=mb),
+                         15 * mb)
+        self.assertEqual(choose_chunk_size(80 * mb, throughput=mb),
+                         10 * mb)
+        self.assertEqual(choose_chunk_size(None, throughput=100 * mb),
+                         50 * mb)
+        # at most 10,000 parts
+        self.assertEqual(choose_chunk_size(200 * 1024 * mb,
+                                           throughput=10 * 1024),
+                         math.ceil(200 * 1024 * mb / 10000))
+        with self.assertRaises(ValueError):
+            choose_chunk_size(600 * 1024 * mb, throughput=mb)
+
+    def test_throughput_estimator(self):
+        """Test the moving average of the throughput."""
+        estimator = ThroughputEstimator(alpha=0.5)
+        self.assertIsNone(estimator.value)
+        estimator.record(100, 1.0)
+        self.assertEqual(estimator.value, 100)
+        estimator.record(300, 1.0)
+        self.assertEqual(estimator.value, 200)
+
+    def test_buffer_budget(self):
+        """Test the wait for free memory of the budget."""
+        budget = BufferBudget(10)
+        budget.acquire(8)
+        acquired = threading.Event()
+
+        def acquire():
+            budget.acquire(5)
+            acquired.set()
+
+        t = threading.Thread(target=acquire)
+        t.start()
+        self.assertFalse(acquired.wait(0.1))
+        budget.release(8)
+        self.assertTrue(acquired.wait(1))
+        t.join()
+        budget.release(5)
+        budget.acquire(20)      # larger than the budget but nothing else held
+        self.assertEqual(budget.used, 20)
+
+    def test_send(self):
+        """Test a multipart upload within its memory budget."""
+        conn = FakeConnection()
+        buffers = BufferBudget(2 * CHUNK_SIZE)
+        throughput = ThroughputEstimator()
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 buffers=buffers, throughput=throughput)
+        upload.send(self.file_path, dataset='dataset-id',
+                    component_name='raster')
+
+        self.assertUploaded(conn)
+        self.assertGreater(throughput.value, 0)
+        self.assertLessEqual(conn.asynchronous.max_in_flight, 2)
+        self.assertEqual(buffers.used, 0)
+        self.assertEqual([p for p, _ in conn.posts],
+                         ['data-manager/create-multipart-upload',
+                          'data-manager/complete-multipart-upload'])
+        creation_desc = conn.posts[0][1]
+        self.assertEqual(creation_desc['total_size'], len(self.content))
+        self.assertEqual(creation_desc['chunk_size'], CHUNK_SIZE)
+
+    def test_send_compute_md5(self):
+        """Test the checksum sent with the upload."""
+        conn = FakeConnection()
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE)
+        upload.send(self.file_path, dataset='dataset-id',
+                    component_name='raster', compute_md5=True)
+
+        self.assertUploaded(conn)
+        self.assertEqual(conn.posts[0][1]['checksum'],
+                         hashlib.md5(self.content).hexdigest())
+
+    def test_send_progress(self):
+        """Test the progress reported during an upload."""
+        conn = FakeConnection(statuses={2: [502]})
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 backoff_factor=0.01)
+        calls = []
+        summary = upload.send(self.file_path, dataset='dataset-id',
+                              component_name='raster', progress=calls.append)
+
+        self.assertEqual(summary.bytes, len(self.content))
+        self.assertEqual(summary.retries, 1)
+        self.assertTrue(calls[-1].finished)
+        self.assertEqual(calls[-1].bytes_total, len(self.content))
+        self.assertEqual(calls[-1].parts_in_flight, 0)
+
+    def test_send_throttled(self):
+        """Test an upload limited in bandwidth."""
+        conn = FakeConnection()
+        throttle = TokenBucket(len(self.content) * 4, burst=0.01)
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 throttle=throttle)
+        with patch('delairstack.core.utils.throttle.time.sleep') as sleep:
+            upload.send(self.file_path, dataset='dataset-id',
+                        component_name='raster')
+
+        self.assertUploaded(conn)
+        self.assertTrue(sleep.called)
+
+    def test_send_after_token_renewal(self):
+        """Test the part sent again after a 401."""
+        conn = FakeConnection(statuses={2: [401]})
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE)
+        upload.send(self.file_path, dataset='dataset-id',
+                    component_name='raster')
+
+        self.assertUploaded(conn)
+        self.assertEqual(conn.asynchronous.calls.count(2), 2)
+
+    def test_send_after_transient_errors(self):
+        """Test the parts sent again after transient errors."""
+        conn = FakeConnection(statuses={2: [502, None], 4: [401]})
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 backoff_factor=0.01)
+        upload.send(self.file_path, dataset='dataset-id',
+                    component_name='raster')
+
+        self.assertUploaded(conn)
+        self.assertEqual(conn.asynchronous.calls.count(2), 3)
+        self.assertEqual(conn.asynchronous.calls.count(4), 2)
+
+    def test_send_retries_exhausted(self):
+        """Test the failure after too many attempts."""
+        conn = FakeConnection(statuses={2: [503] * 3, 3: [503]})
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 max_attempts=2, backoff_factor=0.01)
+        with self.assertRaises(UploadError) as cm:
+            upload.send(self.file_path, dataset='dataset-id',
+                        component_name='raster')
+
+        self.assertIn('[2]', str(cm.exception))
+        self.assertEqual(conn.asynchronous.calls.count(2), 2)
+        self.assertEqual(conn.asynchronous.calls.count(3), 2)
+
+    def test_send_failure(self):
+        """Test the failure of a rejected part."""
+        conn = FakeConnection(statuses={3: [403]})
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE)
+        with self.assertRaises(UploadError) as cm:
+            upload.send(self.file_path, dataset='dataset-id',
+                        component_name='raster')
+
+        self.assertIn('[3]', str(cm.exception))
+        self.assertEqual(len(conn.posts), 1)    # not completed
+
+    def test_send_resume(self):
+        """Test an upload resumed from its journal."""
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        params = {'dataset': 'dataset-id', 'component_name': 'raster'}
+
+        conn = FakeConnection(statuses={3: [503]})
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 journal_dir=journal_dir, max_attempts=1)
+        with self.assertRaises(UploadError):
+            upload.send(self.file_path, resume=True, **params)
+
+        journal = UploadJournal(journal_dir, file_path=self.file_path,
+                                chunk_size=CHUNK_SIZE, **params)
+        self.assertEqual(journal.load(), {1, 2, 4})
+
+        conn = FakeConnection()
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE,
+                                 journal_dir=journal_dir)
+        upload.send(self.file_path, resume=True, **params)
+
+        self.assertEqual(conn.asynchronous.calls, [3])
+        self.assertEqual([p for p, _ in conn.posts],
+                         ['data-manager/complete-multipart-upload'])
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_send_rejected(self):
+        """Test the journal removed after a rejection."""
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        params = {'dataset': 'dataset-id', 'component_name': 'raster'}
+        journal = UploadJournal(journal_dir, file_path=self.file_path,
+                                chunk_size=CHUNK_SIZE, **params)
+
+        # a rejected upload can't be resumed, its journal is removed
+        for conn in (FakeConnection(statuses={3: [403]}),
+                     FakeConnection(rejected=['complete-multipart-upload'])):
+            upload = MultipartUpload(conn, 'data-manager',
+                                     chunk_size=CHUNK_SIZE,
+                                     journal_dir=journal_dir)
+            with self.assertRaises((ResponseError, UploadError)):
+                upload.send(self.file_path, resume=True, **params)
+            self.assertFalse(os.path.exists(journal.path))
+
+    def test_send_resume_rejected(self):
+        """Test an upload sent again when it expired on the server."""
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        params = {'dataset': 'dataset-id', 'component_name': 'raster'}
+        journal = UploadJournal(journal_dir, file_path=self.file_path,
+                                chunk_size=CHUNK_SIZE, **params)
+
+        for kwargs in ({'statuses': {3: [404]}},
+                       {'rejected': ['complete-multipart-upload']}):
+            journal.open(set())
+            for part_number in (1, 2, 4):
+                journal.record(part_number)
+            journal.close()
+
+            # the upload expired on the server, it's sent from scratch
+            conn = FakeConnection(**kwargs)
+            upload = MultipartUpload(conn, 'data-manager',
+                                     chunk_size=CHUNK_SIZE,
+                                     journal_dir=journal_dir)
+            upload.send(self.file_path, resume=True, **params)
+
+            self.assertUploaded(conn)
+            self.assertEqual(conn.asynchronous.calls[0], 3)
+            self.assertEqual(sorted(conn.asynchronous.calls[-4:]),
+                             [1, 2, 3, 4])
+            self.assertEqual([p for p, _ in conn.posts][-2:],
+                             ['data-manager/create-multipart-upload',
+                              'data-manager/complete-multipart-upload'])
+            self.assertFalse(os.path.exists(journal.path))
+
+    def test_journal_mismatch(self):
+        """Test a journal ignored for another part size."""
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        params = {'file_path': self.file_path, 'dataset': 'dataset-id',
+                  'component_name': 'raster'}
+
+        journal = UploadJournal(journal_dir, chunk_size=CHUNK_SIZE, **params)
+        journal.open(set())
+        journal.record(1)
+        journal.close()
+        self.assertEqual(journal.load(), {1})
+
+        other = UploadJournal(journal_dir, chunk_size=2 * CHUNK_SIZE, **params)
+        self.assertEqual(other.load(), set())
+
+    def test_journal_recorded_chunk_size(self):
+        """Test the lookup of the chunk size of an interrupted upload."""
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        params = {'file_path': self.file_path, 'dataset': 'dataset-id',
+                  'component_name': 'raster'}
+        lookup = UploadJournal(journal_dir, chunk_size=None, **params)
+        self.assertIsNone(lookup.recorded_chunk_size())
+
+        journal = UploadJournal(journal_dir, chunk_size=2 * CHUNK_SIZE,
+                                md5hash='abc', **params)
+        journal.open(set())
+        journal.close()
+        self.assertEqual(lookup.recorded_chunk_size(), 2 * CHUNK_SIZE)
+
+        # modified since
+        os.utime(self.file_path, ns=(0, 0))
+        lookup = UploadJournal(journal_dir, chunk_size=None, **params)
+        self.assertIsNone(lookup.recorded_chunk_size())
+
+    def test_file_hash_cache(self):
+        """Test the MD5 of files cached by modification."""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_path = os.path.join(cache_dir, 'hashes.jsonl')
+        md5hash = hashlib.md5(self.content).hexdigest()
+
+        cache = FileHashCache(cache_path)
+        self.assertEqual(cache.get(self.file_path), md5hash)
+
+        # hashes are read from the cache by new instances
+        with patch('delairstack.core.resources.datamngt.upload.'
+                   'iter_readinto') as read:
+            self.assertEqual(FileHashCache(cache_path).get(self.file_path),
+                             md5hash)
+        read.assert_not_called()
+
+        # modified files are hashed again
+        with open(self.file_path, 'ab') as fh:
+            fh.write(b'more')
+        self.assertEqual(FileHashCache(cache_path).get(self.file_path),
+                         hashlib.md5(self.content + b'more').hexdigest())
+
+        # superseded lines are dropped when loaded
+        with open(cache_path) as fh:
+            self.assertEqual(len(fh.readlines()), 2)
+        self.assertEqual(FileHashCache(cache_path).get(self.file_path),
+                         hashlib.md5(self.content + b'more').hexdigest())
+        with open(cache_path) as fh:
+            self.assertEqual(len(fh.readlines()), 1)
+
+    def test_file_hash_cache_empty_file(self):
+        """Test the MD5 cached for an empty file."""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        file_path = os.path.join(cache_dir, 'empty')
+        open(file_path, 'wb').close()
+
+        cache = FileHashCache(os.path.join(cache_dir, 'hashes.jsonl'))
+        self.assertEqual(cache.get(file_path), hashlib.md5().hexdigest())
+
+    def test_component_checksum(self):
+        """Test the MD5 read from a dataset description."""
+        desc = {'components': [{'name': 'raster', 'md5hash': 'abc'},
+                               {'name': 'preview'}]}
+        self.assertEqual(component_checksum(desc, 'raster'), 'abc')
+        self.assertIsNone(component_checksum(desc, 'preview'))
+        self.assertIsNone(component_checksum(desc, 'mesh'))
+        self.assertIsNone(component_checksum({}, 'raster'))
+        self.assertIsNone(component_checksum(None, 'raster'))
+
+    def test_make_upload_source(self):
+        """Test the source made for each type of data."""
+        self.assertIsInstance(make_upload_source(b'abc'), BufferSource)
+        self.assertIsInstance(make_upload_source(io.BytesIO(b'abc')),
+                              FileSource)
+        self.assertIsInstance(make_upload_source(iter([b'abc'])), IterSource)
+
+        fh = io.BytesIO(b'abcdef')
+        fh.seek(2)
+        self.assertEqual(make_upload_source(fh).size, 4)
+
+        source = make_upload_source(iter([b'ab', b'cd']))
+        self.assertIsNone(source.size)
+        self.assertEqual(source.probe(10), 4)
+        self.assertEqual(bytes(source.open_all().view), b'abcd')
+
+    def test_send_stream(self):
+        """Test the upload of bytes, file objects and blocks."""
+        def blocks():
+            for i in range(0, len(self.content), 1000000):
+                yield self.content[i:i + 1000000]
+
+        for data in (self.content, io.BytesIO(self.content), blocks()):
+            conn = FakeConnection(statuses={2: [502]})
+            upload = MultipartUpload(conn, 'data-manager',
+                                     chunk_size=CHUNK_SIZE,
+                                     backoff_factor=0.01)
+            upload.send_stream(data, dataset='dataset-id',
+                               component_name='raster', filename='a.tif')
+
+            self.assertUploaded(conn)
+            creation_desc = conn.posts[0][1]
+            self.assertEqual(creation_desc['filename'], 'a.tif')
+            if isinstance(data, bytes):
+                self.assertEqual(creation_desc['total_size'],
+                                 len(self.content))
+            elif not isinstance(data, io.BytesIO):
+                self.assertNotIn('total_size', creation_desc)
+
+    def test_send_empty_stream(self):
+        """Test the failure of an empty stream upload."""
+        conn = FakeConnection()
+        upload = MultipartUpload(conn, 'data-manager', chunk_size=CHUNK_SIZE)
+        with self.assertRaises(UploadError):
+            upload.send_stream(iter([]), dataset='dataset-id',
+                               component_name='raster', filename='a.tif')
+        self.assertEqual(conn.posts, [])
@@ -1,8 +1,12 @@
 import copy
+import io
+import threading
 
 from delairstack.core.config import ConnectionConfig
 from delairstack.core.errors import ConfigError
-from delairstack.core.utils.utils import (new_instance, flatten_dict, find, dict_merge)
+from delairstack.core.utils.filehelper import iter_readinto
+from delairstack.core.utils.utils import (new_instance, flatten_dict, find, dict_merge,
+                                          iter_pages)
 from tests.delairstacktest import DelairStackTestBase
 
 
@@ -87,3 +91,63 @@ class TestUtils(DelairStackTestBase):
     def test_merge_dict_with_add_keys(self):
         res = dict_merge(copy.deepcopy(d1), copy.deepcopy(d2), add_keys=False)
         self.assertEqual(res, {'a': {'b': {'c': 'd'}}})
+
+    def test_iter_readinto(self):
+        """Test the blocks read into a reused buffer."""
+        resp = io.BytesIO(b'0123456789')
+        views = [bytes(v) for v in iter_readinto(resp, buffer_size=4)]
+        self.assertEqual(views, [b'0123', b'4567', b'89'])
+
+        resp = io.BytesIO(b'0123456789')
+        views = [bytes(v) for v in iter_readinto(resp, buffer_size=4,
+                                                 limit=6)]
+        self.assertEqual(views, [b'0123', b'45'])
+        self.assertEqual(resp.read(), b'6789')
+
+    def test_iter_pages(self):
+        """Test the items of all pages in order."""
+        pages = [[0, 1], [2, 3], [4]]
+        requested = []
+
+        def fetch_page(page):
+            requested.append(page)
+            return pages[page] if page < len(pages) else []
+
+        for prefetch in (0, 1, 3):
+            requested.clear()
+            items = list(iter_pages(fetch_page, prefetch=prefetch))
+            self.assertEqual(items, [0, 1, 2, 3, 4])
+            self.assertEqual(requested, [0, 1, 2, 3])
+
+        with self.assertRaises(ValueError):
+            list(iter_pages(fetch_page, prefetch=-1))
+
+    def test_iter_pages_prefetch(self):
+        """Test the number of pages fetched ahead."""
+        fetched = threading.Semaphore(0)
+
+        def fetch_page(page):
+            fetched.release()
+            return [page]
+
+        items = iter_pages(fetch_page, prefetch=2)
+        self.assertEqual(next(items), 0)
+        # next pages are fetched while the first one is consumed, at most
+        # two pages waiting plus one being fetched
+        for _ in range(4):
+            self.assertTrue(fetched.acquire(timeout=5))
+        self.assertFalse(fetched.acquire(timeout=0.3))
+        self.assertEqual(next(items), 1)
+        items.close()
+
+    def test_iter_pages_error(self):
+        """Test the error of a page raised in order."""
+        def fetch_page(page):
+            if page == 1:
+                raise ConfigError('Failed')
+            return [page]
+
+        items = iter_pages(fetch_page, prefetch=2)
+        self.assertEqual(next(items), 0)
+        with self.assertRaises(ConfigError):
+            next(items)
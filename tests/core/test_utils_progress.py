@@ -0,0 +1,61 @@
+"""Tests related to the progress of transfers.
+
+"""
+
+from unittest.mock import patch
+
+from delairstack.core.utils.progress import ProgressTracker
+from tests.delairstacktest import DelairStackTestBase
+
+
+class TestProgressTracker(DelairStackTestBase):
+    """Tests for the progress tracker.
+
+    """
+
+    def test_bounded_rate(self):
+        """Test the callback called at a bounded rate."""
+        calls = []
+        now = [0.0]
+        with patch('delairstack.core.utils.progress.time.monotonic',
+                   lambda: now[0]):
+            tracker = ProgressTracker(total=300, callback=calls.append,
+                                      min_interval=1.0)
+            tracker.start_part()
+            now[0] = 0.5
+            tracker.end_part(100)
+            self.assertEqual(calls, [])   # too early
+
+            tracker.start_part()
+            now[0] = 2.0
+            tracker.end_part(retried=True)
+            tracker.start_part()
+            tracker.end_part(100)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(calls[0].bytes_done, 100)
+            self.assertEqual(calls[0].retries, 1)
+            self.assertEqual(calls[0].throughput, 50.0)
+            self.assertFalse(calls[0].finished)
+
+            now[0] = 4.0
+            tracker.add(100)
+            summary = tracker.finish()
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[1].throughput, 100.0)
+        self.assertTrue(calls[2].finished)
+        self.assertEqual(calls[2].bytes_done, 300)
+        self.assertEqual(calls[2].parts_in_flight, 0)
+        self.assertEqual(summary.bytes, 300)
+        self.assertEqual(summary.elapsed, 4.0)
+        self.assertEqual(summary.average_throughput, 75.0)
+        self.assertEqual(summary.retries, 1)
+
+    def test_failing_callback(self):
+        """Test the errors of the callback ignored."""
+        def callback(progress):
+            raise RuntimeError()
+
+        tracker = ProgressTracker(callback=callback, min_interval=0)
+        tracker.add(10)
+        self.assertEqual(tracker.finish().bytes, 10)
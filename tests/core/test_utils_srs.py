@@ -4,7 +4,8 @@
 
 from unittest import TestCase
 
-from delairstack.core.utils.srs import expand_vertcrs_to_wkt
+from delairstack.core.utils.srs import (VertCRSRegistry, expand_vertcrs_to_wkt,
+                                        find_vertcrs_name, is_wkt)
 
 
 WGS84_WKT = """
@@ -49,6 +50,42 @@ class SRSUtilsTest(TestCase):
         self.assertEqualSkipSpaces(expand_vertcrs_to_wkt('arbitrary'),
                                    ARBITRARY_WKT)
         self.assertEqual(expand_vertcrs_to_wkt('fake'), 'fake')
+        self.assertEqual(expand_vertcrs_to_wkt(WGS84_WKT), WGS84_WKT)
+
+    def test_is_wkt(self):
+        """Test detection of WKT."""
+        self.assertTrue(is_wkt(WGS84_WKT))
+        self.assertTrue(is_wkt('VERT_CS["Arbitrary"]'))
+        self.assertFalse(is_wkt('wgs84'))
+        self.assertFalse(is_wkt('egm96_feet_us'))
+
+    def test_find_vertcrs_name(self):
+        """Test reverse lookup of SRS names."""
+        self.assertEqual(find_vertcrs_name(EGM96_WKT), 'egm96')
+        self.assertEqual(find_vertcrs_name(ARBITRARY_WKT), 'arbitrary')
+        self.assertIsNone(find_vertcrs_name('VERT_CS["Unknown"]'))
+
+    def test_register(self):
+        """Test registration of custom SRS."""
+        registry = VertCRSRegistry(wkts_path='vertcrs')
+        custom_wkt = 'VERT_CS["Custom", VERT_DATUM["Custom",2000]]'
+        registry.register('Custom', custom_wkt)
+        self.assertIn('custom', registry)
+        self.assertIn('wgs84', registry)
+        self.assertEqual(registry.name2wkt('custom'),
+                         'VERT_CS["Custom", VERT_DATUM["Custom",2000]]')
+        self.assertEqual(registry.wkt2name(custom_wkt), 'custom')
+
+        with self.assertRaises(ValueError):
+            registry.register('custom', custom_wkt)
+
+        with self.assertRaises(ValueError):
+            registry.register('other', 'not a wkt')
+
+        other_wkt = 'VERT_CS["Other"]'
+        registry.register('custom', other_wkt, overwrite=True)
+        self.assertEqual(registry.name2wkt('custom'), other_wkt)
+        self.assertIsNone(registry.wkt2name(custom_wkt))
 
     def assertEqualSkipSpaces(self, first, second, msg=None):
         """Test that first and second are equal after whitespaces removal."""
@@ -0,0 +1,80 @@
+"""Tests related to the throttling of transfers.
+
+"""
+
+from unittest.mock import patch
+
+from delairstack.core.utils.throttle import ThrottledBody, TokenBucket
+from tests.delairstacktest import DelairStackTestBase
+
+
+class TestTokenBucket(DelairStackTestBase):
+    """Tests for the token bucket.
+
+    """
+
+    def setUp(self):
+        self.now = [0.0]
+        self.sleeps = []
+
+        def sleep(delay):
+            self.sleeps.append(delay)
+            self.now[0] += delay
+
+        patchers = [patch('delairstack.core.utils.throttle.time.monotonic',
+                          lambda: self.now[0]),
+                    patch('delairstack.core.utils.throttle.time.sleep',
+                          sleep)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unlimited(self):
+        """Test a bucket without limit."""
+        bucket = TokenBucket()
+        self.assertFalse(bucket.limited)
+        bucket.consume(10**9)
+        self.assertEqual(self.sleeps, [])
+
+    def test_rate(self):
+        """Test the waits of a limited bucket."""
+        bucket = TokenBucket(100, burst=1.0)
+        self.assertTrue(bucket.limited)
+        bucket.consume(100)   # burst
+        self.assertEqual(self.sleeps, [])
+        bucket.consume(50)
+        self.assertEqual(self.sleeps, [0.5])
+        self.now[0] += 1.0
+        bucket.consume(150)
+        self.assertEqual(self.sleeps, [0.5, 0.5])
+
+    def test_invalid_rate(self):
+        """Test the failure for an invalid rate."""
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_parent(self):
+        """Test the limit of a parent bucket."""
+        parent = TokenBucket()
+        bucket = TokenBucket(parent=parent)
+        self.assertFalse(bucket.limited)
+
+        parent.rate = 100
+        self.assertTrue(bucket.limited)
+        bucket.consume(300)
+        self.assertEqual(self.sleeps, [2.0])
+
+        parent.rate = None
+        bucket.consume(300)
+        self.assertEqual(self.sleeps, [2.0])
+
+    def test_throttled_body(self):
+        """Test the blocks of a throttled body."""
+        bucket = TokenBucket(10, burst=1.0)
+        body = ThrottledBody(memoryview(b'0123456789' * 3), bucket,
+                             block_size=10)
+        self.assertEqual(len(body), 30)
+        self.assertEqual(b''.join(body), b'0123456789' * 3)
+        self.assertEqual(self.sleeps, [1.0, 1.0])
+        # bodies can be sent again
+        self.assertEqual(b''.join(body), b'0123456789' * 3)